@@ -0,0 +1,208 @@
+"""Build ontology packages with jsonimo and sync them into geem_package.
+
+    > docker-compose run web python /code/manage.py sync_ontologies \\
+        https://raw.githubusercontent.com/GenEpiO/genepio/master/genepio-merged.owl
+
+Each source is built in-process by jsonimo's pipeline, and the result is
+compared with the latest ontology package of the same file base name by
+its content hash (see OntoHelper.get_content_hash()) and versionIRI,
+without loading that package's contents:
+
+* no package yet, or a new versionIRI: a new package row is added,
+  leaving earlier releases in place;
+* same versionIRI but different content: that package's contents are
+  replaced;
+* neither changed: nothing is written.
+
+All writes happen in one transaction, after every source has been built,
+so a failed build leaves the table as it was.
+"""
+
+import contextlib
+import json
+import os
+import re
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from definitions import BASE_DIR
+from geem.models import Package
+
+# jsonimo.py and its python/ helpers import each other relative to the
+# scripts folder.
+SCRIPTS_DIR = os.path.join(BASE_DIR, 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.append(SCRIPTS_DIR)
+
+import jsonimo  # noqa: E402
+
+# Latest package fields compared with a new build
+VERSION_IRI = 'contents__metadata__versionIRI'
+
+
+def get_version(metadata):
+    """Get package version from ontology metadata.
+
+    :param metadata: ontology metadata of a jsonimo build
+    :type metadata: dict
+    :return: release date in versionIRI, else ontology date, if any
+    :rtype: str
+    """
+    match = re.search(r'\d{4}-\d{2}-\d{2}', str(metadata.get('versionIRI') or ''))
+    if match:
+        return match.group(0)
+    return str(metadata.get('date') or '')[:10]
+
+
+class Command(BaseCommand):
+    help = 'Build ontology packages with jsonimo, and save those whose ' \
+           'content or versionIRI has changed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('sources', nargs='+',
+                            help='OWL ontology file paths or URLs')
+        parser.add_argument('--engine', choices=['memory', 'sqlite', 'numpy'],
+                            default='memory',
+                            help='jsonimo triple store engine')
+        parser.add_argument('--cache', dest='cache_folder',
+                            help='Folder of parsed ontology file cache')
+        parser.add_argument('--mirror', dest='mirror_folder',
+                            help='Folder of downloaded ontology mirror')
+        parser.add_argument('--no-cache', action='store_true',
+                            help='Always fetch and parse ontology files')
+        parser.add_argument('--curation', choices=[Package.DRAFT, Package.REVIEW, Package.RELEASE],
+                            default=Package.RELEASE,
+                            help='Curation status of new packages')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report changes without saving them')
+
+    def handle(self, *args, **options):
+        builds = [self.get_build(source, options)
+                  for source in options['sources']]
+
+        latest = self.get_latest([build['file_base_name'] for build in builds])
+        (created, updated) = ([], [])
+        for build in builds:
+            package = latest.get(build['file_base_name'])
+            if package is None or package[VERSION_IRI] != build['version_iri']:
+                created.append(self.get_package(build, options))
+                action = 'new package'
+            elif package['content_hash'] != build['content_hash']:
+                updated.append(self.get_package(build, options, package['id']))
+                action = 'updated package %s' % package['id']
+            else:
+                action = 'unchanged'
+            self.stdout.write('%s (%s): %s' % (build['file_base_name'], build['version_iri'], action))
+
+        if options['dry_run'] or not (created or updated):
+            return
+
+        with transaction.atomic():
+            Package.objects.bulk_create(created)
+            Package.objects.bulk_update(updated, ['name', 'description', 'version', 'contents',
+                                                  'content_hash', 'updated'])
+
+        self.stdout.write(self.style.SUCCESS(
+            'Saved %s new and %s updated packages' % (len(created), len(updated))))
+
+    def get_build(self, source, options):
+        """Build package contents of an ontology with jsonimo.
+
+        :param source: ontology file path or URL
+        :type source: str
+        :param options: command options
+        :type options: dict
+        :return: file_base_name, version_iri, content_hash, metadata and
+            plain contents of built package
+        :rtype: dict
+        :raises CommandError: Unable to build package
+        """
+        file_base_name = os.path.basename(source).rsplit('.', 1)[0]
+        if len(file_base_name) > Package._meta.get_field('file_base_name').max_length:
+            raise CommandError('Package file base name too long: ' + file_base_name)
+
+        args = [source, '-e', options['engine']]
+        if options['cache_folder']:
+            args.extend(['-c', options['cache_folder']])
+        if options['mirror_folder']:
+            args.extend(['-m', options['mirror_folder']])
+        if options['no_cache']:
+            args.append('--no-cache')
+
+        ontology = jsonimo.Ontology()
+        (script_options, script_args) = ontology.get_command_line(args)
+
+        # jsonimo reports progress on stdout; shown at --verbosity 2.
+        log = sys.stdout if options['verbosity'] > 1 else open(os.devnull, 'w')
+        try:
+            with contextlib.redirect_stdout(log):
+                (ontology_file, output_file_basename) = ontology.onto_helper.check_ont_file(
+                    source, script_options)
+                struct = ontology.do_struct(ontology_file, output_file_basename, script_options)
+        except SystemExit:  # jsonimo stop_err()
+            raise CommandError('Unable to build package from ' + source)
+        finally:
+            if log is not sys.stdout:
+                log.close()
+
+        contents = json.loads(json.dumps(struct))
+        return {
+            'file_base_name': file_base_name,
+            'version_iri': contents['metadata'].get('versionIRI'),
+            'content_hash': ontology.onto_helper.get_content_hash(struct),
+            'metadata': contents['metadata'],
+            'contents': contents,
+        }
+
+    def get_latest(self, file_base_names):
+        """Get latest ontology package of each file base name.
+
+        Package contents aren't loaded; only their versionIRI is.
+
+        :param file_base_names: file base names of packages
+        :type file_base_names: list[str]
+        :return: id, content_hash and versionIRI of latest package, by file
+            base name
+        :rtype: dict[str,dict]
+        """
+        packages = Package.objects.filter(
+            ontology=True, owner=None, file_base_name__in=file_base_names
+        ).order_by('created', 'id').values('id', 'file_base_name', 'content_hash', VERSION_IRI)
+
+        # Later packages replace earlier ones
+        return dict((package['file_base_name'], package) for package in packages)
+
+    def get_package(self, build, options, package_id=None):
+        """Get package model instance holding a build.
+
+        :param build: get_build() result
+        :type build: dict
+        :param options: command options
+        :type options: dict
+        :param package_id: id of existing package to update, if any
+        :type package_id: int
+        :return: unsaved package
+        :rtype: geem.models.Package
+        """
+        metadata = build['metadata']
+        fields = {
+            'name': str(metadata.get('title') or build['file_base_name'])[:60],
+            'description': str(metadata.get('description') or build['file_base_name'])[:255],
+            'version': get_version(metadata),
+            'contents': build['contents'],
+            'content_hash': build['content_hash'],
+        }
+        if package_id is not None:
+            # bulk_update() skips auto_now
+            return Package(id=package_id, updated=timezone.now(), **fields)
+
+        return Package(
+            file_base_name=build['file_base_name'],
+            ontology=True,
+            public=True,
+            curation=options['curation'],
+            **fields
+        )
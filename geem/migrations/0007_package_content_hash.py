@@ -0,0 +1,18 @@
+# Generated by Django 2.2.10 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geem', '0006_auto_20181019_1846'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='package',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -72,6 +72,14 @@ class Package(models.Model):
 
     contents = JSONField() # Note, this takes a while to save because postgres creates queryable structure of contents?
 
+    # sha256 of canonical contents of ontology packages built by the
+    # sync_ontologies command, so an unchanged rebuild isn't saved again.
+    content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        default=""
+    )
+
     def __str__(self):
         owner = self.owner
         if (owner):
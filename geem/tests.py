@@ -1,3 +1,91 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from definitions import BASE_DIR
+from geem.models import Package
+
+TEST_ONTOLOGIES = os.path.join(BASE_DIR, 'tests', 'test_ontologies')
+
+VERSION_IRI = 'http://purl.obolibrary.org/obo/test_ontology/releases/2018-10-01/test_ontology.owl'
+
+
+class SyncOntologiesTest(TestCase):
+    """Test sync_ontologies adds, replaces or leaves ontology packages."""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        shutil.copytree(TEST_ONTOLOGIES, os.path.join(self.folder, 'ontologies'))
+        self.ontology_file = os.path.join(self.folder, 'ontologies', 'test_ontology.owl')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def sync(self):
+        """Run sync_ontologies on the test ontology; return its output."""
+        output = StringIO()
+        call_command('sync_ontologies', self.ontology_file, '--no-cache', stdout=output)
+        return output.getvalue()
+
+    def edit(self, old, new):
+        with open(self.ontology_file) as ontology:
+            text = ontology.read()
+        self.assertIn(old, text)
+        with open(self.ontology_file, 'w') as ontology:
+            ontology.write(text.replace(old, new))
+
+    def get_label(self, package, entity_id):
+        return package.contents['specifications'][entity_id]['label']
+
+    def test_unchanged_build_not_written(self):
+        self.assertIn('new package', self.sync())
+        package = Package.objects.get(file_base_name='test_ontology')
+        self.assertTrue(package.ontology)
+        self.assertEqual(package.version, '2018-10-01')
+        self.assertEqual(package.contents['metadata']['versionIRI'], VERSION_IRI)
+        self.assertEqual(len(package.content_hash), 64)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIn('unchanged', self.sync())
+        self.assertEqual([query['sql'] for query in queries.captured_queries
+                          if not query['sql'].lstrip().upper().startswith('SELECT')], [])
+        self.assertEqual(Package.objects.get().updated, package.updated)
+
+    def test_new_version_adds_package(self):
+        self.sync()
+        first = Package.objects.get()
+        self.edit('/releases/2018-10-01/', '/releases/2018-11-01/')
+        self.edit('>Brazil<', '>Brasil<')
+
+        self.assertIn('new package', self.sync())
+        (earlier, later) = Package.objects.order_by('id')
+        self.assertEqual(earlier.id, first.id)
+        self.assertEqual(earlier.content_hash, first.content_hash)
+        self.assertEqual(self.get_label(earlier, 'GENEPIO:0001004'), 'Brazil')
+        self.assertEqual(later.version, '2018-11-01')
+        self.assertEqual(self.get_label(later, 'GENEPIO:0001004'), 'Brasil')
+
+    def test_changed_content_updates_package(self):
+        self.sync()
+        first = Package.objects.get()
+        self.edit('>Brazil<', '>Brasil<')
+
+        self.assertIn('updated package %s' % first.id, self.sync())
+        package = Package.objects.get()
+        self.assertEqual(package.id, first.id)
+        self.assertNotEqual(package.content_hash, first.content_hash)
+        self.assertEqual(package.contents['metadata']['versionIRI'], VERSION_IRI)
+        self.assertEqual(self.get_label(package, 'GENEPIO:0001004'), 'Brasil')
+        self.assertGreater(package.updated, first.updated)
 
-# Create your tests here.
+    def test_dry_run_writes_nothing(self):
+        output = StringIO()
+        call_command('sync_ontologies', self.ontology_file, '--no-cache', '--dry-run', stdout=output)
+        self.assertIn('new package', output.getvalue())
+        self.assertFalse(Package.objects.exists())
@@ -0,0 +1,318 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" **************************************************************************
+	python benchmark.py [options]*
+
+	Ingestion benchmark of ontofetch.py and jsonimo.py.
+
+	For each requested size, a synthetic GenEpiO-style ontology of that many
+	terms is generated (see python/ontogenerator.py), and ontofetch.py and
+	jsonimo.py are each run on it end to end, as separate processes. Wall
+	time, CPU time and peak resident memory of each run, along with
+	jsonimo's per-stage timings from its .profile.json report, are
+	appended to a JSON results file. Each new run is compared with the
+	last recorded one, so a release that slows down at some size shows up
+	before it reaches production.
+
+	e.g. python benchmark.py
+		runs 1000, 10000 and 100000 term ontologies, adding results to
+		./benchmark_results.json
+
+	e.g. python benchmark.py -n 1000,5000 -l "sqlite engine" -e sqlite -o bench/
+
+	**************************************************************************
+"""
+
+import json
+import sys
+import os
+import time
+import shutil
+import threading
+import platform
+import tempfile
+import datetime
+import subprocess
+import optparse
+
+import rdflib
+import python.ontogenerator as og
+
+try: #Python 2.7
+	from collections import OrderedDict
+except ImportError: # Python 2.6
+	from ordereddict import OrderedDict
+
+SCRIPTS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+# Ratio to last recorded run above which a result is flagged.
+SLOWER_RATIO = 1.5
+
+def stop_err(msg, exit_code = 1):
+	sys.stderr.write("%s\n" % msg)
+	sys.exit(exit_code)
+
+class MyParser(optparse.OptionParser):
+	"""
+	Allows formatted help info.  From http://stackoverflow.com/questions/1857346/python-optparse-how-to-include-additional-info-in-usage-output.
+	"""
+	def format_epilog(self, formatter):
+		return self.epilog
+
+
+def run_process(command, timeout = None):
+	"""
+	Runs given command, returning its wall time, CPU time and peak
+	resident memory (Mb), and exit code. Where os.wait4() is available
+	these are the figures of that process alone.
+	"""
+	started = time.time()
+	process = subprocess.Popen(command, cwd = SCRIPTS_FOLDER,
+		stdout = subprocess.DEVNULL, stderr = subprocess.PIPE)
+
+	if not hasattr(os, 'wait4'): # Windows
+		try:
+			(output, errors) = process.communicate(timeout = timeout)
+		except subprocess.TimeoutExpired:
+			process.kill()
+			(output, errors) = process.communicate()
+		return OrderedDict([
+			('wall_time', round(time.time() - started, 3)),
+			('cpu_time', None),
+			('peak_rss_mb', None),
+			('exit_code', process.returncode),
+			('errors', errors.decode('utf-8', 'replace')[-2000:] if process.returncode else None)
+		])
+
+	# stderr is collected by a thread, so a chatty process can't block.
+	errors = []
+	reader = threading.Thread(target = lambda: errors.append(process.stderr.read()))
+	reader.start()
+
+	while True:
+		(pid, status, usage) = os.wait4(process.pid, os.WNOHANG)
+		if pid:
+			break
+		if timeout and time.time() - started > timeout:
+			process.kill()
+		time.sleep(0.05)
+
+	reader.join()
+	process.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+	# ru_maxrss is kilobytes on Linux, bytes on macOS.
+	peak_rss = usage.ru_maxrss / (1024.0 * 1024 if sys.platform == 'darwin' else 1024.0)
+
+	return OrderedDict([
+		('wall_time', round(time.time() - started, 3)),
+		('cpu_time', round(usage.ru_utime + usage.ru_stime, 3)),
+		('peak_rss_mb', round(peak_rss, 1)),
+		('exit_code', process.returncode),
+		('errors', errors[0].decode('utf-8', 'replace')[-2000:] if process.returncode and errors else None)
+	])
+
+
+class Benchmark(object):
+
+	CODE_VERSION = '0.0.1'
+
+	def __main__(self):
+
+		(options, args) = self.get_command_line()
+
+		if options.code_version:
+			print (self.CODE_VERSION)
+			return self.CODE_VERSION
+
+		try:
+			sizes = [int(size) for size in options.sizes.split(',')]
+		except ValueError:
+			stop_err('Sizes must be a comma separated list of term counts, e.g. 1000,10000')
+
+		output_folder = options.output_folder or os.getcwd()
+		if not os.path.isdir(output_folder):
+			os.makedirs(output_folder)
+		results_file = os.path.join(output_folder, 'benchmark_results.json')
+
+		work_folder = options.work_folder or tempfile.mkdtemp(prefix = 'geem_benchmark_')
+		try:
+			run = self.do_run(sizes, work_folder, options)
+		finally:
+			if not options.work_folder:
+				shutil.rmtree(work_folder, ignore_errors = True)
+
+		results = self.get_results(results_file)
+		self.do_comparison(run, results)
+		results.append(run)
+		with open(results_file, 'w') as output_handle:
+			json.dump(results, output_handle, indent = 4, separators = (',', ': '))
+		print ("Results added to " + results_file)
+
+
+	def do_run(self, sizes, work_folder, options):
+		""" Returns record of one benchmark run over given ontology sizes. """
+		run = OrderedDict([
+			('created', datetime.datetime.now().isoformat()),
+			('label', options.label),
+			('commit', self.get_commit()),
+			('python', platform.python_version()),
+			('rdflib', rdflib.__version__),
+			('engine', options.engine),
+			('sizes', [])
+		])
+
+		for size in sizes:
+			print ("Generating ontology of %s terms ..." % size)
+			ontology_file = os.path.join(work_folder, 'synthetic_%s.owl' % size)
+			output_folder = os.path.join(work_folder, 'output_%s' % size)
+			if not os.path.isdir(output_folder):
+				os.makedirs(output_folder)
+
+			started = time.time()
+			generator = og.OntologyGenerator(terms = size, depth = options.depth,
+				synonyms = options.synonyms, components = options.components,
+				picklists = options.picklists, units = options.units,
+				imports = options.imports, seed = options.seed)
+			counts = generator.write(ontology_file)
+
+			result = OrderedDict([
+				('terms', size),
+				('counts', counts),
+				('file_mb', round(os.path.getsize(ontology_file) / (1024.0 * 1024), 2)),
+				('generate_time', round(time.time() - started, 3))
+			])
+
+			# Each run parses from scratch, not from a previous run's cache.
+			common = ['--no-cache', '-o', output_folder, '-e', options.engine]
+			if options.engine == 'sqlite':
+				common.extend(['-s', os.path.join(work_folder, 'store_%s.sqlite' % size)])
+
+			print ("Running ontofetch.py ...")
+			result['ontofetch'] = run_process([sys.executable, 'ontofetch.py', ontology_file,
+				'-r', og.OBO + 'OBI_0000938'] + common, options.timeout)
+			print ("Running jsonimo.py ...")
+			result['jsonimo'] = run_process([sys.executable, 'jsonimo.py', ontology_file] + common, options.timeout)
+			result['jsonimo']['stages'] = self.get_stage_times(
+				os.path.join(output_folder, 'synthetic_%s.profile.json' % size))
+
+			for script in ('ontofetch', 'jsonimo'):
+				if result[script]['exit_code']:
+					print ("WARNING: %s failed on %s terms:\n%s" % (script, size, result[script]['errors']))
+
+			run['sizes'].append(result)
+
+		return run
+
+
+	def get_stage_times(self, profile_file):
+		""" Returns stage -> wall time from a jsonimo .profile.json report. """
+		try:
+			with open(profile_file) as input_handle:
+				profile = json.load(input_handle)
+		except (IOError, OSError, ValueError):
+			return None
+
+		return OrderedDict((stage['stage'], stage['wall_time']) for stage in profile['stages'])
+
+
+	def get_results(self, results_file):
+		""" Returns list of runs recorded in results file, if any. """
+		if not os.path.isfile(results_file):
+			return []
+
+		try:
+			with open(results_file) as input_handle:
+				return json.load(input_handle, object_pairs_hook = OrderedDict)
+		except ValueError as e:
+			stop_err('Unable to read results file %s: %s' % (results_file, e))
+
+
+	def get_commit(self):
+		""" Returns git commit of this code, or None. """
+		try:
+			return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+				cwd = SCRIPTS_FOLDER, stderr = subprocess.DEVNULL).decode('utf-8').strip()
+		except (OSError, subprocess.CalledProcessError):
+			return None
+
+
+	def get_comparison(self, run, previous):
+		"""
+		Returns rows of (terms, script, measure, previous value, value, ratio)
+		comparing given run with a previous one, for sizes both have.
+		"""
+		rows = []
+		previous_sizes = dict((result['terms'], result) for result in previous['sizes'])
+		for result in run['sizes']:
+			if not result['terms'] in previous_sizes:
+				continue
+			for script in ('ontofetch', 'jsonimo'):
+				for measure in ('wall_time', 'cpu_time', 'peak_rss_mb'):
+					old = previous_sizes[result['terms']][script][measure]
+					new = result[script][measure]
+					ratio = round(new / old, 2) if old and new is not None else None
+					rows.append((result['terms'], script, measure, old, new, ratio))
+
+		return rows
+
+
+	def do_comparison(self, run, results):
+		""" Prints run, compared with last recorded run if there is one. """
+		previous = results[-1] if results else None
+		if previous:
+			print ("\nCompared with run of %s (%s):" % (previous['created'], previous.get('label') or previous.get('commit')))
+			for (terms, script, measure, old, new, ratio) in self.get_comparison(run, previous):
+				flag = '  SLOWER' if ratio and ratio > SLOWER_RATIO else ''
+				print ("%8s %-10s %-12s %10s %10s %6sx%s" % (terms, script, measure, old, new, ratio, flag))
+		else:
+			for result in run['sizes']:
+				for script in ('ontofetch', 'jsonimo'):
+					print ("%8s %-10s %8ss %8ss cpu %8s Mb" % (result['terms'], script,
+						result[script]['wall_time'], result[script]['cpu_time'], result[script]['peak_rss_mb']))
+
+
+	def get_command_line(self):
+		"""
+		*************************** Parse Command Line *****************************
+		"""
+		parser = MyParser(
+			description = 'Ingestion benchmark of ontofetch.py and jsonimo.py on synthetic ontologies.  See https://github.com/GenEpiO/geem',
+			usage = 'benchmark.py [options]*',
+			epilog="""  """)
+
+		# Standard code version identifier.
+		parser.add_option('-v', '--version', dest='code_version', default=False, action='store_true', help='Return version of this code.')
+
+		parser.add_option('-n', '--sizes', dest='sizes', type='string', default='1000,10000,100000', help='Comma separated numbers of terms of ontologies to benchmark (default 1000,10000,100000)')
+
+		parser.add_option('-o', '--output', dest='output_folder', type='string', help='Folder of benchmark_results.json file (default current folder)')
+
+		parser.add_option('-w', '--work', dest='work_folder', type='string', help='Folder to keep generated ontologies and outputs in (default a temporary folder, removed afterwards)')
+
+		parser.add_option('-l', '--label', dest='label', type='string', help='Label of this run in results, e.g. release name')
+
+		parser.add_option('-e', '--engine', dest='engine', type='choice', choices=['memory', 'sqlite', 'numpy'], default='memory', help='Triple store engine for ontofetch.py and jsonimo.py (default memory)')
+
+		parser.add_option('-t', '--timeout', dest='timeout', type='float', help='Seconds after which a script run is stopped')
+
+		parser.add_option('--depth', dest='depth', type='int', default=6, help='Deepest level of generated hierarchies (default 6)')
+
+		parser.add_option('--synonyms', dest='synonyms', type='float', default=0.3, help='Average number of synonyms per term (default 0.3)')
+
+		parser.add_option('--components', dest='components', type='int', default=4, help='Average number of components per model (default 4)')
+
+		parser.add_option('--picklists', dest='picklists', type='int', help='Number of picklists (default one per 200 terms)')
+
+		parser.add_option('--units', dest='units', type='int', default=20, help='Number of unit terms (default 20)')
+
+		parser.add_option('--imports', dest='imports', type='int', default=2, help='Number of import files (default 2)')
+
+		parser.add_option('--seed', dest='seed', type='int', default=1, help='Random seed of generated ontologies (default 1)')
+
+		return parser.parse_args()
+
+
+if __name__ == '__main__':
+
+	benchmark = Benchmark()
+	benchmark.__main__()
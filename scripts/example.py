@@ -93,6 +93,10 @@ class Ontology(object):
 
 		(main_ontology_file, output_file_basename) = self.onto_helper.check_ont_file(args[0], options)
 
+		if not options.no_cache:
+			self.onto_helper.set_graph_cache(options.cache_folder)
+			self.onto_helper.set_mirror(options.mirror_folder)
+
 		# Load main ontology file into RDF graph
 		print("Fetching and parsing " + main_ontology_file + ' ...')
 
@@ -100,7 +104,7 @@ class Ontology(object):
 			# ISSUE: ontology file taken in as ascii; rdflib doesn't accept
 			# utf-8 characters so can experience conversion issues in string
 			# conversion
-			self.onto_helper.graph.parse(main_ontology_file, format='xml')
+			self.onto_helper.parse_ontology(main_ontology_file)
 
 		except URLError as e:
 			#urllib2.URLError: <urlopen error [Errno 8] nodename nor servname provided, or not known>
@@ -115,7 +119,7 @@ class Ontology(object):
 		struct = self.onto_helper.do_query_table(self.queries['tree'], specBinding )
 
 		# Deliver above struct into an output file
-		self.onto_helper.do_output_json(struct, output_file_basename)
+		self.onto_helper.do_output_json(struct, output_file_basename, options.gzip)
 
 
 	def get_command_line(self):
@@ -132,6 +136,14 @@ class Ontology(object):
 
 		parser.add_option('-o', '--output', dest='output_folder', type='string', help='Path of output file to create')
 
+		parser.add_option('-z', '--gzip', dest='gzip', default=False, action='store_true', help='Write gzip compressed output files.')
+
+		parser.add_option('-c', '--cache', dest='cache_folder', type='string', help='Folder of parsed ontology file cache (default ~/.cache/geem/graphs)')
+
+		parser.add_option('-m', '--mirror', dest='mirror_folder', type='string', help='Folder of downloaded ontology file mirror, for ontologies given by URL (default ~/.cache/geem/mirror)')
+
+		parser.add_option('--no-cache', dest='no_cache', default=False, action='store_true', help='Always fetch and parse ontology files instead of loading them from mirror or cache.')
+
 		return parser.parse_args()
 
 
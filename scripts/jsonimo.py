@@ -16,6 +16,9 @@
 
  RDFLib: This script requires python module RDFLib.
 
+ Ontology files may be RDF/XML, N-Triples, Turtle or OBO Graphs JSON; see
+ python/ontoformat.py.
+
  RDFLib sparql ISSUE: Doing a "BINDING (?x as ?y)" expression prevents ?x from 
  being output in a SELECT. bug leads to no such field being output.
 
@@ -61,14 +64,23 @@ import re
 import json
 import sys
 import os
+import copy
+import gzip
+import time
 import datetime
+import multiprocessing
 from pprint import pprint
 import optparse
 
 import rdflib
 import python.ontohelper as oh
+import python.stageprofiler as sp
+import python.checkpoints as cp
 
-import rdfextras; rdfextras.registerplugins() # so we can Graph.query()
+try: # Only needed by old rdflib releases; rdflib 4+ has Graph.query() built in.
+	import rdfextras; rdfextras.registerplugins() # so we can Graph.query()
+except ImportError:
+	pass
 
 # Do this, otherwise a warning appears on stdout: No handlers could be found for logger "rdflib.term"
 import logging; logging.basicConfig(level=logging.ERROR) 
@@ -83,6 +95,26 @@ def stop_err( msg, exit_code=1 ):
 	sys.stderr.write("%s\n" % msg)
 	sys.exit(exit_code)
 
+# Ontology whose graph forked query workers read; see do_parallel_tables()
+forked_ontology = None
+
+def get_forked_table(query_name):
+	"""
+	Runs given query in a forked worker process over the graph loaded by
+	its parent, returning (query_name, table, seconds, number of sparql
+	queries run, @context prefixes the query added or changed).
+	"""
+	onto_helper = forked_ontology.onto_helper
+	if onto_helper.store is not None:
+		onto_helper.store.connect()
+
+	previous = dict(onto_helper.struct['@context'])
+	query_count = onto_helper.query_count
+	started = time.perf_counter()
+	table = forked_ontology.get_query_table(query_name)
+	return (query_name, table, time.perf_counter() - started, onto_helper.query_count - query_count,
+		onto_helper.get_added_prefixes(previous))
+
 class MyParser(optparse.OptionParser):
 	"""
 	Allows formatted help info.  From http://stackoverflow.com/questions/1857346/python-optparse-how-to-include-additional-info-in-usage-output.
@@ -100,11 +132,64 @@ class Ontology(object):
 	"""
 	CODE_VERSION = '0.0.6'
 
+	# Query columns naming the entities whose records a builder changes for
+	# each row of the given query; see get_incremental_table(). Parent-like
+	# columns come first so a rebuilt entity's choices and components are
+	# filled in query order.
+	QUERY_ENTITY_VARIABLES = {
+		'tree': ['parent_id', 'id'],
+		'specification_components': ['parent_id', 'datum'],
+		'inherited': ['id'],
+		'primitives': ['datum'],
+		'categoricals': ['id'],
+		'individuals': ['parent_id', 'id'],
+		'features': ['referrer', 'id'],
+		'feature_annotations': ['referrer', 'id'],
+		'units': ['unit', 'datum']
+	}
+
+	# Row order of query tables, sorted once they are fetched rather than
+	# by a sparql ORDER BY; see OntoHelper.get_ordered_rows(). Components
+	# go by label, as "ORDER BY ?label" put them.
+	QUERY_ORDER = {
+		'specification_components': [('id', 'label')],
+		'units': ['id', 'unit', 'label']
+	}
+
+	# Named stages building specifications, in order. With checkpoints on,
+	# struct is saved after each; see do_stage(). --resume-from takes any
+	# of these, or 'output'.
+	BUILD_STAGES = ['tree', 'specification_components', 'inherited', 'primitives',
+		'categoricals', 'picklists', 'features', 'feature_annotations', 'units', 'annotations']
+
+	# Queries that don't depend on each other or on struct, so can be run
+	# at once in forked processes; see do_parallel_tables()
+	PARALLEL_QUERIES = ['primitives', 'units', 'feature_annotations',
+		'specification_components', 'features', 'categoricals']
+
+	# Result columns naming entities whose records builders fill in, as
+	# counted in profile report.
+	TABLE_ENTITY_COLUMNS = ['parent_id', 'id', 'referrer']
+
 	def __init__(self):
 
 		self.onto_helper = oh.OntoHelper()
 		self.timestamp = datetime.datetime.now()
 
+		# Ids of entities rebuilt by an incremental run; see do_previous_release()
+		self.rebuild_ids = set()
+
+		# Query tables run ahead by do_parallel_tables(), by query name
+		self.prefetched = {}
+
+		# Time, memory and queries of each stage, reported in .profile.json
+		self.profiler = sp.StageProfiler()
+
+		# Checkpoints of struct saved after each build stage, if kept; see
+		# set_checkpoints(). A resumed run skips stages it restores.
+		self.checkpoints = None
+		self.skipped_stages = set()
+
 		""" 
 		Add these PREFIXES to Protege Sparql query window if you want to test a query there:
 
@@ -113,35 +198,15 @@ class Ontology(object):
 		PREFIX xmls: <http://www.w3.org/2001/XMLSchema#>
 		""" 
 
-		self.queries = {
-			##################################################################
-			# Generic TREE "is a" hierarchy from given root.
-			#
-			'tree': rdflib.plugins.sparql.prepareQuery("""
-				SELECT DISTINCT ?id ?parent_id ?deprecated ?replaced_by
-				WHERE {	
-					?id rdfs:subClassOf* ?root.
-					?id rdfs:subClassOf ?parent_id.
-					FILTER (isIRI(?parent_id)). # otherwise parents outside of is_a are included.
-					OPTIONAL {?id rdfs:label ?label}.
-	 				OPTIONAL {?id GENEPIO:0000006 ?ui_label}. # for ordering
-					OPTIONAL {?id owl:deprecated ?deprecatedAnnot.
-						BIND(xsd:string(?deprecatedAnnot) As ?deprecated).
-					}.
-					OPTIONAL {?id IAO:0100001 ?replaced_byAnnot.
-						BIND(xsd:string(?replaced_byAnnot) As ?replaced_by).
-					}.	
-				}
-				ORDER BY ?parent_id ?ui_label ?label 
-			""", initNs = self.onto_helper.namespace),
-
+		# Prepared on first use, so runs needing few queries start quickly.
+		self.queries = self.onto_helper.add_queries({
 			# SECOND VERSION FOR ''
 			##################################################################
 			# RETRIEVES ANY parent and child entities joined by 'has component'
 			# RETRIEVE DATUM CARDINALITY, LIMIT FOR SPECIFICATION RELATIVE TO PARENT
 			# X 'has component' [some|exactly N|min n| max n] Y 
 			# Parent is always datatype = 'model'
-			'specification_components': rdflib.plugins.sparql.prepareQuery("""
+			'specification_components': """
 
 				SELECT DISTINCT ?parent_id (?datum as ?id) ?cardinality ?limit
 				WHERE { 	
@@ -154,11 +219,9 @@ class Ontology(object):
 					UNION 
 					{?restriction owl:someValuesFrom ?datum.
 					?restriction ?cardinality ?datum} # Sets ?cardinality to "owl:someValuesFrom" 
+				 }
 
-					OPTIONAL {?datum rdfs:label ?label}.
-				 } ORDER BY ?label
-
-			""", initNs = self.onto_helper.namespace),
+			""",
 
 			##################################################################
 			# 
@@ -173,7 +236,15 @@ class Ontology(object):
 	        #		</rdfs:subClassOf>
 	        #		...
 	        #
-			'primitives': rdflib.plugins.sparql.prepareQuery("""
+			#	Its rows of each class's own datatype and constraints are also
+			#	what descendant datums inherit: get_query_table() has
+			#	OntoHelper.do_inherited_table() push these down the subclass
+			#	hierarchy as the 'inherited' table. Inherited values are applied
+			#	first, then overridden by these more specific ones.
+			#
+			#	Handle much simpler inheritance of categoricals in 'categoricals' query below
+			#
+			'primitives': """
 
 			SELECT DISTINCT (?datum as ?id) ?datatype ?constraint ?expression
 				WHERE { 	
@@ -202,46 +273,9 @@ class Ontology(object):
 						?restrictColl ?constraint ?expression.
 						 } 
 				 } 
-			""", initNs = self.onto_helper.namespace),
+			""",
 
 		
-			##################################################################
-			# 
-			#   The difference between this and below "primitives" query is that this one 
-			#	returns descendant datums.  Run inherited query first to calculate inheritances; 
-			#	then run "primitives" to override inherited values with more specific ones.
-			# 
-			#	Handle much simpler inheritance of categoricals in 'categoricals' query below
-
-			'inherited': rdflib.plugins.sparql.prepareQuery("""
-
-			SELECT DISTINCT (?datum as ?id) ?datatype ?constraint ?expression
-				WHERE { 	
-					BIND (GENEPIO:0001605 as ?hasPvaluespec).
-					?restriction owl:onProperty ?hasPvaluespec. 
-					?datum rdfs:subClassOf/rdfs:subClassOf+ ?restriction.
-
-					{?restriction owl:someValuesFrom ?datatype.} 
-					UNION {?restriction owl:someValuesFrom ?datatypeObj. 
-						?datatypeObj owl:onDatatype ?datatype.
-						?datatypeObj owl:withRestrictions*/rdf:rest*/rdf:first ?restrictColl.
-						?restrictColl ?constraint ?expression.}
-					UNION # matches a single condition on 
-						{?restriction owl:onDataRange ?datatype.  
-						FILTER (! isBlank(?datatype)).
-						?restriction (owl:qualifiedCardinality | owl:minQualifiedCardinality | owl:maxQualifiedCardinality) ?expression.
-						?restriction ?constraint ?expression } 
-					UNION
-						{?restriction owl:onDataRange ?dataRangeObj.
-						?dataRangeObj owl:onDatatype ?datatype. 
-						?dataRangeObj owl:withRestrictions*/rdf:rest*/rdf:first ?restrictColl.
-						?restrictColl ?constraint ?expression.
-						 } 
-					 FILTER (?datatype != xmls:anyURI)
-				 } order by ?datatype
-		 """, initNs = self.onto_helper.namespace),
-
-
 			##################################################################
 			# CATEGORICAL FIELDS
 			# One must mark an ontology term as a 'categorical tree specification'
@@ -251,14 +285,14 @@ class Ontology(object):
 			#
 			# These root nodes for categorical tree specification go into 'specifications' table
 
-			'categoricals': rdflib.plugins.sparql.prepareQuery("""
+			'categoricals': """
 				SELECT DISTINCT ?id ?datatype
 				WHERE { 
 					BIND (GENEPIO:0001655 as ?categorical).
 					BIND (xmls:anyURI as ?datatype).
 					?id rdfs:subClassOf ?categorical.
 				 } 
-			""", initNs = self.onto_helper.namespace),
+			""",
 
 			##################################################################
 			# INDIVIDUALS
@@ -272,7 +306,7 @@ class Ontology(object):
 			#
 			# ISSUE: What is "rdfs:subClassOfTLR"
 
-			'individuals': rdflib.plugins.sparql.prepareQuery("""
+			'individuals': """
 				
 				SELECT DISTINCT ?id ?parent_id ?datatype
 				WHERE {
@@ -287,12 +321,12 @@ class Ontology(object):
 					OPTIONAL {?id GENEPIO:0000006 ?ui_label}.
 				}
 				ORDER BY ?parent_id ?ui_label ?label
-			""", initNs = self.onto_helper.namespace),
+			""",
 
 			##################################################################
 			# ALL PRIMITIVE FIELD UNITS
 
-			'units' :rdflib.plugins.sparql.prepareQuery("""
+			'units': """
 
 				SELECT DISTINCT (?datum as ?id)	?unit ?label
 				WHERE { 
@@ -305,8 +339,8 @@ class Ontology(object):
 					?unit rdfs:label ?label
 					FILTER ( isURI(?unit))
 
-				 } ORDER BY ?datum ?unit ?label
-			""", initNs = self.onto_helper.namespace),
+				 }
+			""",
 
 
 			# ################################################################
@@ -339,7 +373,7 @@ class Ontology(object):
 		    #
 
 
-			'features': rdflib.plugins.sparql.prepareQuery("""
+			'features': """
 				SELECT DISTINCT ?id ?referrer ?feature ?value 
 				WHERE { 
 					{# Get direct (Class annotated) features
@@ -359,7 +393,7 @@ class Ontology(object):
 						?axiom ?feature ?value.
 					}
 				}
-			""", initNs = self.onto_helper.namespace),
+			""",
 
 			
 			# ################################################################
@@ -383,7 +417,7 @@ class Ontology(object):
 			#        </owl:annotatedTarget>
 			#    </owl:Axiom>
 
-			'feature_annotations': rdflib.plugins.sparql.prepareQuery("""
+			'feature_annotations': """
 				SELECT DISTINCT ?id ?referrer ?feature ?value 
 				WHERE { 
 					?axiom rdf:type owl:Axiom.
@@ -397,28 +431,7 @@ class Ontology(object):
 					# Not using these here: UI definition GENEPIO:0000162, UI label GENEPIO:0000006
 					?axiom ?feature ?value.
 				}
-			""", initNs = self.onto_helper.namespace),
-
-			# ################################################################
-			# UI LABELS 
-			# These are annotations directly on an entity.  This is the only place
-			# that ui_label and ui_definition should really operate. Every entity
-			# in OWL file is retrieved for their rdfs:label, IAO definition etc.
-			#
-			# INPUT
-			#	?datum (otherwise ALL labels etc. in ontology returned.)
-			#
-
-			'entity_text': rdflib.plugins.sparql.prepareQuery("""
-
-				SELECT DISTINCT ?label ?definition ?ui_label ?ui_definition
-				WHERE {  
-					{?datum rdfs:label ?label.} 
-					OPTIONAL {?datum IAO:0000115 ?definition.}
-					OPTIONAL {?datum GENEPIO:0000006 ?ui_label.} 
-					OPTIONAL {?datum GENEPIO:0000162 ?ui_definition.}
-				} ORDER BY ?label
-			""", initNs = self.onto_helper.namespace),
+			""",
 
 			# ################################################################
 			# CURRENTLY UNUSED: STANDARDS INFORMATION
@@ -429,7 +442,7 @@ class Ontology(object):
 			#
 			# CURRENTLY UNUSED
 			#
-			'standards_information': rdflib.plugins.sparql.prepareQuery("""
+			'standards_information': """
 				SELECT DISTINCT ?id ?referrer ?feature ?value 
 				WHERE { 
 					?axiom rdf:type owl:Axiom.
@@ -443,138 +456,492 @@ class Ontology(object):
 					?axiom (rdfs:label|IAO:0000115|GENEPIO:0001763) ?value.  
 					?axiom ?feature ?value.
 				}
-			""", initNs = self.onto_helper.namespace),
+			""",
 
+		})
 
-			# ################################################################
-			# oboInOwl:hasDbXref (an annotation property) cross references to other terminology databases 
-			'dbreferences': rdflib.plugins.sparql.prepareQuery("""
-
-				SELECT DISTINCT ?dbXref
-				WHERE {  
-					{?datum rdf:type owl:Class} 
-					UNION {?datum rdf:type owl:NamedIndividual}.
-					?datum oboInOwl:hasDbXref ?dbXref.
-				}
-			""", initNs = self.onto_helper.namespace),
-
-		}
-
-
-	def __main__(self): #, main_ontology_file
 
+	def __main__(self, args = None): #, main_ontology_file
+		"""
+		Runs script on given command line argument list, by default the
+		one this script was started with.
+		"""
 		self.onto_helper = oh.OntoHelper() # Needed here? duplicate of above.
+		self.queries = self.onto_helper.add_queries(self.queries.texts)
 
-		(options, args) = self.get_command_line()
+		(options, args) = self.get_command_line(args)
 
 		if options.code_version:
 			print (self.CODE_VERSION)
 			return self.CODE_VERSION
 
 		if not len(args):
-			stop_err('Please supply an OWL ontology file (in RDF format)')
+			stop_err('Please supply an OWL ontology file (in RDF/XML, N-Triples, Turtle or OBO Graphs JSON format)')
 
 		# Accepts relative path with file name e.g. ../genepio-edit.owl
 		(main_ontology_file, output_file_basename) = self.onto_helper.check_ont_file(args[0], options)
-		
-		self.log("Parsing ", main_ontology_file)
 
-		# Load main ontology file into RDF graph
-		try:
-			# ISSUE: ontology file taken in as ascii; rdflib doesn't accept
-			# utf-8 characters so can experience conversion issues in string
-			# conversion stuff like .replace() below
-			self.onto_helper.graph.parse(main_ontology_file, format='xml')
+		self.do_struct(main_ontology_file, output_file_basename, options)
+
+		self.log('writing output')
+		# DO NOT USE sort_keys=True on piclists etc. because this overrides OrderedDict() sort order.
+		# BUT NEED TO IMPLEMENT json ordereddict sorting patch.
+		with self.profiler.stage('output'):
+			if options.shard_size:
+				self.onto_helper.do_output_shards(self.onto_helper.struct, output_file_basename,
+					options.shard_by, options.shard_size, options.gzip)
+			else:
+				self.onto_helper.do_output_json(self.onto_helper.struct, output_file_basename, options.gzip)
 
-		except URLError as e:
-			#urllib2.URLError: <urlopen error [Errno 8] nodename nor servname provided, or not known>
-			stop_err('WARNING:' + main_ontology_file + " could not be loaded!\n")
+		self.profiler.write_report(output_file_basename + '.profile.json',
+			ontology = main_ontology_file,
+			engine = options.engine,
+			incremental = bool(options.previous_ontology),
+			entities = len(self.onto_helper.struct['specifications']))
 
-		# Add each ontology include file (must be in OWL RDF format)
-		self.onto_helper.do_ontology_includes(main_ontology_file)
 
-		# Load self.onto_helper.struct with ontology metadata
-		self.onto_helper.set_ontology_metadata(
-			self.onto_helper.queries['ontology_metadata'])
+	def do_struct(self, main_ontology_file, output_file_basename, options):
+		"""
+		Loads given ontology and builds self.onto_helper.struct - @context,
+		metadata and specifications - from it, as configured by given
+		get_command_line() options. Returns struct; nothing is written.
+		output_file_basename locates previous output in incremental mode.
+		"""
+		if options.engine == 'sqlite':
+			store_file = options.store_file or self.onto_helper.get_store_file(main_ontology_file)
+			self.onto_helper.set_engine(options.engine, store_file)
+		elif options.engine == 'numpy':
+			self.onto_helper.set_engine(options.engine)
+
+		if not options.no_cache:
+			self.onto_helper.set_graph_cache(options.cache_folder)
+			self.onto_helper.set_mirror(options.mirror_folder)
+			self.onto_helper.set_query_cache(options.query_cache_folder)
+			self.onto_helper.set_prepared_query_cache()
+		
+		self.log("Parsing ", main_ontology_file)
+
+		with self.profiler.stage('parse'):
+			# Load main ontology file into RDF graph
+			try:
+				# ISSUE: ontology file taken in as ascii; rdflib doesn't accept
+				# utf-8 characters so can experience conversion issues in string
+				# conversion stuff like .replace() below
+				self.onto_helper.parse_ontology(main_ontology_file, options.input_format)
+
+			except URLError as e:
+				#urllib2.URLError: <urlopen error [Errno 8] nodename nor servname provided, or not known>
+				stop_err('WARNING:' + main_ontology_file + " could not be loaded!\n")
+
+			# Add each ontology include file (must be in OWL RDF format)
+			self.onto_helper.do_ontology_includes(main_ontology_file, options.import_jobs)
+
+		# Label, synonym and hasDbXref tables harvested in one pass over graph.
+		self.log('annotation tables')
+		with self.profiler.stage('annotation_tables'):
+			self.onto_helper.do_annotation_tables()
+
+			# Load self.onto_helper.struct with ontology metadata
+			started = self.profiler.get_time()
+			query_count = self.onto_helper.query_count
+			self.onto_helper.set_ontology_metadata(
+				self.onto_helper.queries['ontology_metadata'])
+			self.profiler.add_query('ontology_metadata', [], started, [], self.onto_helper.query_count - query_count)
 		print ("Metadata:", json.dumps(
 			self.onto_helper.struct['metadata'],  sort_keys=False, indent=4, separators=(',', ': ')))
 
+		if options.checkpoints or options.resume_from:
+			if options.previous_ontology:
+				stop_err('Checkpoints are not kept in incremental mode')
+			self.set_checkpoints(output_file_basename + '.checkpoints', options.resume_from)
+
+		if options.previous_ontology:
+			# Incremental mode: only entities affected by changes since the
+			# previous release are rebuilt; the rest come from its output.
+			with self.profiler.stage('previous_release'):
+				previous_specifications = self.do_previous_release(options, output_file_basename)
+			get_table = self.get_incremental_table
+		else:
+			previous_specifications = None
+			# Tables run ahead - in parallel, or 'primitives' for 'inherited'
+			# stage - are handed to builders from self.prefetched.
+			get_table = self.get_prefetched_table
+			query_names = [query_name for query_name in self.PARALLEL_QUERIES
+				if not query_name in self.skipped_stages]
+			if options.jobs > 1 and query_names:
+				with self.profiler.stage('parallel_queries'):
+					self.do_parallel_tables(query_names, options.jobs)
+
+		self.do_specifications(get_table)
+
+		if previous_specifications is not None:
+			self.merge_specifications(previous_specifications)
+
+		# Provide ui_label, synonyms, and hasDbXref's for each item:
+		self.do_stage('annotations', lambda: self.do_annotations(previous_specifications))
+
+		return self.onto_helper.struct
+
+
+	def do_annotations(self, previous_specifications = None):
+		"""
+		Adds annotations - ui_label, synonyms, hasDbXref's etc. - to each
+		entity with a datatype, except unchanged ones of an incremental run.
+		Parents of models found outside of the 'data representational model'
+		hierarchy get them in their 'models'.
+		"""
+		for key in list(self.onto_helper.struct['specifications']):
+			entity = self.onto_helper.struct['specifications'][key]
+			# Unchanged entities of an incremental run already have these.
+			if previous_specifications is not None and key in previous_specifications \
+				and not key in self.rebuild_ids:
+				continue
+			#print( "testing", entity)
+			if 'datatype' in entity:
+				self.do_entities([entity], entity['datatype'] )
+				self.profiler.add_entities([key])
+
+		# list() otherwise dictionary changed size error.
+		for key in list(self.onto_helper.struct['specifications']): 
+			entity = self.onto_helper.struct['specifications'][key]
+
+			if 'datatype' in entity:
+				if entity['datatype'] == 'model' and 'parent_id' in entity:
+					# Some model items sit outside the 'data representational model' hierarchy
+					# They were fetched via 'has component' alone.
+					parent = self.onto_helper.add_entity(entity['parent_id'], {})
+					parent.setdefault('models', {})[key] = []
+			else: # not sure where this case is happening:
+				print ("Entity",entity, "does not have a datatype!")
+
+
+	def do_specifications(self, get_table):
+		"""
+		Runs the specification builders in order, each over the table that
+		get_table(query_name, initBinds) returns: get_query_table() for a
+		full run or get_incremental_table() for an incremental one. Each
+		is a named stage; see do_stage().
+		"""
 		# Retrieve subclasses of "data representational model"(OBI:0000658) 
 		# and place in self.onto_helper.struct.specifications
 
 		# ISSUE: get_expanted_id() won't work until do_query_table sets up any found prefixes!!!
 		data_rep_model = 'http://purl.obolibrary.org/obo/OBI_0000658'
 
-		self.log('Doing term hierarchy query on:', data_rep_model)
-		specBinding = {'root': rdflib.URIRef(data_rep_model)} 
-		entities = self.onto_helper.do_query_table(self.queries['tree'], specBinding )
-		self.log('Doing models: ', len(entities))
-		#print ("models:", json.dumps(entities,  sort_keys=False, indent=4, separators=(',', ': ')))
-		self.do_entities(entities, 'model')
-
-		self.log('specification_components')
-		self.doSpecComponents(
-			self.onto_helper.do_query_table(self.queries['specification_components'] ))
-		self.log('inherited')
-		self.doPrimitives(
-			self.onto_helper.do_query_table(self.queries['inherited'] ))
-		self.log('primitives')
-		self.doPrimitives(
-			self.onto_helper.do_query_table(self.queries['primitives'] ))
-		self.log('categoricals')
-		self.doPrimitives(
-			self.onto_helper.do_query_table(self.queries['categoricals'] ))
-
+		def do_models():
+			self.log('Doing term hierarchy query on:', data_rep_model)
+			specBinding = {'root': rdflib.URIRef(data_rep_model)} 
+			entities = get_table('tree', specBinding)
+			self.log('Doing models: ', len(entities))
+			#print ("models:", json.dumps(entities,  sort_keys=False, indent=4, separators=(',', ': ')))
+			self.do_entities(entities, 'model')
+
+		self.do_stage('tree', do_models)
+		self.do_stage('specification_components', lambda: self.doSpecComponents(
+			get_table('specification_components')))
+		self.do_stage('inherited', lambda: self.doPrimitives(get_table('inherited')))
+		self.do_stage('primitives', lambda: self.doPrimitives(get_table('primitives')))
+		self.do_stage('categoricals', lambda: self.doPrimitives(get_table('categoricals')))
 
 		# GENEPIO_0001655 = Class:Categorical tree specification
 		# CHANGE TO: ANY categorical Value Specification 
 		#	- include targets of 'specifies value of'(OBI:0001927)
 		# 	- AS WELL AS ANY subClassOf expressions of categorical.
 		#
-		self.log('picklists')
-		picklistBinding = {'root': rdflib.URIRef(self.onto_helper.get_expanded_id('GENEPIO:0001655'))}
-		self.doPickLists(self.onto_helper.do_query_table(self.queries['tree'], picklistBinding ))
+		def do_picklists():
+			picklistBinding = {'root': rdflib.URIRef(self.onto_helper.get_expanded_id('GENEPIO:0001655'))}
+			self.doPickLists(get_table('tree', picklistBinding))
+
+		self.do_stage('picklists', do_picklists)
 		#self.log('picklist individuals')
-		#self.doPickLists(self.onto_helper.do_query_table(self.queries['individuals']))
-		self.log('features')
-		self.doUIFeatures(self.onto_helper.do_query_table(self.queries['features']) ,'features')
+		#self.doPickLists(get_table('individuals'))
+		self.do_stage('features', lambda: self.doUIFeatures(get_table('features'), 'features'))
 		# Second call for 'member of' can override entity and 'has component' features established above.
 
-		self.log('feature_annotations')
 		# doUIFeatures here because its "order" feature reorganizes some of above content.
-		self.doUIFeatures(self.onto_helper.do_query_table(self.queries['feature_annotations']), 'feature_annotations')
+		self.do_stage('feature_annotations', lambda: self.doUIFeatures(
+			get_table('feature_annotations'), 'feature_annotations'))
 
-		self.log('units')
 		# This is implementing any user interface feature="preferred_unit:..." 
-		self.doUnits(self.onto_helper.do_query_table(self.queries['units'] ))
+		self.do_stage('units', lambda: self.doUnits(get_table('units')))
 
-		# Provide ui_label, synonyms, and hasDbXref's for each item:
-		for key in list(self.onto_helper.struct['specifications']):
-			entity = self.onto_helper.struct['specifications'][key]
-			#print( "testing", entity)
-			if 'datatype' in entity:
-				self.do_entities([entity], entity['datatype'] )
 
-		# list() otherwise dictionary changed size error.
-		for key in list(self.onto_helper.struct['specifications']): 
-			entity = self.onto_helper.struct['specifications'][key]
+	def do_stage(self, stage, builder):
+		"""
+		Runs given builder function as named build stage, logged and
+		profiled, then saves a checkpoint of struct if checkpoints are
+		kept. Stages a resumed run restored struct after are skipped.
+		"""
+		if stage in self.skipped_stages:
+			return
 
-			if 'datatype' in entity:
-				if entity['datatype'] == 'model' and 'parent_id' in entity:
-					# Some model items sit outside the 'data representational model' hierarchy
-					# They were fetched via 'has component' alone.
-					self.onto_helper.set_struct(
-						self.onto_helper.struct, 'specifications', 
-						entity['parent_id'], 'models', key, []
-					)
-			else: # not sure where this case is happening:
-				print ("Entity",entity, "does not have a datatype!")
+		self.log(stage)
+		with self.profiler.stage(stage):
+			builder()
 
+		if self.checkpoints is not None:
+			self.checkpoints.save(stage, self.onto_helper.struct)
+
+
+	def set_checkpoints(self, checkpoint_folder, resume_from = None):
+		"""
+		Keeps a checkpoint of struct after each build stage in given folder.
+		Given a resume_from stage, struct is restored from the latest valid
+		checkpoint of a stage before it, and stages up to that one are
+		skipped. Other checkpoints are removed so that none an earlier run
+		left behind is mixed with this run's. Call once ontology files are
+		loaded, as checkpoints are only valid for the same files.
+
+		INPUT
+			checkpoint_folder: folder of checkpoint files
+			resume_from: a BUILD_STAGES stage, or 'output'
+		"""
+		fingerprint = self.onto_helper.get_sources_fingerprint()
+		if fingerprint is None:
+			print ('WARNING: ontology files loaded from URLs without mirror have no fingerprint; no checkpoints are kept.')
+			return
+
+		self.checkpoints = cp.Checkpoints(checkpoint_folder, fingerprint)
+		stages = self.BUILD_STAGES
+		if resume_from:
+			earlier = stages[0:stages.index(resume_from)] if resume_from in stages else stages
+			(stage, struct) = self.checkpoints.get_latest(earlier)
+			if stage is None:
+				print ('WARNING: no checkpoint to resume %s stage from; running all stages.' % resume_from)
+			else:
+				self.log('Resuming from checkpoint of stage ' + stage)
+				self.onto_helper.struct = struct
+				self.skipped_stages = set(stages[0:stages.index(stage) + 1])
+
+		self.checkpoints.clear([stage for stage in stages if not stage in self.skipped_stages])
+
+
+	def get_query_table(self, query_name, initBinds = {}):
+		"""
+		Returns table of given query's results over whole graph. The 'tree'
+		"is a" hierarchy under initBinds['root'] is read from subclass index
+		rather than queried, and 'inherited' rows are pushed down it from
+		the classes the 'primitives' query finds them on; see
+		get_inheritable_rows().
+		"""
+		started = self.profiler.get_time()
+		query_count = self.onto_helper.query_count
+		if query_name == 'tree':
+			table = self.onto_helper.do_tree_table(initBinds['root'], outside_parents = True)
+		elif query_name == 'inherited':
+			# 'primitives' query is counted when its stage is handed the table.
+			primitives = self.get_primitives_table()
+			started = self.profiler.get_time()
+			query_count = self.onto_helper.query_count
+			table = self.onto_helper.do_inherited_table(self.get_inheritable_rows(primitives))
+		else:
+			table = self.onto_helper.do_query_table(self.queries[query_name], initBinds,
+				self.QUERY_ORDER.get(query_name)) or []
+
+		self.profiler.add_query(query_name, table, started, self.TABLE_ENTITY_COLUMNS,
+			self.onto_helper.query_count - query_count)
+		return table
+
+
+	def get_primitives_table(self):
+		"""
+		Returns 'primitives' query table, which 'inherited' one is derived
+		from, leaving it in self.prefetched for get_prefetched_table() to
+		hand to the 'primitives' stage rather than run the query again.
+		"""
+		if not 'primitives' in self.prefetched:
+			started = self.profiler.get_time()
+			query_count = self.onto_helper.query_count
+			table = self.onto_helper.do_query_table(self.queries['primitives']) or []
+			self.prefetched['primitives'] = (table, self.profiler.get_time() - started,
+				self.onto_helper.query_count - query_count, [])
+
+		return self.prefetched['primitives'][0]
+
+
+	def get_inheritable_rows(self, primitives):
+		"""
+		Returns the rows of given 'primitives' table that classes pass down
+		to their descendants: a named class's own 'has primitive value
+		spec' datatype and constraints. Categorical rows are left out, as
+		the 'categoricals' query deals with xmls:anyURI inheritance.
+		"""
+		any_uri = 'http://www.w3.org/2001/XMLSchema#anyURI'
+		return [row for row in primitives
+			if all(isinstance(row[column], str) and not isinstance(row[column], rdflib.BNode)
+				for column in ('id', 'datatype'))
+			and self.onto_helper.get_expanded_id(row['datatype']) != any_uri]
+
+
+	def do_parallel_tables(self, query_names, processes):
+		"""
+		Runs given queries at once in a pool of forked processes, which
+		share the loaded graph copy-on-write rather than copying it. Only
+		result tables come back, to self.prefetched, to be handed to
+		builders in their usual order by get_prefetched_table(). Where
+		fork() isn't available queries are left to run one by one.
+		"""
+		global forked_ontology
+
+		if not 'fork' in multiprocessing.get_all_start_methods():
+			print ('WARNING: parallel queries need fork(); running them one by one.')
+			return
+
+		processes = min(processes, len(query_names))
+		self.log('Running %s queries in %s processes' % (len(query_names), processes))
+		forked_ontology = self
+		try:
+			with multiprocessing.get_context('fork').Pool(processes) as pool:
+				for (query_name, table, seconds, queries, prefixes) in pool.imap_unordered(get_forked_table, query_names):
+					self.prefetched[query_name] = (table, seconds, queries, prefixes)
+		finally:
+			forked_ontology = None
 
-		self.log('writing output')
-		# DO NOT USE sort_keys=True on piclists etc. because this overrides OrderedDict() sort order.
-		# BUT NEED TO IMPLEMENT json ordereddict sorting patch.
-		self.onto_helper.do_output_json(self.onto_helper.struct, output_file_basename)
+
+	def get_prefetched_table(self, query_name, initBinds = {}):
+		"""
+		Returns table of given query run by do_parallel_tables() or
+		get_primitives_table(), adding prefixes the query added to its
+		worker's @context to ours, as running it here would have. Other
+		queries are run now.
+		"""
+		if initBinds or not query_name in self.prefetched:
+			return self.get_query_table(query_name, initBinds)
+
+		(table, seconds, queries, prefixes) = self.prefetched.pop(query_name)
+		self.onto_helper.add_prefixes(prefixes)
+
+		self.profiler.add_query(query_name, table, self.profiler.get_time() - seconds, self.TABLE_ENTITY_COLUMNS, queries)
+		return table
+
+
+	def get_incremental_table(self, query_name, initBinds = {}):
+		"""
+		Returns the rows of given query that change a record of an entity in
+		self.rebuild_ids. Rather than running the query over the whole
+		graph, it is run once for each rebuilt entity bound to each column
+		in QUERY_ENTITY_VARIABLES, which is fast for a few dozen changed
+		terms. Rows found by more than one binding are kept once. The
+		cheap 'tree' table is simply filtered, and 'inherited' rows are
+		pushed down from 'primitives' ones of rebuilt entities and their
+		ancestors.
+		"""
+		if query_name == 'inherited':
+			ids = set(self.rebuild_ids)
+			index = self.onto_helper.get_subclass_index()
+			for id in self.rebuild_ids:
+				if ':' in id:
+					ids.update(self.onto_helper.get_entity_id(ancestor)
+						for ancestor in index.get_ancestors(rdflib.URIRef(self.onto_helper.get_expanded_id(id))))
+			primitives = self.get_bound_table('primitives', ids)
+			table = self.onto_helper.do_inherited_table(self.get_inheritable_rows(primitives))
+		elif query_name == 'tree':
+			table = self.get_query_table(query_name, initBinds)
+		else:
+			return self.get_bound_table(query_name, self.rebuild_ids, initBinds)
+
+		return [row for row in table
+			if any(row[variable] in self.rebuild_ids for variable in self.QUERY_ENTITY_VARIABLES[query_name])]
+
+
+	def get_bound_table(self, query_name, ids, initBinds = {}):
+		"""
+		Returns rows of given query with each of given entity ids bound in
+		turn to each column in QUERY_ENTITY_VARIABLES, each row once.
+		"""
+		table = []
+		found = set()
+		for variable in self.QUERY_ENTITY_VARIABLES[query_name]:
+			for id in sorted(ids):
+				if not ':' in id: # Blank node of previous release
+					continue
+				bindings = dict(initBinds)
+				bindings[variable] = rdflib.URIRef(self.onto_helper.get_expanded_id(id))
+				for row in self.get_query_table(query_name, bindings):
+					key = json.dumps(row, sort_keys = True, default = str)
+					if not key in found:
+						found.add(key)
+						table.append(row)
+
+		return table
+
+
+	def do_previous_release(self, options, output_file_basename):
+		"""
+		Incremental mode. Loads previous release of the ontology along with
+		the specification JSON generated from it (by default the existing
+		output file), and compares the two releases' graphs to find which
+		entities have to be rebuilt: changed terms, their descendants, and
+		the entities they point to. Sets self.rebuild_ids, and seeds
+		struct['specifications'] with copies of the other entities so that
+		builders find them as they would in a full run.
+
+		OUTPUT
+			previous release's specifications, for merge_specifications()
+		"""
+		previous_json = options.previous_json or output_file_basename + ('.json.gz' if options.gzip else '.json')
+		self.log('Loading previous output ', previous_json)
+		try:
+			with (gzip.open(previous_json, 'rt', encoding = 'utf-8') if previous_json.endswith('.gz') \
+				else open(previous_json, 'r')) as input_handle:
+				previous = json.load(input_handle, object_pairs_hook = OrderedDict)
+		except (IOError, OSError, ValueError) as e:
+			stop_err('Unable to load previous output %s: %s' % (previous_json, e))
+
+		# Keep previous prefixes so entity ids are shortened the same way.
+		for (prefix, path) in previous['@context'].items():
+			if not prefix in self.onto_helper.struct['@context']:
+				self.onto_helper.struct['@context'][prefix] = path
+
+		previous_helper = oh.OntoHelper()
+		previous_helper.graph_cache = self.onto_helper.graph_cache
+		previous_helper.mirror = self.onto_helper.mirror
+		(previous_ontology_file, _) = previous_helper.check_ont_file(options.previous_ontology, options)
+		self.log('Parsing previous release ', previous_ontology_file)
+		previous_helper.parse_ontology(previous_ontology_file)
+		previous_helper.do_ontology_includes(previous_ontology_file, options.import_jobs)
+
+		self.log('Comparing releases')
+		changed = self.onto_helper.get_changed_entities(previous_helper.graph)
+		self.rebuild_ids = set(self.onto_helper.get_entity_id(uri) for uri in changed)
+
+		specifications = previous['specifications']
+		# Disjunction components are keyed by blank node ids, which differ
+		# on each parse, so they're rebuilt along with their parent.
+		for id in list(self.rebuild_ids):
+			if id in specifications:
+				for component in specifications[id].get('components', {}):
+					if not ':' in component:
+						self.rebuild_ids.add(component)
+
+		self.log('Rebuilding %s entities' % len(self.rebuild_ids))
+		self.onto_helper.struct['specifications'] = copy.deepcopy(OrderedDict(
+			(id, entity) for (id, entity) in specifications.items() if not id in self.rebuild_ids))
+
+		return specifications
+
+
+	def merge_specifications(self, previous):
+		"""
+		Combines rebuilt entities with the previous release's other ones.
+		Records of entities that weren't rebuilt are taken from previous
+		output as is, discarding any side effects builders had on their
+		seeded copies. Rebuilt entities no longer found are dropped. Order
+		follows previous output, with new entities at the end.
+		"""
+		specifications = self.onto_helper.struct['specifications']
+		merged = OrderedDict()
+		for (id, entity) in previous.items():
+			if not id in self.rebuild_ids:
+				merged[id] = entity
+			elif id in specifications:
+				merged[id] = specifications[id]
+
+		for (id, entity) in specifications.items():
+			if not id in previous:
+				merged[id] = entity
+
+		self.onto_helper.struct['specifications'] = merged
 
 
 	def log(self, *args):
@@ -658,66 +1025,54 @@ class Ontology(object):
 		if 'replaced_by' in myDict:
 			myDict['replaced_by'] = self.onto_helper.get_entity_id(myDict['replaced_by'])
 
-		self.onto_helper.set_entity_default(
-			self.onto_helper.struct, 'specifications', id, myDict)
+		self.onto_helper.add_entity(id, myDict)
 
-		myURI = rdflib.URIRef(self.onto_helper.get_expanded_id(id))
-		#self.log('entity_text')
-		self.do_entity_text(id, myURI)
-		#self.log('synonyms')
-		self.do_entity_synonyms(id, myURI)
-		#self.log('dbxrefs')
-		self.do_entity_dbxrefs(id, myURI)
+		# Annotations come from tables harvested once over the whole graph.
+		annotations = self.onto_helper.get_annotations(
+			self.onto_helper.get_expanded_id(id))
+		self.do_entity_text(id, annotations)
+		self.do_entity_synonyms(id, annotations)
+		self.do_entity_dbxrefs(id, annotations)
 
 
-	def do_entity_text(self, id, myURI):
+	def do_entity_text(self, id, annotations):
 		"""
-		For given entity, all 'labels' query fields are returned (rdfs:label, IAO 
+		For given entity, all 'labels' fields are looked up (rdfs:label, IAO 
 		definition, UI label, UI definition) and added to the entity directly.
 
-		example myDict: {"label": "Bacteroides"}
+		example text: {"label": "Bacteroides"}
 		"""
 
-		rows = self.onto_helper.graph.query(
-			self.queries['entity_text'],	
-			initBindings = {'datum': myURI} 
-		)
-		if ":" in id and len(rows) == 0:
+		if ":" in id and not 'label' in annotations:
 			print ('ERROR in do_entity_text(): No rdfs:label entity for: ', id)
+			return
 
-		# Should only be 1 row to loop through
-		for row in rows: 
-			myDict = row.asdict()
-
-			# Adds any new text items to given id's structure
-			for field in myDict:
-				if len(myDict[field]) > 0:
-					self.onto_helper.struct['specifications'][id][field] = myDict[field] 
-					# avoiding update(myDict) because it may have empty values in it.
+		text = self.onto_helper.get_entity_text(annotations)
+		entity = self.onto_helper.get_entity(id)
+		# avoiding update() of entity directly because empty values are skipped.
+		for field in text:
+			entity[field] = text[field]
 
 
-	def do_entity_dbxrefs(self, id, myURI):
+	def do_entity_dbxrefs(self, id, annotations):
 		"""
 		Adds list of hasDbXref references to given entity.
 		"""
-		dbreferences = self.onto_helper.graph.query(
-			self.queries['dbreferences'], 
-			initBindings = {'datum': myURI }
-		)
-		if len(dbreferences):
+		if 'hasDbXref' in annotations:
 			# Establish hasDbXref list for given entity
-			dbxrefList = self.onto_helper.set_entity_default(
-				self.onto_helper.struct, 'specifications', id, 'hasDbXref', []
-			)		
-			for row in dbreferences:
-				dbxrefList.append(row['dbXref'])
+			dbxrefList = self.onto_helper.get_entity(id).setdefault('hasDbXref', [])
+			found = set(dbxrefList)
+			for dbXref in annotations['hasDbXref']:
+				if not dbXref in found:
+					found.add(dbXref)
+					dbxrefList.append(dbXref)
 
 
-	def do_entity_synonyms(self, id, myURI):
+	def do_entity_synonyms(self, id, annotations):
 		"""
 		Augment each entry in 'specifications' with array of hasSynonym etc. 
 		NOTE: 'has' is prefixed to synonym varieties below.
-		synonyms gathered from 'entity_synonyms' query of annotations: 
+		synonyms gathered from annotations: 
 
 			oboInOwl:hasSynonym
 			oboInOwl:hasExactSynonym
@@ -729,27 +1084,25 @@ class Ontology(object):
 		{language: Scottish Gaelic} etc. at end. 
 
 		INPUT
-			?datum ?Synonym ?ExactSynonym ?NarrowSynonym ?AlternativeTerm
+			annotations: {hasSynonym: [...], hasExactSynonym: [...], ...}
 		"""
-		synonyms = self.onto_helper.graph.query(
-			self.onto_helper.queries['entity_synonyms'], 
-			initBindings={'datum': myURI}
-		)
-		for row in synonyms:
-			for field in self.onto_helper.SYNONYM_FIELDS:
-
-				if field in row and len(row[field]): 
-					synonymTypeList = self.onto_helper.set_entity_default(
-						self.onto_helper.struct, 'specifications', id, field, []
-					)
+		for field in self.onto_helper.SYNONYM_FIELDS:
+
+			if field in annotations:
+				synonymTypeList = []
+				for synonym in annotations[field]:
+					if not len(synonym):
+						continue
 					# Clean up synonym phrases.  Insisting on terms separated
 					# by comma+space because chemistry expressions have tight
 					# comma separated synonyms.
-					
-					phrases = row[field].replace('\\n', '\n').strip().replace(', ','\n').replace('"','').split('\n')
+					phrases = synonym.replace('\\n', '\n').strip().replace(', ','\n').replace('"','').split('\n')
 					for phrase in phrases:
 						synonymTypeList.append( phrase.strip())
 
+				if len(synonymTypeList):
+					self.onto_helper.get_entity(id)[field] = synonymTypeList
+
 
 	def doPickLists(self, table):
 		""" ################################################################
@@ -762,7 +1115,6 @@ class Ontology(object):
 			cases where no other inheritance implications are done, it is possible.
 
 		"""
-		struct = 'specifications'
 		# Fashion complete picklists (flat list) of items, with parent(s) of each item, and members.
 		for myDict in table:
 			id = str(myDict['id'])
@@ -770,27 +1122,17 @@ class Ontology(object):
 			myDict.pop('parent_id')
 			#This picklist node might already have been mentioned in another picklist 
 			# node's member list so it might already be set up.
-			self.onto_helper.set_entity_default(
-				self.onto_helper.struct, struct, id, myDict)
+			entity = self.onto_helper.add_entity(id, myDict)
 			# MARKS PICKLIST ITEMS
-			self.onto_helper.set_entity_default(
-				self.onto_helper.struct, struct, id, 'datatype', 'xmls:anyURI') 
-			self.onto_helper.set_entity_default(
-				self.onto_helper.struct, struct, id, 'member_of', [])
-			self.onto_helper.get_struct(
-				self.onto_helper.struct, struct, id, 'member_of').append(parent_id)
+			entity.setdefault('datatype', 'xmls:anyURI')
+			entity.setdefault('member_of', []).append(parent_id)
 			# ALSO ADD 'located in' as 'part of' links for geo-location ?????
 
 			# Ditto for parent, if any...
-			self.onto_helper.set_entity_default(
-				self.onto_helper.struct, struct, parent_id, {'id': parent_id} )
-			self.onto_helper.set_entity_default(
-				self.onto_helper.struct, struct, parent_id, 'datatype', 'xmls:anyURI') 
-			self.onto_helper.set_entity_default(
-				self.onto_helper.struct, struct, parent_id, 'choices', OrderedDict())
+			parent = self.onto_helper.add_entity(parent_id)
+			parent.setdefault('datatype', 'xmls:anyURI')
 			# Empty array is set of features connected to a choice, handled separately
-			self.onto_helper.set_struct(
-				self.onto_helper.struct, struct, parent_id, 'choices', id, []) 
+			parent.setdefault('choices', OrderedDict())[id] = []
 
 
 	def doSpecComponents(self, table):
@@ -810,13 +1152,11 @@ class Ontology(object):
 				?parent_id ?id ?cardinality ?limit
 
 		"""
-		struct = 'specifications'
 		for myDict in table:
 
 			id = str(myDict['id'])
 
-			self.onto_helper.set_entity_default(
-				self.onto_helper.struct, struct, id, {'id': id} )
+			entity = self.onto_helper.add_entity(id)
 
 			# What datatype?
 
@@ -825,35 +1165,27 @@ class Ontology(object):
 				print ('ERROR: an entity mistakenly is "parent" of itself: %s ' % id)
 				continue
 
-			if not 'parent_id' in self.onto_helper.struct[struct][id]:
-				self.onto_helper.struct[struct][id]['parent_id'] = parentId
+			if not 'parent_id' in entity:
+				entity['parent_id'] = parentId
 
 			# Ensure parent exists and with default data type of 'model' since it has components.
 			# EXPRESSION models
-			self.onto_helper.set_entity_default(
-				self.onto_helper.struct, struct, parentId, {'id':parentId})
-			self.onto_helper.set_entity_default(
-				self.onto_helper.struct, struct, parentId, 'datatype', 'model')
+			parent = self.onto_helper.add_entity(parentId)
+			parent.setdefault('datatype', 'model')
 
 			# if parent_id already exists, then slot new parent id into otherParent.
-			if parentId != self.onto_helper.struct[struct][id]['parent_id']:
-				if not 'otherParent' in self.onto_helper.struct[struct][id]:
-					self.onto_helper.set_entity_default(
-						self.onto_helper.struct, struct, id, 'otherParent', [] )
+			if parentId != entity['parent_id']:
+				if not 'otherParent' in entity:
+					entity['otherParent'] = []
 				else:
-					self.onto_helper.struct[struct][id]['otherParent'].append(parentId)
+					entity['otherParent'].append(parentId)
 
 			cardObj = {'cardinality': myDict['cardinality']}
 			if 'limit' in myDict: 
 				cardObj.update(self.onto_helper.get_bindings(myDict['limit']))
 
 			# First time children list populated with this id's content:
-			self.onto_helper.set_entity_default(
-				self.onto_helper.struct, struct, parentId, 'components', {})
-			self.onto_helper.set_entity_default(
-				self.onto_helper.struct, struct, parentId, 'components', id, [])
-			self.onto_helper.get_struct(
-				self.onto_helper.struct, struct, parentId, 'components', id).append(cardObj)
+			parent.setdefault('components', {}).setdefault(id, []).append(cardObj)
 
 			# BNodes have no name but have expression.
 			if 'expression' in myDict: 
@@ -862,17 +1194,17 @@ class Ontology(object):
 
 				expression = myDict['expression']
 				# Usually expressions have 'disjunction' datatype
-				self.onto_helper.struct[struct][id]['datatype'] = expression['datatype'] 
+				entity['datatype'] = expression['datatype'] 
 
 				# TESTING REMOVAL, redundant
-				#self.onto_helper.struct[struct][id]['parent_id'] = parentId
+				#entity['parent_id'] = parentId
 				# Anonymous nodes imbedded within other classes don't get labels.
-				self.onto_helper.struct[struct][id]['label'] = '' 
-				self.onto_helper.struct[struct][id]['components'] = {}
+				entity['label'] = '' 
+				entity['components'] = {}
 				# List off each of the disjunction items, all with a 'some'
 				for ptr, partId in enumerate(expression['data']):
 					# So far logical expression parts have no further info. (like cardinality)
-					self.onto_helper.struct[struct][id]['components'][partId] = [{
+					entity['components'][partId] = [{
                         "datatype": "xmls:nonNegativeInteger",
                         "cardinality": "owl:qualifiedCardinality",
                         "value": "1"
@@ -918,17 +1250,14 @@ class Ontology(object):
 		ISSUE: ANONYMOUS NODES ARE MISSING DATATYPES, LABELS, MAYBE ALL BUT FIRST NODE
 
 		"""
-		struct = 'specifications'
 		for myDict in table:
 			id = myDict['id']
-			self.onto_helper.set_entity_default(
-				self.onto_helper.struct, struct, id, {'id':id} )
-			record = self.onto_helper.struct[struct][id]
-			self.onto_helper.set_entity_default(record, 'datatype', myDict['datatype'])
+			record = self.onto_helper.add_entity(id)
+			record.setdefault('datatype', myDict['datatype'])
 
 			if record['datatype'] != myDict['datatype']:
-				self.onto_helper.set_struct(record,'datatype', myDict['datatype'])
-				self.onto_helper.set_struct(record,'constraints', []) #override past constraints.
+				record['datatype'] = myDict['datatype']
+				record['constraints'] = [] #override past constraints.
 				#print ("ERROR for %s: multiple datatypes assigned: %s, %s" % (id, record['datatype']['type'], myDict['datatype']))
 
 			if 'constraint' in myDict:
@@ -961,8 +1290,7 @@ class Ontology(object):
 				elif record['datatype'] in ['xmls:anyURI'] and constraint == 'owl:qualifiedCardinality' and int(obj['value']) == 1:
 					continue
 
-				self.onto_helper.set_entity_default(record,'constraints', [])
-				self.onto_helper.get_struct(self.onto_helper.struct, struct, id, 'constraints').append(obj)
+				record.setdefault('constraints', []).append(obj)
 
 
 	def doUnits(self, table):
@@ -978,28 +1306,19 @@ class Ontology(object):
 		"""
 
 		for myDict in table:
-			if not myDict['id'] in self.onto_helper.struct['specifications']:
+			entity = self.onto_helper.get_entity(myDict['id'])
+			if entity is None:
 				print ("NOTE: field [%s] isn't listed in a specification, but a unit [%s] is attached to it" % (myDict['id'],myDict['unit']))
 				continue
 			else:
-				self.onto_helper.set_entity_default(
-					self.onto_helper.struct, 'specifications', 
-					myDict['id'], 'units', []
-				)
-				self.onto_helper.get_struct(
-					self.onto_helper.struct, 'specifications',
-					myDict['id'], 'units'
-				).append(myDict['unit'])
+				entity.setdefault('units', []).append(myDict['unit'])
 
 				# Ensure specifications has this unit
-				self.onto_helper.set_struct(
-					self.onto_helper.struct, 'specifications',
-					myDict['unit'], {
-						'id': myDict['unit'],
-						'label': myDict['label'],
-						'datatype': 'xmls:anyURI'
-					}
-				)
+				self.onto_helper.struct['specifications'][myDict['unit']] = {
+					'id': myDict['unit'],
+					'label': myDict['label'],
+					'datatype': 'xmls:anyURI'
+				}
 
 
 	def doUIFeatures(self, table, table_name):
@@ -1061,7 +1380,8 @@ class Ontology(object):
 		#Loop through query results; each line has one id, feature, referrer.
 		for myDict in table:
 			entityId = myDict['id']
-			if not entityId in self.onto_helper.struct['specifications']:
+			entity = self.onto_helper.get_entity(entityId)
+			if entity is None:
 				print ("Error, no specification for id ", entityId, " when working on", table_name)
 				continue
 
@@ -1126,9 +1446,7 @@ class Ontology(object):
 			# 'features' list.  Client side programming determines
 			# what overrides what.
 			if parent_id == '':
-				entity = self.onto_helper.struct['specifications'][entityId]
-				self.onto_helper.set_entity_default(entity, 'features', {})
-				entity['features'][feature] = featureDict
+				entity.setdefault('features', {})[feature] = featureDict
 				if feature == 'order':
 					# Reorganize entity's components, models, and choices according to featureDict['value'] list.
 					self.onto_helper.reorder(entity,'models', featureDict['value'])
@@ -1140,18 +1458,16 @@ class Ontology(object):
 			# Here entity has feature with respect to a parent, so mark in 
 			# parent's entity.  Normally use "components" link but what
 			# about models?
-			parent = self.onto_helper.get_struct(self.onto_helper.struct, 'specifications', parent_id)
+			parent = self.onto_helper.get_entity(parent_id)
 			if not parent:
 				print ("Error when adding feature: couldn't locate ", parent_id)
 				continue
 				
 			featureDict['feature'] = feature
-			self.onto_helper.set_entity_default(parent, 'components', OrderedDict())
-			self.onto_helper.set_entity_default(parent, 'components', entityId,[])
-			self.onto_helper.get_struct(parent, 'components', entityId).append(featureDict)	
+			parent.setdefault('components', OrderedDict()).setdefault(entityId, []).append(featureDict)
 
 
-	def get_command_line(self):
+	def get_command_line(self, args = None):
 		"""
 		*************************** Parse Command Line *****************************
 		"""
@@ -1165,7 +1481,39 @@ class Ontology(object):
 
 		parser.add_option('-o', '--output', dest='output_folder', type='string', help='Path of output file to create')
 
-		return parser.parse_args()
+		parser.add_option('-z', '--gzip', dest='gzip', default=False, action='store_true', help='Write gzip compressed output files.')
+
+		parser.add_option('--shard-size', dest='shard_size', type='int', help='Write specifications as [ontology].shards/ folder of JSON shards of about this many entities each, with a manifest.json of @context, metadata and shard of each entity id, instead of one [ontology].json file.')
+
+		parser.add_option('--shard-by', dest='shard_by', type='choice', choices=['subtree', 'hash'], default='subtree', help='How --shard-size output is split: subtree (default) keeps entities with their topmost parent_id ancestor; hash splits by hash of entity id.')
+
+		parser.add_option('-f', '--format', dest='input_format', type='choice', choices=['xml', 'nt', 'turtle', 'obographs'], help='Format of ontology file: xml (RDF/XML), nt (N-Triples), turtle or obographs (OBO Graphs JSON). Detected from file content or extension if not given; import files are always detected.')
+
+		parser.add_option('-e', '--engine', dest='engine', type='choice', choices=['memory', 'sqlite', 'numpy'], default='memory', help='Triple store engine: memory (default), sqlite to load ontology into an indexed SQLite file that later runs reuse, or numpy to hold it as integer encoded NumPy arrays (needs NumPy).')
+
+		parser.add_option('-s', '--store', dest='store_file', type='string', help='SQLite file of sqlite engine (default ~/.cache/geem/stores/[ontology]-[hash].sqlite)')
+
+		parser.add_option('-c', '--cache', dest='cache_folder', type='string', help='Folder of parsed ontology file cache (default ~/.cache/geem/graphs)')
+
+		parser.add_option('-m', '--mirror', dest='mirror_folder', type='string', help='Folder of downloaded ontology file mirror, for ontologies given by URL (default ~/.cache/geem/mirror)')
+
+		parser.add_option('-q', '--query-cache', dest='query_cache_folder', type='string', help='Folder of query result cache, which later runs over unchanged ontology files read instead of querying (default ~/.cache/geem/queries)')
+
+		parser.add_option('--no-cache', dest='no_cache', default=False, action='store_true', help='Always fetch and parse ontology files, and parse and run queries, instead of loading them from mirror or cache.')
+
+		parser.add_option('-j', '--jobs', dest='jobs', type='int', default=1, help='Number of processes to run independent queries in at once (default 1). Not used in incremental mode.')
+
+		parser.add_option('--import-jobs', dest='import_jobs', type='int', help='Number of processes to parse import files in at once (default number of CPUs)')
+
+		parser.add_option('-p', '--previous', dest='previous_ontology', type='string', help='Previous release of ontology file; only entities changed since then are rebuilt, starting from previous output.')
+
+		parser.add_option('--previous-output', dest='previous_json', type='string', help='Specification JSON generated from previous release (default: existing output file)')
+
+		parser.add_option('-k', '--checkpoints', dest='checkpoints', default=False, action='store_true', help='Save a checkpoint of specifications after each build stage, in [ontology].checkpoints/ next to output. Not used in incremental mode.')
+
+		parser.add_option('--resume-from', dest='resume_from', type='choice', choices=Ontology.BUILD_STAGES + ['output'], help='Build stage to resume from, after restoring specifications from the latest checkpoint of an earlier stage a run over the same ontology files saved; implies --checkpoints. Stages: ' + ', '.join(Ontology.BUILD_STAGES + ['output']))
+
+		return parser.parse_args(args)
 
 
 if __name__ == '__main__':
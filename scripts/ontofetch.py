@@ -12,6 +12,9 @@
 	definitions, synonyms, deprecated status, and replacement term if
 	any.  Output is produced as json or tabular tsv.
 
+	Ontology files may be RDF/XML, N-Triples, Turtle or OBO Graphs JSON;
+	see python/ontoformat.py.
+
 	RDFLib: This script requires python module RDFLib. RDFLib sparql 
 	ISSUE: Doing a "BINDING (?x as ?y)" expression prevents ?x from 
 	being output in a SELECT. bug leads to no such field being output.
@@ -23,6 +26,10 @@
 	e.g. python ontofetch.py https://raw.githubusercontent.com/obi-ontology/obi/master/obi.owl -o test/
 	     writes files test/obi.json and test/obi.tsv into test/ subfolder.
 
+	e.g. python ontofetch.py obi.owl genepio.owl -b more_ontologies.txt -o test/
+	     writes json and tsv files of each ontology, parsing the import
+	     files they have in common only once.
+
 
 	FUTURE: Get ontology version, and add to output core filename ???
 	
@@ -35,9 +42,6 @@ import os
 import optparse
 import python.ontohelper as oh
 
-import rdflib
-from rdflib.plugins.sparql import prepareQuery
-
 # Do this, otherwise a warning appears on stdout: No handlers could be 
 #found for logger "rdflib.term"
 import logging; logging.basicConfig(level=logging.ERROR) 
@@ -80,70 +84,8 @@ class Ontology(object):
 		PREFIX xmls: <http://www.w3.org/2001/XMLSchema#>
 		""" 
 	 
-		self.queries = {
-			##################################################################
-			# Generic TREE "is a" hierarchy from given root.
-			#
-			'tree': prepareQuery("""
-				SELECT DISTINCT ?id ?label ?parent_id ?deprecated ?replaced_by 
-				WHERE {	
-					?parent_id rdfs:subClassOf* ?root.
-					?id rdfs:subClassOf ?parent_id.
-					OPTIONAL {?id rdfs:label ?label}.
-	 				OPTIONAL {?id GENEPIO:0000006 ?ui_label}. # for ordering
-					OPTIONAL {?id owl:deprecated ?deprecatedAnnot.
-						BIND(xsd:string(?deprecatedAnnot) As ?deprecated).
-					}.
-					OPTIONAL {?id IAO:0100001 ?replaced_byAnnot.
-						BIND(xsd:string(?replaced_byAnnot) As ?replaced_by).
-					}.	
-				}
-				ORDER BY ?parent_id ?ui_label ?label 
-			""", initNs = self.onto_helper.namespace),
-
-
-			# ################################################################
-			# UI LABELS 
-			# These are annotations directly on an entity.  This is the only place
-			# that ui_label and ui_definition should really operate. Every entity
-			# in OWL file is retrieved for their rdfs:label, IAO definition etc.
-			# FUTURE: ADD SORTING OPTIONS, CUSTOM ORDER.
-			'entity_text': prepareQuery("""
-
-				SELECT DISTINCT ?label ?definition ?ui_label ?ui_definition
-				WHERE {  
-					{?datum rdf:type owl:Class} 
-					UNION {?datum rdf:type owl:NamedIndividual} 
-					UNION {?datum rdf:type rdf:Description}.
-					OPTIONAL {?datum rdfs:label ?label.} 
-					OPTIONAL {?datum IAO:0000115 ?definition.}
-					OPTIONAL {?datum GENEPIO:0000006 ?ui_label.} 
-					OPTIONAL {?datum GENEPIO:0000162 ?ui_definition.}
-				} ORDER BY ?label
-			""", initNs = self.onto_helper.namespace),
-
-
-			# ################################################################
-			# Terms are augmented with synonyms in order for type-as-you-go inputs
-			# to return appropriately filtered phrases
-			#
-			# INPUT
-			# 	?datum : id of term to get labels for
-			# OUTPUT
-			#   ?Synonym ?ExactSynonym ?NarrowSynonym
-			#
-			'entity_synonyms': prepareQuery("""
-
-				SELECT DISTINCT ?datum ?Synonym ?ExactSynonym ?NarrowSynonym ?AlternativeTerm
-				WHERE {  
-					{?datum rdf:type owl:Class} UNION {?datum rdf:type owl:NamedIndividual}.
-					{?datum oboInOwl:hasSynonym ?Synonym.} 
-					UNION {?datum oboInOwl:hasExactSynonym ?ExactSynonym.}
-					UNION {?datum oboInOwl:hasNarrowSynonym ?NarrowSynonym.}
-					UNION {?datum IAO:0000118 ?AlternativeTerm.}
-				}
-			""", initNs = self.onto_helper.namespace),
-
+		# Prepared on first use; see OntoHelper.add_queries()
+		self.queries = self.onto_helper.add_queries({
 			# ################################################################
 			# Fetch parent IDs of given entity. with respect to class-subclass
 			# relations.
@@ -153,34 +95,114 @@ class Ontology(object):
 			# OUTPUT
 			#   ?parent_ids
 			#
-			'entity_parents': prepareQuery("""
+			'entity_parents': """
 				SELECT DISTINCT ?datum_id (group_concat(distinct ?parent_id;separator=",") as ?parent_ids)
 				WHERE {
 					?datum_id rdfs:subClassOf ?parent_id.
 					?parent_id rdfs:label ?label # to ensure parent_id entity is in graph as well.
 				}
-			""", initNs = self.onto_helper.namespace),
-		}
+			""",
+		})
 
-	def __main__(self):
+	def __main__(self, args = None):
 		"""
 		
 		Note rdflib utf8 issue below.
 
 		INPUT
-			args[0]:string A filepath or URL of ontology to process
+			args: command line argument list, by default the one this
+				script was started with. args[0]:string A filepath or URL
+				of ontology to process. More than one, or a --batch file,
+				runs batch mode; see do_batch().
 		"""
 
-		(options, args) = self.get_command_line()
+		(options, args) = self.get_command_line(args)
 
 		if options.code_version:
 			print (self.CODE_VERSION)
 			return self.CODE_VERSION
 
-		if not len(args):
-			stop_err('Please supply an OWL ontology file (in RDF format)')
+		ontologies = [(ontology_file, options.root_uri) for ontology_file in args]
+		if options.batch_file:
+			ontologies.extend(self.get_batch(options.batch_file, options.root_uri))
+
+		if not len(ontologies):
+			stop_err('Please supply an OWL ontology file (in RDF/XML, N-Triples, Turtle or OBO Graphs JSON format)')
+
+		if len(ontologies) == 1:
+			self.do_ontology(ontologies[0][0], ontologies[0][1], options)
+		else:
+			self.do_batch(ontologies, options)
+
+
+	def get_batch(self, batch_file, root_uri):
+		"""
+		Returns [(ontology file path or URL, root term URI)] listed in given
+		batch file, one ontology per line, optionally followed by the root
+		term to fetch from; root_uri otherwise. Blank lines and lines
+		starting with # are skipped.
+
+			https://raw.githubusercontent.com/obi-ontology/obi/master/obi.owl	http://purl.obolibrary.org/obo/BFO_0000001
+			../genepio/src/ontology/genepio-merged.owl
+		"""
+		ontologies = []
+		with open(batch_file, 'r') as batch_handle:
+			for line in batch_handle:
+				fields = line.split()
+				if fields and fields[0][0] != '#':
+					ontologies.append((fields[0], fields[1] if len(fields) > 1 else root_uri))
+
+		return ontologies
+
+
+	def do_batch(self, ontologies, options):
+		"""
+		Fetches terms of each given (ontology, root term URI) in turn, into
+		its own output files. Import files are parsed only once for the
+		whole batch: each ontology's graph is its own triples overlaid on
+		shared graphs of the imports it has; see
+		OntoHelper.set_shared_imports(). Output is the same as running
+		each ontology on its own.
+		"""
+		if options.engine == 'sqlite':
+			stop_err('Batch mode needs the memory or numpy engine')
+
+		shared_imports = {}
+		for (ontology_file, root_uri) in ontologies:
+			self.onto_helper = oh.OntoHelper()
+			self.queries = self.onto_helper.add_queries(self.queries.texts)
+			self.do_ontology(ontology_file, root_uri, options, shared_imports)
+
+		print ('Fetched %s ontologies sharing %s import files' % (len(ontologies), len(shared_imports)))
+
+
+	def do_ontology(self, ontology_file, root_uri, options, shared_imports = None):
+		"""
+		Loads given ontology, and writes the terms under root_uri to its
+		json and tsv output files.
 
-		(main_ontology_file, output_file_basename) = self.onto_helper.check_ont_file(args[0], options)
+		INPUT
+			ontology_file: file path or URL of ontology
+			root_uri: URI of root term
+			options: get_command_line() options
+			shared_imports: import graphs shared with other ontologies of
+				a batch, if any
+		"""
+		(main_ontology_file, output_file_basename) = self.onto_helper.check_ont_file(ontology_file, options)
+
+		if options.engine == 'sqlite':
+			store_file = options.store_file or self.onto_helper.get_store_file(main_ontology_file)
+			self.onto_helper.set_engine(options.engine, store_file)
+		elif options.engine == 'numpy':
+			self.onto_helper.set_engine(options.engine)
+
+		if shared_imports is not None:
+			self.onto_helper.set_shared_imports(shared_imports)
+
+		if not options.no_cache:
+			self.onto_helper.set_graph_cache(options.cache_folder)
+			self.onto_helper.set_mirror(options.mirror_folder)
+			self.onto_helper.set_prepared_query_cache()
 
 		# Load main ontology file into RDF graph
 		print ("Fetching and parsing " + main_ontology_file + " ...")
@@ -189,14 +211,17 @@ class Ontology(object):
 			# ISSUE: ontology file taken in as ascii; rdflib doesn't accept
 			# utf-8 characters so can experience conversion issues in string
 			# conversion stuff like .replace() below
-			self.onto_helper.graph.parse(main_ontology_file, format='xml')
+			self.onto_helper.parse_ontology(main_ontology_file, options.input_format)
 
 		except Exception as e:
 			#urllib2.URLError: <urlopen error [Errno 8] nodename nor servname provided, or not known>
 			stop_err('WARNING:' + main_ontology_file + " could not be loaded!\n", e)
 
 		# Add each ontology include file (must be in OWL RDF format)
-		self.onto_helper.do_ontology_includes(main_ontology_file)
+		self.onto_helper.do_ontology_includes(main_ontology_file, options.import_jobs)
+
+		# Label and synonym tables harvested in one pass over graph.
+		self.onto_helper.do_annotation_tables()
 
 		# Load self.struct with ontology metadata
 		self.onto_helper.set_ontology_metadata(self.onto_helper.queries['ontology_metadata'])
@@ -206,15 +231,15 @@ class Ontology(object):
 		# and place in self.onto_helper.struct.specifications. To retrieve a 
 		# branch like BFO:entity (BFO:0000001), add command line option:
 		# -r http://purl.obolibrary.org/obo/BFO_0000001  
-		print ('Doing term hierarchy query starting at:' + options.root_uri)
-		specBinding = {'root': rdflib.URIRef(options.root_uri)} 
-		entities = self.onto_helper.do_query_table(self.queries['tree'], specBinding)
+		print ('Doing term hierarchy query starting at:' + root_uri)
+		# "is a" hierarchy is read from subclass index; no sparql needed.
+		entities = self.onto_helper.do_tree_table(root_uri, label = True)
 
 		print ('Doing terms: ' + str(len(entities)) )
 		self.do_entities(entities)
 		
-		self.onto_helper.do_output_json(self.onto_helper.struct, output_file_basename)
-		self.onto_helper.do_output_tsv(self.onto_helper.struct, output_file_basename, self.fields)
+		self.onto_helper.do_output_json(self.onto_helper.struct, output_file_basename, options.gzip)
+		self.onto_helper.do_output_tsv(self.onto_helper.struct, output_file_basename, self.fields, options.gzip)
 
 
 	def do_entities(self, table):
@@ -237,15 +262,18 @@ class Ontology(object):
 			
 		"""
 
-		# List of parents to process after 1st pass through table's entities.
+		# List of parents to process after 1st pass through table's entities,
+		# and set of them for membership tests.
 		parents = [] 
+		parent_ids = set()
 
 		for myDict in table:
 			self.do_entity(myDict)
 
 			parent_id = self.onto_helper.get_parent_id(myDict) 
 			if parent_id:
-				if not parent_id in parents:
+				if not parent_id in parent_ids:
+					parent_ids.add(parent_id)
 					parents.append(parent_id)
 
 		# 2nd pass does parents:
@@ -253,11 +281,10 @@ class Ontology(object):
 		# If not already mentioned in its own right, then it was parent
 		# of top-level entity, and not really important.
 		for parent_id in parents:
-			if not parent_id in self.onto_helper.struct['specifications']:
-				self.onto_helper.set_entity_default(self.onto_helper.struct, 'specifications', parent_id, {
-					'id': parent_id, 
-					'datatype': 'entity'
-				})
+			self.onto_helper.add_entity(parent_id, {
+				'id': parent_id, 
+				'datatype': 'entity'
+			})
 
 
 	def do_entity(self, myDict):
@@ -286,8 +313,8 @@ class Ontology(object):
 
 		# Addresses case where a term is in query more than once, as
 		# a result of being positioned in different places in hierarchy.
-		if id in self.onto_helper.struct['specifications']:
-			existing = self.onto_helper.struct['specifications'][id]
+		existing = self.onto_helper.get_entity(id)
+		if existing is not None:
 			parent_id = myDict['parent_id']
 			existing_p_id = existing['parent_id']
 			if parent_id and existing_p_id and parent_id != existing_p_id:
@@ -295,34 +322,30 @@ class Ontology(object):
 					existing['other_parents'] = []
 				existing['other_parents'].append(parent_id)
 
-		self.onto_helper.set_entity_default(self.onto_helper.struct, 'specifications', id, myDict)
+		self.onto_helper.add_entity(id, myDict)
 
-		self.do_entity_text(id)
-		self.do_entity_synonyms(id)
+		# Annotations come from tables harvested once over the whole graph.
+		annotations = self.onto_helper.get_annotations(
+			self.onto_helper.get_expanded_id(id))
+		self.do_entity_text(id, annotations)
+		self.do_entity_synonyms(id, annotations)
 
 
-	def do_entity_text(self, id):
+	def do_entity_text(self, id, annotations):
 		"""
-		For given entity, all 'labels' query fields are returned (rdfs:label, IAO 
-		definition, UI label, UI definition) and added to the entity directly.
+		For given entity, all 'labels' fields (rdfs:label, IAO definition, UI
+		label, UI definition) are added to the entity directly.
 
 		"""
-		myURI = rdflib.URIRef(self.onto_helper.get_expanded_id(id))
-		rows = self.onto_helper.graph.query(
-			self.queries['entity_text'],	
-			initBindings = {'datum': myURI} 
-		)
-		# Should only be 1 row to loop through
-		for row in rows: 
-			myDict = row.asdict()	
-			# Adds any new text items to given id's structure
-			self.onto_helper.struct['specifications'][id].update(myDict) 
-
-
-	def do_entity_synonyms(self, id):
+		# Adds any new text items to given id's structure
+		self.onto_helper.get_entity(id).update(
+			self.onto_helper.get_entity_text(annotations))
+
+
+	def do_entity_synonyms(self, id, annotations):
 		"""
 		Augment each entry in 'specifications' with semi-colon-delimited 
-		synonyms gathered from 'entity_synonyms' query of annotations: 
+		synonyms gathered from annotations: 
 
 			oboInOwl:hasSynonym
 			oboInOwl:hasExactSynonym
@@ -334,39 +357,34 @@ class Ontology(object):
 		{language: Scottish Gaelic} etc. at end. 
 
 		INPUT
-			?datum ?Synonym ?ExactSynonym ?NarrowSynonym ?AlternativeTerm
+			annotations: {hasSynonym: [...], hasExactSynonym: [...], ...}
 		"""
-		
-		myURI = rdflib.URIRef(self.onto_helper.get_expanded_id(id))
-		rows = self.onto_helper.graph.query(self.queries['entity_synonyms'], initBindings={'datum': myURI })
 		synonymArray = []
 
-		for row in rows:
-
-			# Specification distinguishes between these kinds of synonym
-			for field in ['Synonym','ExactSynonym','NarrowSynonym','AlternativeTerm']:
-
-				if row[field]: 
-					# Clean up synonym phrases.  Insisting on terms separated
-					# by comma+space because chemistry expressions have tight
-					# comma separated synonyms
-					stringy = row[field].encode('unicode-escape').decode('utf8').replace('\\n', '\n')
-					phrases = stringy.strip().replace(', ','\n').replace('"','').split('\n')
-					for phrase in phrases:
-						synonymArray.append( phrase.strip())
+		# Specification distinguishes between these kinds of synonym
+		for field in self.onto_helper.SYNONYM_FIELDS:
+
+			for synonym in annotations.get(field, []):
+				# Clean up synonym phrases.  Insisting on terms separated
+				# by comma+space because chemistry expressions have tight
+				# comma separated synonyms
+				stringy = synonym.encode('unicode-escape').decode('utf8').replace('\\n', '\n')
+				phrases = stringy.strip().replace(', ','\n').replace('"','').split('\n')
+				for phrase in phrases:
+					synonymArray.append( phrase.strip())
 	
 		if len(synonymArray) > 0:
 			synonym_text = ';'.join(synonymArray)
-			self.onto_helper.set_entity_default(self.onto_helper.struct, 'specifications', id, 'synonyms', synonym_text )
+			self.onto_helper.get_entity(id).setdefault('synonyms', synonym_text)
 
 
-	def get_command_line(self):
+	def get_command_line(self, args = None):
 		"""
 		*************************** Parse Command Line *****************************
 		"""
 		parser = MyParser(
 			description = 'Ontology term fetch to tabular output.  See https://github.com/GenEpiO/genepio',
-			usage = 'ontofetch.py [ontology file path or URL] [options]*',
+			usage = 'ontofetch.py [ontology file path or URL]* [options]*',
 			epilog="""  """)
 		
 		# first (unnamed) parameter is input file or URL
@@ -376,9 +394,27 @@ class Ontology(object):
 		parser.add_option('-v', '--version', dest='code_version', default=False, action='store_true', help='Return version of this code.')
 
 		parser.add_option('-o', '--output', dest='output_folder', type='string', help='Path of output file to create')
+
+		parser.add_option('-z', '--gzip', dest='gzip', default=False, action='store_true', help='Write gzip compressed output files.')
+
+		parser.add_option('-f', '--format', dest='input_format', type='choice', choices=['xml', 'nt', 'turtle', 'obographs'], help='Format of ontology file: xml (RDF/XML), nt (N-Triples), turtle or obographs (OBO Graphs JSON). Detected from file content or extension if not given; import files are always detected.')
+
+		parser.add_option('-e', '--engine', dest='engine', type='choice', choices=['memory', 'sqlite', 'numpy'], default='memory', help='Triple store engine: memory (default), sqlite to load ontology into an indexed SQLite file that later runs reuse, or numpy to hold it as integer encoded NumPy arrays (needs NumPy).')
+
+		parser.add_option('-s', '--store', dest='store_file', type='string', help='SQLite file of sqlite engine (default ~/.cache/geem/stores/[ontology]-[hash].sqlite)')
+
+		parser.add_option('-c', '--cache', dest='cache_folder', type='string', help='Folder of parsed ontology file cache (default ~/.cache/geem/graphs)')
+
+		parser.add_option('-m', '--mirror', dest='mirror_folder', type='string', help='Folder of downloaded ontology file mirror, for ontologies given by URL (default ~/.cache/geem/mirror)')
+
+		parser.add_option('--no-cache', dest='no_cache', default=False, action='store_true', help='Always fetch and parse ontology files and queries instead of loading them from mirror or cache.')
 		
+		parser.add_option('--import-jobs', dest='import_jobs', type='int', help='Number of processes to parse import files in at once (default number of CPUs)')
+
 		parser.add_option('-r', '--root', dest='root_uri', type='string', help='Root term to fetch underlying terms from (full URI)', default='http://www.w3.org/2002/07/owl#Thing')
-		return parser.parse_args()
+
+		parser.add_option('-b', '--batch', dest='batch_file', type='string', help='File listing ontology file paths or URLs to fetch terms of, one per line, each optionally followed by its root term URI (default --root). These, and any given as arguments, are run in one process that parses their common import files once.')
+		return parser.parse_args(args)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,361 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" **************************************************************************
+	python ontoservice.py [folder of OWL files] [options]*
+
+	Ingestion service which keeps a folder of ontologies' jsonimo.py (and
+	optionally ontofetch.py) outputs up to date.
+
+	The folder is polled for new or changed .owl files (see
+	python/folderwatcher.py). A changed file is queued once it has stopped
+	changing for a settle period, so a burst of saves leads to one run, and
+	queued files are processed by a fixed size pool of worker processes.
+	If a file changes again while it is being processed, it is processed
+	again once that run is done. A failed job - e.g. because an import URL
+	couldn't be reached - is retried after a delay, which doubles with each
+	failure in a row, up to an hour.
+
+	Worker processes are kept between jobs, so each job starts with modules
+	loaded, and with recently parsed files - typically imports the
+	ontologies share - held in memory as well as in the graph cache folder.
+
+	Each job writes into a temporary folder in the output folder, and its
+	files are only moved into place, each with an atomic rename, once the
+	job has succeeded. Readers of the output folder never see a partly
+	written file, and a failed job leaves the previous outputs untouched.
+	A [ontology].log of the script output of each job's last run is kept
+	alongside.
+
+	e.g. python ontoservice.py ../ontologies -o ../ontologies/output -w 4
+
+	e.g. python ontoservice.py ../ontologies --once -r http://purl.obolibrary.org/obo/OBI_0000658
+		processes ontologies changed since last run, also running
+		ontofetch.py from given root into output/ontofetch/, and exits.
+
+	**************************************************************************
+"""
+
+import json
+import sys
+import os
+import time
+import signal
+import shutil
+import tempfile
+import traceback
+import contextlib
+import multiprocessing
+import optparse
+
+import jsonimo
+import ontofetch
+import python.graphcache as gc
+import python.folderwatcher as fw
+
+# Temporary job folders in output folder start with this.
+JOB_PREFIX = '.job-'
+
+# Subfolder of output folder for ontofetch.py outputs.
+FETCH_FOLDER = 'ontofetch'
+
+# File in output folder holding signatures of ontology files processed.
+STATE_FILE = '.ontoservice.json'
+
+# Longest delay, in seconds, before a failed job is retried.
+MAX_RETRY_DELAY = 3600
+
+def stop_err(msg, exit_code = 1):
+	sys.stderr.write("%s\n" % msg)
+	sys.exit(exit_code)
+
+class MyParser(optparse.OptionParser):
+	"""
+	Allows formatted help info.  From http://stackoverflow.com/questions/1857346/python-optparse-how-to-include-additional-info-in-usage-output.
+	"""
+	def format_epilog(self, formatter):
+		return self.epilog
+
+
+def init_worker(memory_triples):
+	"""
+	Pool worker initializer: keeps parsed files in memory between jobs.
+	Ctrl-C is left to service process, which stops workers itself.
+	"""
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+	gc.set_memory_cache(memory_triples)
+
+
+def run_job(job):
+	"""
+	Pool worker: runs jsonimo.py, and ontofetch.py if it has arguments, on
+	one ontology file. Returns (ontology file, error or None, seconds).
+
+	INPUT
+		job: (ontology file, output folder, jsonimo.py arguments,
+			ontofetch.py arguments or None). Arguments exclude the ontology
+			file and -o.
+	"""
+	(ontology_file, output_folder, jsonimo_args, ontofetch_args) = job
+	started = time.time()
+	name = os.path.basename(ontology_file).rsplit('.',1)[0]
+	work_folder = tempfile.mkdtemp(prefix = JOB_PREFIX, dir = output_folder)
+	log_file = os.path.join(work_folder, name + '.log')
+	error = None
+
+	try:
+		with open(log_file, 'w') as log_handle, \
+			contextlib.redirect_stdout(log_handle), contextlib.redirect_stderr(log_handle):
+			try:
+				jsonimo.Ontology().__main__([ontology_file, '-o', work_folder] + jsonimo_args)
+				if ontofetch_args is not None:
+					fetch_folder = os.path.join(work_folder, FETCH_FOLDER)
+					os.makedirs(fetch_folder)
+					ontofetch.Ontology().__main__([ontology_file, '-o', fetch_folder] + ontofetch_args)
+
+			except SystemExit as e: # stop_err()
+				if not e.code in (None, 0):
+					error = 'stopped with: %s' % e.code
+			except Exception as e:
+				traceback.print_exc()
+				error = '%s: %s' % (type(e).__name__, e)
+
+		if error is None:
+			move_outputs(work_folder, output_folder, exclude = [log_file])
+		os.replace(log_file, os.path.join(output_folder, name + '.log'))
+
+	except Exception as e:
+		error = '%s: %s' % (type(e).__name__, e)
+
+	finally:
+		shutil.rmtree(work_folder, ignore_errors = True)
+
+	return (ontology_file, error, round(time.time() - started, 3))
+
+
+def move_outputs(work_folder, output_folder, exclude = []):
+	""" Moves each file under work folder to same place in output folder. """
+	for (folder, subfolders, file_names) in os.walk(work_folder):
+		target_folder = os.path.join(output_folder, os.path.relpath(folder, work_folder))
+		if not os.path.isdir(target_folder):
+			os.makedirs(target_folder)
+		for file_name in file_names:
+			file_path = os.path.join(folder, file_name)
+			if not file_path in exclude:
+				os.replace(file_path, os.path.join(target_folder, file_name))
+
+
+class OntologyService(object):
+
+	CODE_VERSION = '0.0.1'
+
+	def __init__(self):
+		# Ontology file -> (AsyncResult, file signature) of its job in progress
+		self.running = {}
+		# Ontology files changed again while their job was in progress
+		self.rerun = set()
+		# Ontology file -> signature of version last processed successfully
+		self.state = {}
+		# Ontology file -> failed jobs in a row, and time of next retry
+		self.failures = {}
+		self.retries = {}
+		self.retry_delay = 60
+
+
+	def __main__(self, args = None):
+
+		(options, args) = self.get_command_line(args)
+
+		if options.code_version:
+			print (self.CODE_VERSION)
+			return self.CODE_VERSION
+
+		if not len(args) or not os.path.isdir(args[0]):
+			stop_err('Please supply a folder of OWL ontology files')
+
+		folder = os.path.abspath(args[0])
+		self.output_folder = os.path.abspath(options.output_folder or os.path.join(folder, 'output'))
+		if not os.path.isdir(self.output_folder):
+			os.makedirs(self.output_folder)
+		self.do_cleanup()
+
+		self.state_file = os.path.join(self.output_folder, STATE_FILE)
+		self.state = self.get_state()
+		(self.jsonimo_args, self.ontofetch_args) = self.get_script_args(options)
+		self.retry_delay = options.retry_delay
+
+		watcher = fw.FolderWatcher(folder, options.pattern,
+			0 if options.once else options.settle, self.state)
+
+		pool = multiprocessing.Pool(options.workers, init_worker, (options.memory_triples,),
+			options.max_jobs)
+		print ("Watching %s, writing to %s ..." % (folder, self.output_folder))
+		try:
+			while True:
+				self.do_retries(watcher)
+				for file_path in watcher.poll():
+					self.do_submit(pool, file_path, watcher.known[file_path])
+
+				self.do_finished(pool, watcher)
+
+				if options.once and not self.running:
+					break
+				time.sleep(options.interval)
+
+			pool.close()
+		except KeyboardInterrupt:
+			print ("Stopping ...")
+			pool.terminate()
+		finally:
+			pool.join()
+			self.do_cleanup()
+
+
+	def get_script_args(self, options):
+		"""
+		Returns jsonimo.py and ontofetch.py arguments common to every job;
+		ontofetch.py's are None unless a root is given. Workers run jobs
+		in-process, so queries and imports aren't spread over further
+		processes.
+		"""
+		common = ['-e', options.engine, '--import-jobs', '1']
+		if options.gzip:
+			common.append('-z')
+		if options.cache_folder:
+			common.extend(['-c', options.cache_folder])
+		if options.mirror_folder:
+			common.extend(['-m', options.mirror_folder])
+
+		ontofetch_args = common + ['-r', options.root_uri] if options.root_uri else None
+		return (common + ['-j', '1'], ontofetch_args)
+
+
+	def do_submit(self, pool, file_path, signature):
+		""" Queues job for given ontology file, unless one is in progress. """
+		if file_path in self.running:
+			self.rerun.add(file_path)
+			return
+
+		print ("Queued %s" % file_path)
+		self.retries.pop(file_path, None)
+		job = (file_path, self.output_folder, self.jsonimo_args, self.ontofetch_args)
+		self.running[file_path] = (pool.apply_async(run_job, (job,)), signature)
+
+
+	def do_finished(self, pool, watcher):
+		"""
+		Records jobs that have finished, queueing any file changed since.
+		Files of failed jobs are retried later; see do_retries().
+		"""
+		for file_path in [file_path for (file_path, (result, signature)) in self.running.items()
+			if result.ready()]:
+
+			(result, signature) = self.running.pop(file_path)
+			try:
+				(file_path, error, seconds) = result.get()
+			except Exception as e: # Worker process lost
+				(error, seconds) = ('%s: %s' % (type(e).__name__, e), None)
+
+			if error:
+				failures = self.failures.get(file_path, 0) + 1
+				self.failures[file_path] = failures
+				delay = min(self.retry_delay * 2 ** (failures - 1), MAX_RETRY_DELAY)
+				self.retries[file_path] = time.time() + delay
+				print ("FAILED %s: %s (see %s.log); retrying in %ss" % (file_path, error,
+					os.path.basename(file_path).rsplit('.',1)[0], delay))
+			else:
+				print ("Done %s in %ss" % (file_path, seconds))
+				self.failures.pop(file_path, None)
+				self.state[file_path] = signature
+				self.write_state()
+
+			if file_path in self.rerun:
+				self.rerun.discard(file_path)
+				if file_path in watcher.known:
+					self.do_submit(pool, file_path, watcher.known[file_path])
+
+
+	def do_retries(self, watcher, now = None):
+		"""
+		Makes watcher report files of failed jobs again once their retry
+		delay is up, as a failure may well be transient. A file changed
+		meanwhile is reported anyway, and its retry dropped.
+		"""
+		if now is None:
+			now = time.time()
+		for file_path in [file_path for (file_path, retry) in self.retries.items() if retry <= now]:
+			del self.retries[file_path]
+			watcher.forget(file_path)
+
+
+	def do_cleanup(self):
+		""" Removes job folders left by an interrupted run. """
+		for name in os.listdir(self.output_folder):
+			if name.startswith(JOB_PREFIX):
+				shutil.rmtree(os.path.join(self.output_folder, name), ignore_errors = True)
+
+
+	def get_state(self):
+		""" Returns {ontology file: signature} of files already processed. """
+		try:
+			with open(self.state_file) as input_handle:
+				return dict((file_path, tuple(signature))
+					for (file_path, signature) in json.load(input_handle).items())
+		except (IOError, OSError, ValueError):
+			return {}
+
+
+	def write_state(self):
+		(handle, temp_file) = tempfile.mkstemp(prefix = JOB_PREFIX, dir = self.output_folder)
+		with os.fdopen(handle, 'w') as output_handle:
+			json.dump(self.state, output_handle, indent = 4, sort_keys = True)
+		os.replace(temp_file, self.state_file)
+
+
+	def get_command_line(self, args = None):
+		"""
+		*************************** Parse Command Line *****************************
+		"""
+		parser = MyParser(
+			description = 'GEEM ingestion service: keeps jsonimo.py outputs of a folder of ontologies up to date.  See https://github.com/GenEpiO/geem',
+			usage = 'ontoservice.py [folder of ontology files] [options]*',
+			epilog="""  """)
+
+		# Standard code version identifier.
+		parser.add_option('-v', '--version', dest='code_version', default=False, action='store_true', help='Return version of this code.')
+
+		parser.add_option('-o', '--output', dest='output_folder', type='string', help='Folder of output files (default [folder]/output)')
+
+		parser.add_option('-w', '--workers', dest='workers', type='int', default=2, help='Number of ontologies processed at once (default 2)')
+
+		parser.add_option('-p', '--pattern', dest='pattern', type='string', default='*.owl', help='File name pattern of ontology files (default *.owl)')
+
+		parser.add_option('-i', '--interval', dest='interval', type='float', default=2, help='Seconds between checks of folder (default 2)')
+
+		parser.add_option('--settle', dest='settle', type='float', default=5, help='Seconds a changed file must stay unchanged before it is processed (default 5)')
+
+		parser.add_option('--once', dest='once', default=False, action='store_true', help='Process ontologies changed since last run, then exit. Failed jobs aren\'t retried until next run.')
+
+		parser.add_option('--retry-delay', dest='retry_delay', type='float', default=60, help='Seconds before a failed job is retried, doubled with each failure in a row up to an hour (default 60)')
+
+		parser.add_option('-r', '--root', dest='root_uri', type='string', help='Also run ontofetch.py on each ontology from this root term (full URI), into output/ontofetch/')
+
+		parser.add_option('-e', '--engine', dest='engine', type='choice', choices=['memory', 'sqlite', 'numpy'], default='memory', help='Triple store engine of jobs (default memory)')
+
+		parser.add_option('-z', '--gzip', dest='gzip', default=False, action='store_true', help='Write gzip compressed output files.')
+
+		parser.add_option('-c', '--cache', dest='cache_folder', type='string', help='Folder of parsed ontology file cache (default ~/.cache/geem/graphs)')
+
+		parser.add_option('-m', '--mirror', dest='mirror_folder', type='string', help='Folder of downloaded ontology file mirror (default ~/.cache/geem/mirror)')
+
+		parser.add_option('--memory-triples', dest='memory_triples', type='int', default=5000000, help='Triples of recently parsed files each worker keeps in memory between jobs (default 5000000)')
+
+		parser.add_option('--max-jobs', dest='max_jobs', type='int', help='Jobs after which a worker process is replaced, releasing its memory (default never)')
+
+		return parser.parse_args(args)
+
+
+if __name__ == '__main__':
+
+	service = OntologyService()
+	service.__main__()
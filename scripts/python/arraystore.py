@@ -0,0 +1,370 @@
+#!/usr/bin/python
+#
+
+""" **************************************************************************
+	NumPy backed rdflib triple store: integer encoded, columnar triples.
+
+	rdflib's in-memory store keeps every triple as Python term objects in
+	several nested dictionaries. ArrayStore instead gives each distinct
+	URI, blank node and literal an integer id, and keeps triples as three
+	sorted integer columns:
+
+		s, p, o		term ids of each triple, sorted by (s, p, o)
+		pos			permutation of rows sorted by (p, o, s), with its p
+					and o columns, pos_p and pos_o
+
+	Each term object is held once, in terms. A triple pattern is answered
+	by numpy.searchsorted() over SPO when its subject is given, over POS
+	when its predicate is, and by a mask otherwise. Any rdflib graph
+	operation or sparql query works on it:
+
+	import python.arraystore as ars
+
+	graph = rdflib.Graph(store = ars.ArrayStore())
+
+	Triples added are buffered and merged into the sorted columns when next
+	read, so loading a file costs one sort. rdfs:subClassOf links are
+	also kept as arrays sorted by parent and by child, from which
+	get_subclass_closure() walks a hierarchy a level at a time;
+	ArraySubclassIndex offers this with the interface of
+	hierarchy.SubclassIndex.
+
+	NumPy is optional; the store can't be used without it.
+"""
+
+import array
+import rdflib
+from rdflib.store import Store
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+
+def get_linked(keys, values, frontier):
+	"""
+	Returns values of all rows whose key is in frontier, given key
+	column sorted, in frontier then row order. Vectorized gather of
+	several searchsorted() ranges.
+	"""
+	starts = numpy.searchsorted(keys, frontier, 'left')
+	counts = numpy.searchsorted(keys, frontier, 'right') - starts
+	total = int(counts.sum())
+	if not total:
+		return values[0:0]
+
+	offsets = numpy.cumsum(counts) - counts
+	rows = numpy.arange(total) - numpy.repeat(offsets, counts) + numpy.repeat(starts, counts)
+	return values[rows]
+
+
+class ArrayStore(Store):
+
+	context_aware = False
+	formula_aware = False
+	transaction_aware = False
+	graph_aware = False
+
+	def __init__(self, configuration = None, identifier = None):
+		if numpy is None:
+			raise ImportError('ArrayStore needs NumPy')
+
+		# Term id -> rdflib term, and back.
+		self.terms = []
+		self.term_ids = {}
+		# 1 for each term id that is a URI
+		self.uri_flags = bytearray()
+
+		# Flat s, p, o ids of triples added since last compact()
+		self.pending = array.array('i')
+
+		empty = numpy.zeros(0, dtype = numpy.int32)
+		self.s = self.p = self.o = empty
+		self.pos = self.pos_p = self.pos_o = empty
+		self.s_starts = self.p_starts = numpy.zeros(1, dtype = numpy.int64)
+
+		# (children sorted by parent, parents, parents sorted by child, children)
+		self.subclass_links = None
+
+		self.prefixes = {}
+		self.uris = {}
+		super(ArrayStore, self).__init__(configuration, identifier)
+
+
+	############################## TERMS ##############################
+
+	def get_term_id(self, term, create = True):
+		"""
+		Returns id of given term, adding it if create is set; otherwise
+		None if it isn't in store.
+		"""
+		term_id = self.term_ids.get(term)
+		if term_id is None and create:
+			term_id = len(self.terms)
+			self.terms.append(term)
+			self.term_ids[term] = term_id
+			self.uri_flags.append(isinstance(term, rdflib.URIRef))
+		return term_id
+
+
+	def get_terms(self, term_ids):
+		""" Returns list of terms of given id array. """
+		terms = self.terms
+		return [terms[term_id] for term_id in term_ids.tolist()]
+
+
+	############################## TRIPLES ##############################
+
+	def add(self, triple, context, quoted = False):
+		self.addN([triple + (context,)])
+
+
+	def addN(self, quads):
+		get_term_id = self.get_term_id
+		pending = self.pending
+		for (s, p, o, c) in quads:
+			pending.extend((get_term_id(s), get_term_id(p), get_term_id(o)))
+
+
+	def compact(self):
+		"""
+		Merges pending triples into sorted SPO columns, dropping duplicates,
+		and rebuilds POS permutation.
+		"""
+		if not len(self.pending):
+			return
+
+		added = numpy.frombuffer(self.pending, dtype = numpy.intc).astype(numpy.int32).reshape(-1, 3)
+		self.pending = array.array('i')
+		triples = numpy.concatenate((numpy.column_stack((self.s, self.p, self.o)), added))
+		self.set_triples(triples)
+
+
+	def set_triples(self, triples):
+		""" Sets store's columns from given (n, 3) array of term ids. """
+		triples = triples[numpy.lexsort((triples[:, 2], triples[:, 1], triples[:, 0]))]
+		if len(triples):
+			keep = numpy.ones(len(triples), dtype = bool)
+			keep[1:] = numpy.any(triples[1:] != triples[:-1], axis = 1)
+			triples = triples[keep]
+
+		self.s = numpy.ascontiguousarray(triples[:, 0])
+		self.p = numpy.ascontiguousarray(triples[:, 1])
+		self.o = numpy.ascontiguousarray(triples[:, 2])
+		self.pos = numpy.lexsort((self.s, self.o, self.p))
+		self.pos_p = self.p[self.pos]
+		self.pos_o = self.o[self.pos]
+		# First row of each term id as subject in SPO, and as predicate in POS
+		term_ids = numpy.arange(len(self.terms) + 1)
+		self.s_starts = self.s.searchsorted(term_ids)
+		self.p_starts = self.pos_p.searchsorted(term_ids)
+		self.subclass_links = None
+
+
+	def get_rows(self, triple_pattern):
+		"""
+		Returns array of SPO row numbers of triples matching given pattern,
+		in which None matches anything; None if a term of pattern isn't in
+		store, so nothing can match.
+		"""
+		self.compact()
+		ids = []
+		for term in triple_pattern:
+			term_id = None if term is None else self.get_term_id(term, False)
+			if term is not None and term_id is None:
+				return None
+			ids.append(term_id)
+		(s, p, o) = ids
+
+		if s is not None:
+			(lo, hi) = (self.s_starts[s], self.s_starts[s + 1])
+			if p is not None:
+				column = self.p[lo:hi]
+				(lo, hi) = (lo + column.searchsorted(p, 'left'), lo + column.searchsorted(p, 'right'))
+				if o is not None:
+					column = self.o[lo:hi]
+					(lo, hi) = (lo + column.searchsorted(o, 'left'), lo + column.searchsorted(o, 'right'))
+			elif o is not None:
+				return lo + numpy.nonzero(self.o[lo:hi] == o)[0]
+			return numpy.arange(lo, hi)
+
+		if p is not None:
+			(lo, hi) = (self.p_starts[p], self.p_starts[p + 1])
+			if o is not None:
+				column = self.pos_o[lo:hi]
+				(lo, hi) = (lo + column.searchsorted(o, 'left'), lo + column.searchsorted(o, 'right'))
+			return self.pos[lo:hi]
+
+		if o is not None:
+			return numpy.nonzero(self.o == o)[0]
+
+		return numpy.arange(len(self.s))
+
+
+	def remove(self, triple_pattern, context = None):
+		rows = self.get_rows(triple_pattern)
+		if rows is not None and len(rows):
+			keep = numpy.ones(len(self.s), dtype = bool)
+			keep[rows] = False
+			self.set_triples(numpy.column_stack((self.s[keep], self.p[keep], self.o[keep])))
+
+
+	def triples(self, triple_pattern, context = None):
+		"""
+		Yields ((s, p, o), contexts) for each stored triple matching given
+		pattern, in which None matches anything.
+		"""
+		rows = self.get_rows(triple_pattern)
+		if rows is None:
+			return
+
+		terms = self.terms
+		for (s, p, o) in zip(self.s[rows].tolist(), self.p[rows].tolist(), self.o[rows].tolist()):
+			yield ((terms[s], terms[p], terms[o]), iter(()))
+
+
+	def get_subjects(self, predicate, object):
+		""" Returns list of subjects of given predicate and object. """
+		rows = self.get_rows((None, predicate, object))
+		return [] if rows is None else self.get_terms(self.s[rows])
+
+
+	def get_objects(self, subject, predicate):
+		""" Returns list of objects of given subject and predicate. """
+		rows = self.get_rows((subject, predicate, None))
+		return [] if rows is None else self.get_terms(self.o[rows])
+
+
+	def __len__(self, context = None):
+		self.compact()
+		return len(self.s)
+
+
+	def contexts(self, triple = None):
+		return iter(())
+
+
+	############################## NAMESPACES ##############################
+
+	def bind(self, prefix, namespace, override = True):
+		namespace = rdflib.URIRef(namespace)
+		if (prefix in self.prefixes or namespace in self.uris) and not override:
+			return
+		if prefix in self.prefixes:
+			del self.uris[self.prefixes.pop(prefix)]
+		if namespace in self.uris:
+			del self.prefixes[self.uris.pop(namespace)]
+		self.prefixes[prefix] = namespace
+		self.uris[namespace] = prefix
+
+
+	def namespace(self, prefix):
+		return self.prefixes.get(prefix)
+
+
+	def prefix(self, namespace):
+		return self.uris.get(rdflib.URIRef(namespace))
+
+
+	def namespaces(self):
+		for (prefix, namespace) in list(self.prefixes.items()):
+			yield (prefix, namespace)
+
+
+	############################## HIERARCHY ##############################
+
+	def get_subclass_link_arrays(self):
+		"""
+		Returns rdfs:subClassOf links between URIs as (children sorted by
+		parent, parents, parents sorted by child, children) term id arrays.
+		"""
+		self.compact()
+		if self.subclass_links is None:
+			rows = self.get_rows((None, rdflib.RDFS.subClassOf, None))
+			if rows is None:
+				rows = numpy.zeros(0, dtype = numpy.int64)
+			# POS rows come sorted by parent, then child.
+			(children, parents) = (self.s[rows], self.o[rows])
+			uri_flags = numpy.frombuffer(bytes(self.uri_flags), dtype = numpy.uint8).astype(bool)
+			named = uri_flags[children] & uri_flags[parents]
+			(children, parents) = (children[named], parents[named])
+			by_child = numpy.lexsort((parents, children))
+			self.subclass_links = (children, parents, parents[by_child], children[by_child])
+
+		return self.subclass_links
+
+
+	def get_subclass_links(self, node, parents = False):
+		""" Returns direct rdfs:subClassOf children (or parents) of node. """
+		node_id = self.get_term_id(node, False)
+		if node_id is None:
+			return []
+
+		(children, by_parent, parent_ids, by_child) = self.get_subclass_link_arrays()
+		(keys, values) = (by_child, parent_ids) if parents else (by_parent, children)
+		lo = numpy.searchsorted(keys, node_id, 'left')
+		hi = numpy.searchsorted(keys, node_id, 'right')
+		return self.get_terms(values[lo:hi])
+
+
+	def get_subclass_closure(self, node, ancestors = False):
+		"""
+		Returns all classes under (or above) given one, breadth first, each
+		once. Each level is gathered from sorted link arrays at once; a
+		mask of classes met so far stops the walk at cycles.
+		"""
+		node_id = self.get_term_id(node, False)
+		if node_id is None:
+			return []
+
+		(children, by_parent, parent_ids, by_child) = self.get_subclass_link_arrays()
+		(keys, values) = (by_child, parent_ids) if ancestors else (by_parent, children)
+
+		found = numpy.zeros(len(self.terms), dtype = bool)
+		found[node_id] = True
+		frontier = numpy.array([node_id], dtype = numpy.int32)
+		closure = []
+		while len(frontier):
+			linked = get_linked(keys, values, frontier)
+			# First occurrence of each class not met yet, in order found.
+			(linked, first) = numpy.unique(linked[~found[linked]], return_index = True)
+			frontier = linked[numpy.argsort(first)]
+			found[frontier] = True
+			closure.append(frontier)
+
+		return self.get_terms(numpy.concatenate(closure)) if closure else []
+
+
+class ArraySubclassIndex(object):
+	"""
+	hierarchy.SubclassIndex interface over an ArrayStore's link arrays.
+	"""
+
+	def __init__(self, store):
+		self.store = store
+		self.ancestors = {}
+
+
+	def get_children(self, node):
+		return self.store.get_subclass_links(node)
+
+
+	def get_parents(self, node):
+		return self.store.get_subclass_links(node, True)
+
+
+	def get_descendants(self, root, include_root = False):
+		descendants = self.store.get_subclass_closure(rdflib.URIRef(root))
+		return [rdflib.URIRef(root)] + descendants if include_root else descendants
+
+
+	def get_ancestors(self, node):
+		""" Returns set of all classes above given one. Result is memoized. """
+		if not node in self.ancestors:
+			self.ancestors[node] = set(self.store.get_subclass_closure(rdflib.URIRef(node), True))
+		return self.ancestors[node]
+
+
+	def is_a(self, node, ancestor):
+		return node == ancestor or ancestor in self.get_ancestors(node)
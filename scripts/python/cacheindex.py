@@ -0,0 +1,190 @@
+#!/usr/bin/python
+#
+
+""" **************************************************************************
+	Locked index of a cache folder of pickled files.
+
+	GraphCache and QueryCache each keep [key].pickle files in a folder with
+	a size cap, and an index.json file recording the size and last use of
+	each, by which least recently used files are evicted:
+
+		{"entries": {key: {"size": bytes, "last_used": timestamp}}, ...}
+
+	Several processes may share a cache folder - import parsing workers,
+	forked query workers, or service jobs - so every read-modify-write of
+	the index is done under an exclusive lock of an index.lock file in the
+	folder. Eviction goes by a scan of the folder's .pickle files rather
+	than by the index alone, so a file some process wrote but never got to
+	record, e.g. because it was killed, still counts towards the cap and
+	is evicted in its turn.
+
+	import python.cacheindex as ci
+
+	index = ci.CacheIndex('~/.cache/geem/queries', 512 * 1024 * 1024)
+	index.write_file(key, table)
+	index.touch(key)
+"""
+
+import os
+import json
+import time
+import pickle
+import tempfile
+import contextlib
+
+try:
+	import fcntl
+except ImportError: # Windows: no locking
+	fcntl = None
+
+
+class CacheIndex(object):
+
+	def __init__(self, cache_folder, max_size, sections = ()):
+		"""
+		INPUT
+			cache_folder: folder of cache files, made if need be
+			max_size: cap on total size of cache files, in bytes
+			sections: names of other {key: value} sections of index
+		"""
+		self.cache_folder = cache_folder
+		self.max_size = max_size
+		self.sections = ['entries'] + list(sections)
+		self.index_file = os.path.join(self.cache_folder, 'index.json')
+		self.lock_file = os.path.join(self.cache_folder, 'index.lock')
+
+		if not os.path.isdir(self.cache_folder):
+			os.makedirs(self.cache_folder)
+
+
+	def get_file(self, key):
+		return os.path.join(self.cache_folder, key + '.pickle')
+
+
+	def read(self):
+		"""
+		Returns index as last written. To change it, use locked() instead,
+		since another process may be writing it meanwhile.
+		"""
+		try:
+			with open(self.index_file, 'r') as index_handle:
+				index = json.load(index_handle)
+			if all(section in index for section in self.sections):
+				return index
+		except (IOError, OSError, ValueError):
+			pass
+
+		return dict((section, {}) for section in self.sections)
+
+
+	@contextlib.contextmanager
+	def locked(self):
+		"""
+		Yields index, read under an exclusive lock which is held until it
+		has been changed and written back, so that no other process's
+		update in between is lost.
+		"""
+		with open(self.lock_file, 'a') as lock_handle:
+			if fcntl:
+				fcntl.flock(lock_handle, fcntl.LOCK_EX)
+			try:
+				index = self.read()
+				yield index
+				self.write(index)
+			finally:
+				if fcntl:
+					fcntl.flock(lock_handle, fcntl.LOCK_UN)
+
+
+	def write(self, index):
+		try:
+			(handle, temp_file) = tempfile.mkstemp(dir = self.cache_folder)
+			with os.fdopen(handle, 'w') as index_handle:
+				json.dump(index, index_handle)
+			os.replace(temp_file, self.index_file)
+		except (IOError, OSError) as e:
+			print ('WARNING: unable to write cache index %s: %s' % (self.index_file, e))
+
+
+	def write_file(self, key, value):
+		"""
+		Pickles value as given key's cache file. It is written to a
+		temporary file first, so a partially written one is never read by
+		another process. Returns False if it couldn't be written.
+		"""
+		temp_file = None
+		try:
+			(handle, temp_file) = tempfile.mkstemp(dir = self.cache_folder)
+			with os.fdopen(handle, 'wb') as cache_handle:
+				pickle.dump(value, cache_handle, pickle.HIGHEST_PROTOCOL)
+			os.replace(temp_file, self.get_file(key))
+			return True
+		except (IOError, OSError, pickle.PicklingError) as e:
+			print ('WARNING: unable to write cache file %s: %s' % (self.get_file(key), e))
+			if temp_file and os.path.isfile(temp_file):
+				os.remove(temp_file)
+			return False
+
+
+	def touch(self, key = None, update = None):
+		"""
+		Records use of given key's cache file, if it exists, and evicts least
+		recently used files if need be. update(index), if given, makes other
+		changes to index in the same locked update.
+		"""
+		with self.locked() as index:
+			if update is not None:
+				update(index)
+			if key is not None:
+				try:
+					index['entries'][key] = {'size': os.path.getsize(self.get_file(key)),
+						'last_used': time.time()}
+				except OSError:
+					index['entries'].pop(key, None)
+			self.evict(index)
+
+
+	def evict(self, index):
+		"""
+		Removes least recently used cache files until their total size is
+		within max_size. Cache files are found by a scan of the folder; one
+		missing from index is taken as last used when it was written, and
+		index entries of missing files are dropped. Call with locked index.
+		"""
+		entries = index['entries']
+		found = {}
+		for file_name in os.listdir(self.cache_folder):
+			if not file_name.endswith('.pickle'):
+				continue
+			key = file_name[0:-len('.pickle')]
+			try:
+				stat = os.stat(self.get_file(key))
+			except OSError:
+				continue
+			found[key] = entries.get(key) or {'size': stat.st_size, 'last_used': stat.st_mtime}
+
+		index['entries'] = entries = found
+		total = sum(entry['size'] for entry in entries.values())
+
+		for key in sorted(entries, key = lambda key: entries[key]['last_used']):
+			if total <= self.max_size:
+				break
+			total -= entries[key]['size']
+			del entries[key]
+			try:
+				os.remove(self.get_file(key))
+			except OSError:
+				pass
+
+
+	def clear(self):
+		""" Removes all cache files and empties index. """
+		with self.locked() as index:
+			for file_name in os.listdir(self.cache_folder):
+				if file_name.endswith('.pickle'):
+					try:
+						os.remove(os.path.join(self.cache_folder, file_name))
+					except OSError:
+						pass
+			for section in self.sections:
+				index[section] = {}
@@ -0,0 +1,115 @@
+#!/usr/bin/python
+#
+
+""" **************************************************************************
+	Checkpoints of a specification build, one per finished stage.
+
+	jsonimo builds struct['specifications'] in a series of named stages:
+	tree, specification_components, ..., units, annotations. On a large
+	ontology a run takes minutes, and a failure in a late stage used to
+	mean starting over. Checkpoints keeps a pickled copy of struct -
+	@context prefixes, metadata and specifications - as it is after each
+	stage, so a later run can pick up where that one left off:
+
+	import python.checkpoints as cp
+
+	checkpoints = cp.Checkpoints('genepio.checkpoints', fingerprint)
+	checkpoints.save('picklists', struct)
+	(stage, struct) = checkpoints.get_latest(['tree', ..., 'picklists'])
+
+	Each checkpoint records the fingerprint of the ontology files its run
+	loaded (see OntoHelper.get_sources_fingerprint()); one whose files
+	have since changed, or that can't be read, is skipped.
+"""
+
+import os
+import pickle
+import tempfile
+
+
+class Checkpoints(object):
+
+	# Bump this if the pickled form of struct changes.
+	CHECKPOINT_VERSION = '2'
+
+	def __init__(self, folder, fingerprint):
+		"""
+		INPUT
+			folder: folder checkpoints are kept in, made if need be
+			fingerprint: fingerprint of this run's ontology files
+		"""
+		self.folder = folder
+		self.fingerprint = fingerprint
+
+		if not os.path.isdir(self.folder):
+			os.makedirs(self.folder)
+
+
+	def get_file(self, stage):
+		return os.path.join(self.folder, stage + '.pickle')
+
+
+	def save(self, stage, struct):
+		"""
+		Saves given struct as it is after given stage. It is written to a
+		temporary file first, so an interrupted run never leaves a partial
+		checkpoint behind.
+		"""
+		checkpoint = {'version': self.CHECKPOINT_VERSION, 'fingerprint': self.fingerprint,
+			'stage': stage, 'struct': struct}
+		temp_file = None
+		try:
+			(handle, temp_file) = tempfile.mkstemp(dir = self.folder)
+			with os.fdopen(handle, 'wb') as checkpoint_handle:
+				pickle.dump(checkpoint, checkpoint_handle, pickle.HIGHEST_PROTOCOL)
+			os.replace(temp_file, self.get_file(stage))
+		except (IOError, OSError, pickle.PicklingError) as e:
+			print ('WARNING: unable to write checkpoint of stage %s: %s' % (stage, e))
+			if temp_file and os.path.isfile(temp_file):
+				os.remove(temp_file)
+
+
+	def load(self, stage):
+		"""
+		Returns struct saved after given stage, or None if there is no
+		checkpoint of it for this run's ontology files.
+		"""
+		checkpoint_file = self.get_file(stage)
+		if not os.path.isfile(checkpoint_file):
+			return None
+		try:
+			with open(checkpoint_file, 'rb') as checkpoint_handle:
+				checkpoint = pickle.load(checkpoint_handle)
+		except Exception as e:
+			print ('WARNING: unable to read checkpoint file %s: %s' % (checkpoint_file, e))
+			return None
+
+		if checkpoint.get('version') != self.CHECKPOINT_VERSION or checkpoint.get('stage') != stage:
+			return None
+		if checkpoint.get('fingerprint') != self.fingerprint:
+			print ('NOTE: ontology files changed since checkpoint of stage %s was saved' % stage)
+			return None
+
+		return checkpoint['struct']
+
+
+	def get_latest(self, stages):
+		"""
+		Returns (stage, struct) of the last of given stages, in build
+		order, with a valid checkpoint, or (None, None) if none has one.
+		"""
+		for stage in reversed(stages):
+			struct = self.load(stage)
+			if struct is not None:
+				return (stage, struct)
+
+		return (None, None)
+
+
+	def clear(self, stages):
+		""" Removes checkpoints of given stages. """
+		for stage in stages:
+			try:
+				os.remove(self.get_file(stage))
+			except OSError:
+				pass
@@ -0,0 +1,129 @@
+#!/usr/bin/python
+#
+
+""" **************************************************************************
+	Polling watcher of a folder of ontology files.
+
+	Each poll() stats the folder's ontology files and reports those which
+	changed since they were last reported, once they have stopped changing
+	for a settle period. A file saved several times in quick succession,
+	as editors and ontology release pipelines tend to do, is reported once,
+	after its last save.
+
+	import python.folderwatcher as fw
+
+	watcher = fw.FolderWatcher('ontologies/', settle = 5)
+	while True:
+		for file_path in watcher.poll():
+			...
+		time.sleep(2)
+
+	A file is recognized as changed by its modification time and size.
+	Files in the folder's ./imports/ folder are watched too: a change to
+	one of them reports every ontology in the folder, since any of them may
+	import it.
+"""
+
+import os
+import time
+import fnmatch
+
+IMPORTS_FOLDER = 'imports'
+
+
+def get_signature(file_path):
+	""" Returns (mtime, size) of given file, or None if it is gone. """
+	try:
+		stat = os.stat(file_path)
+	except OSError:
+		return None
+	return (stat.st_mtime_ns, stat.st_size)
+
+
+class FolderWatcher(object):
+
+	def __init__(self, folder, pattern = '*.owl', settle = 5.0, known = None):
+		"""
+		INPUT
+			folder: folder of ontology files to watch
+			pattern: file name pattern of ontology files
+			settle: seconds a changed file must stay unchanged before it
+				is reported
+			known: {file path: signature} of files already processed, e.g.
+				by an earlier run; these aren't reported until they change.
+		"""
+		self.folder = folder
+		self.pattern = pattern
+		self.settle = settle
+		self.known = dict(known or {})
+		# file path -> (signature, time that signature was first seen)
+		self.pending = {}
+
+
+	def get_files(self, folder):
+		""" Returns sorted paths of given folder's files matching pattern. """
+		try:
+			names = os.listdir(folder)
+		except OSError:
+			return []
+		return sorted(os.path.join(folder, name) for name in names
+			if fnmatch.fnmatch(name, self.pattern) and os.path.isfile(os.path.join(folder, name)))
+
+
+	def get_signatures(self):
+		"""
+		Returns {ontology file path: signature}. Signatures of import files
+		are folded into each ontology's, so changing an import changes all
+		of them.
+		"""
+		imports = ()
+		for file_path in self.get_files(os.path.join(self.folder, IMPORTS_FOLDER)):
+			imports += get_signature(file_path) or ()
+		signatures = {}
+		for file_path in self.get_files(self.folder):
+			signature = get_signature(file_path)
+			if signature is not None:
+				signatures[file_path] = signature + imports
+		return signatures
+
+
+	def poll(self, now = None):
+		"""
+		Returns list of ontology file paths that have changed since last
+		reported, and have stayed unchanged for settle seconds. Reported
+		files are taken to be processed; see forget() otherwise.
+		"""
+		if now is None:
+			now = time.time()
+
+		signatures = self.get_signatures()
+		for file_path in list(self.known):
+			if not file_path in signatures:
+				del self.known[file_path]
+				self.pending.pop(file_path, None)
+
+		ready = []
+		for (file_path, signature) in sorted(signatures.items()):
+			if self.known.get(file_path) == signature:
+				self.pending.pop(file_path, None)
+				continue
+
+			(pending_signature, seen) = self.pending.get(file_path, (None, None))
+			if pending_signature != signature:
+				# New change: settle period starts over.
+				self.pending[file_path] = (signature, now)
+				if self.settle > 0:
+					continue
+			elif now - seen < self.settle:
+				continue
+
+			del self.pending[file_path]
+			self.known[file_path] = signature
+			ready.append(file_path)
+
+		return ready
+
+
+	def forget(self, file_path):
+		""" Makes given file count as changed again on next poll(). """
+		self.known.pop(file_path, None)
@@ -0,0 +1,226 @@
+#!/usr/bin/python
+#
+
+""" **************************************************************************
+	Persistent cache of parsed ontology graphs.
+
+	Parsing RDF/XML is the slowest step of loading an ontology, especially
+	for large imports like NCBITaxon or NCIT slims. GraphCache keeps the
+	triples of each parsed file in a pickled binary form, keyed by the
+	file's content hash. Path, modification time and size are remembered
+	too, so an unchanged file is recognized without rehashing it.
+
+	import python.graphcache as gc
+
+	cache = gc.GraphCache('~/.cache/geem/graphs')
+	cache.load(graph, '../genepio-merged.owl')
+
+	The cache folder has a size cap; least recently used entries are evicted
+	once it is exceeded. A long-running process that loads many ontologies
+	sharing the same imports can also keep recently loaded files in memory,
+	across GraphCache instances, with set_memory_cache(). An index.json file in the cache folder holds:
+
+		{"entries": {content hash: {"size": bytes, "last_used": timestamp}},
+		 "paths": {file path: {"mtime": ..., "size": ..., "public_id": ..., "hash": ...}}}
+
+	It is updated under a lock, so several processes can share a cache
+	folder; see cacheindex.py.
+"""
+
+import os
+import hashlib
+import pickle
+from collections import OrderedDict
+import rdflib
+
+from . import ontoformat
+from . import cacheindex
+
+DEFAULT_CACHE_FOLDER = os.path.join(os.path.expanduser('~'), '.cache', 'geem', 'graphs')
+
+# 2 Gb
+DEFAULT_MAX_SIZE = 2 * 1024 * 1024 * 1024
+
+
+class MemoryCache(object):
+	"""
+	Parsed files of this process, by content hash, up to a total number of
+	triples. Least recently used files are dropped first. Parsed triples
+	are only read when added to a graph, so one copy serves every run.
+	"""
+	def __init__(self, max_triples = 0):
+		self.max_triples = max_triples
+		self.entries = OrderedDict()
+		self.triples = 0
+
+
+	def get(self, content_hash):
+		parsed = self.entries.get(content_hash)
+		if parsed is not None:
+			self.entries.move_to_end(content_hash)
+		return parsed
+
+
+	def add(self, content_hash, parsed):
+		if len(parsed['triples']) > self.max_triples or content_hash in self.entries:
+			return
+		self.entries[content_hash] = parsed
+		self.triples += len(parsed['triples'])
+		while self.triples > self.max_triples:
+			(_, dropped) = self.entries.popitem(last = False)
+			self.triples -= len(dropped['triples'])
+
+
+	def clear(self):
+		self.entries.clear()
+		self.triples = 0
+
+
+# Off (0 triples) unless set_memory_cache() is called.
+memory_cache = MemoryCache()
+
+def set_memory_cache(max_triples):
+	"""
+	Keeps up to given number of triples of recently loaded files in this
+	process's memory, for later GraphCache loads of the same content.
+	"""
+	memory_cache.max_triples = max_triples
+	if memory_cache.triples > max_triples:
+		memory_cache.clear()
+
+
+def parse_file(ontology_file, format = None, public_id = None):
+	"""
+	Parses given ontology file path or URL, returning
+		{'namespaces': [(prefix, namespace), ...], 'triples': [...]}
+	which is the form kept in cache and passed between processes.
+	public_id is the base URI of a local copy of a remote file. Format is
+	detected if not given; see ontoformat.get_format().
+	"""
+	return ontoformat.get_parsed(ontology_file, format, public_id)
+
+
+def add_parsed(graph, parsed):
+	"""
+	Adds a parse_file() result to graph, binding its namespace prefixes
+	as graph.parse() would. Returns number of triples added.
+	"""
+	for (prefix, namespace) in parsed['namespaces']:
+		graph.bind(prefix, rdflib.URIRef(namespace), override = False)
+	graph.addN((s, p, o, graph) for (s, p, o) in parsed['triples'])
+	return len(parsed['triples'])
+
+
+class GraphCache(object):
+
+	# Bump this if the pickled triple format changes.
+	CACHE_VERSION = '1'
+
+	def __init__(self, cache_folder = None, max_size = DEFAULT_MAX_SIZE):
+
+		self.cache_folder = os.path.expanduser(cache_folder or DEFAULT_CACHE_FOLDER)
+		# Index of cache files, shared with other processes; see cacheindex.py
+		self.index = cacheindex.CacheIndex(self.cache_folder, max_size, ['paths'])
+
+
+	@property
+	def max_size(self):
+		return self.index.max_size
+
+
+	@max_size.setter
+	def max_size(self, max_size):
+		self.index.max_size = max_size
+
+
+	def load(self, graph, file_path, format = None, public_id = None):
+		"""
+		Adds triples of given ontology file to graph, from cache if file
+		content hasn't changed since it was last parsed. Otherwise file is
+		parsed and its triples are cached for next time. Namespace prefixes
+		declared in the file are bound in graph too, as graph.parse() does.
+
+		INPUT
+			graph: rdflib.Graph to add triples to
+			file_path: local file path
+			format: format of file, one of ontoformat.FORMATS; detected
+				if not given
+			public_id: base URI if file is a local copy of a remote file
+		OUTPUT
+			number of triples added
+		"""
+		return add_parsed(graph, self.get_parsed(file_path, format, public_id))
+
+
+	def get_triples(self, file_path, format = None, public_id = None):
+		"""
+		Returns list of (subject, predicate, object) triples of given file.
+		"""
+		return self.get_parsed(file_path, format, public_id)['triples']
+
+
+	def get_parsed(self, file_path, format = None, public_id = None):
+		"""
+		Returns {'namespaces': [(prefix, namespace), ...], 'triples': [...]}
+		for given file, from cache or by parsing it.
+		"""
+		file_path = os.path.realpath(file_path)
+		content_hash = self.get_content_hash(file_path, self.read_index(), public_id)
+		cache_file = self.get_cache_file(content_hash)
+
+		parsed = memory_cache.get(content_hash)
+		if parsed is None and os.path.isfile(cache_file):
+			try:
+				with open(cache_file, 'rb') as cache_handle:
+					parsed = pickle.load(cache_handle)
+			except Exception as e:
+				print ('WARNING: unable to read graph cache for %s, reparsing: %s' % (file_path, e))
+
+		if parsed is None:
+			parsed = parse_file(file_path, format, public_id)
+			self.index.write_file(content_hash, parsed)
+		memory_cache.add(content_hash, parsed)
+
+		stat = os.stat(file_path)
+		def add_path(index):
+			index['paths'][file_path] = {'mtime': stat.st_mtime, 'size': stat.st_size,
+				'public_id': public_id, 'hash': content_hash}
+		self.index.touch(content_hash, add_path)
+
+		return parsed
+
+
+	def get_content_hash(self, file_path, index, public_id = None):
+		"""
+		Returns sha1 of file content plus cache version and public_id, which
+		relative URIs in the file are resolved against. If the file's path,
+		mtime, size and public_id match its last index record, the stored
+		hash is used instead of reading the file again.
+		"""
+		stat = os.stat(file_path)
+		known = index['paths'].get(file_path)
+		if known and known['mtime'] == stat.st_mtime and known['size'] == stat.st_size \
+			and known.get('public_id') == public_id:
+			return known['hash']
+
+		sha1 = hashlib.sha1(self.CACHE_VERSION.encode('utf8'))
+		if public_id:
+			sha1.update(public_id.encode('utf8'))
+		with open(file_path, 'rb') as file_handle:
+			for block in iter(lambda: file_handle.read(1024 * 1024), b''):
+				sha1.update(block)
+
+		return sha1.hexdigest()
+
+
+	def get_cache_file(self, content_hash):
+		return self.index.get_file(content_hash)
+
+
+	def clear(self):
+		""" Removes all cache files and the index. """
+		self.index.clear()
+
+
+	def read_index(self):
+		return self.index.read()
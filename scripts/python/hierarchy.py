@@ -0,0 +1,143 @@
+#!/usr/bin/python
+#
+
+""" **************************************************************************
+	In-memory rdfs:subClassOf index of a graph.
+
+	The 'tree' queries used to find every term under a root with the sparql
+	property path "rdfs:subClassOf*", which rdflib evaluates very slowly on
+	large graphs. SubclassIndex reads the graph's rdfs:subClassOf triples
+	once into parent -> children and child -> parents maps, after which a
+	branch can be walked in time linear to its size.
+
+	import python.hierarchy as hi
+
+	index = hi.SubclassIndex(graph)
+	index.get_descendants(rdflib.URIRef('http://purl.obolibrary.org/obo/OBI_0000658'))
+
+	get_topological_order() lists a set of branches parents first, for
+	pushing values down the hierarchy one class at a time.
+
+	Only named classes are indexed; subclass axioms on or to blank nodes
+	(restrictions, class expressions) are left out.
+"""
+
+import rdflib
+
+
+class SubclassIndex(object):
+
+	def __init__(self, graph, closure = False):
+		"""
+		INPUT
+			graph: rdflib.Graph to index
+			closure: if True, ancestors of every class are worked out now
+				rather than on first get_ancestors() call for it.
+		"""
+		self.children = {}
+		self.parents = {}
+		self.ancestors = {}
+
+		for (child, parent) in graph.subject_objects(rdflib.RDFS.subClassOf):
+			if isinstance(child, rdflib.URIRef) and isinstance(parent, rdflib.URIRef):
+				self.children.setdefault(parent, []).append(child)
+				self.parents.setdefault(child, []).append(parent)
+
+		if closure:
+			for node in self.parents:
+				self.get_ancestors(node)
+
+
+	def get_children(self, node):
+		return self.children.get(node, [])
+
+
+	def get_parents(self, node):
+		return self.parents.get(node, [])
+
+
+	def get_descendants(self, root, include_root = False):
+		"""
+		Returns list of all classes under given root, breadth first, each
+		once even where hierarchy has multiple inheritance or cycles.
+		"""
+		found = set([root])
+		descendants = [root] if include_root else []
+		pending = [root]
+		while pending:
+			level = pending
+			pending = []
+			for node in level:
+				for child in self.children.get(node, []):
+					if not child in found:
+						found.add(child)
+						descendants.append(child)
+						pending.append(child)
+
+		return descendants
+
+
+	def get_ancestors(self, node):
+		""" Returns set of all classes above given one. Result is memoized. """
+		if node in self.ancestors:
+			return self.ancestors[node]
+
+		ancestors = set()
+		pending = list(self.parents.get(node, []))
+		while pending:
+			parent = pending.pop()
+			if parent in ancestors:
+				continue
+			ancestors.add(parent)
+			if parent in self.ancestors:
+				ancestors |= self.ancestors[parent]
+			else:
+				pending.extend(self.parents.get(parent, []))
+
+		self.ancestors[node] = ancestors
+		return ancestors
+
+
+	def is_a(self, node, ancestor):
+		""" True if node is ancestor or one of its descendants. """
+		return node == ancestor or ancestor in self.get_ancestors(node)
+
+
+def get_topological_order(index, roots):
+	"""
+	Returns list of given classes and all classes under them, each one
+	after all of its parents that are in the list (Kahn's algorithm).
+	Classes on a subclass cycle can't be ordered so come last.
+
+	INPUT
+		index: SubclassIndex, or anything with get_children(),
+			get_parents() and get_descendants()
+		roots: list of classes
+	"""
+	nodes = []
+	found = set()
+	for root in roots:
+		if root in found:
+			continue
+		for node in index.get_descendants(root, True):
+			if not node in found:
+				found.add(node)
+				nodes.append(node)
+
+	in_degree = dict((node, sum(1 for parent in index.get_parents(node) if parent in found))
+		for node in nodes)
+	ordered = [node for node in nodes if in_degree[node] == 0]
+	position = 0
+	while position < len(ordered):
+		for child in index.get_children(ordered[position]):
+			if child in in_degree:
+				in_degree[child] -= 1
+				if in_degree[child] == 0:
+					ordered.append(child)
+		position += 1
+
+	if len(ordered) < len(nodes):
+		placed = set(ordered)
+		ordered.extend(node for node in nodes if not node in placed)
+
+	return ordered
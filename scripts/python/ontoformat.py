@@ -0,0 +1,366 @@
+#!/usr/bin/python
+#
+
+""" **************************************************************************
+	Ontology file formats other than RDF/XML.
+
+	rdflib's RDF/XML parser is its slowest, and many OBO ontologies also
+	publish N-Triples, Turtle or OBO Graphs JSON releases. get_format()
+	detects which of these a file holds, from its content for local files
+	and from its extension for URLs:
+
+		'xml'		RDF/XML (.owl, .rdf, .xml); the default
+		'nt'		N-Triples (.nt)
+		'turtle'	Turtle (.ttl)
+		'obographs'	OBO Graphs JSON (.json)
+
+	N-Triples and OBO Graphs files are read here, a line or a node at a
+	time, rather than by rdflib.Graph.parse(); Turtle goes to rdflib's
+	parser.
+
+	import python.ontoformat as of
+
+	format = of.get_format('../genepio-merged.nt')	# 'nt'
+	of.load(graph, '../genepio-merged.nt')
+
+	OBO Graphs JSON holds the class and property hierarchy, labels,
+	definitions, synonyms, xrefs, other annotations, logical definitions and
+	existential restriction edges, which are converted back to their OWL
+	triples. OWL axioms it has no form for, e.g. cardinality and datatype
+	restrictions of GEEM specifications, are absent from it.
+"""
+
+import io
+import re
+import json
+import urllib.request
+import rdflib
+from rdflib.plugins.parsers.ntriples import unquote
+try:
+	from rdflib.plugins.parsers.ntriples import W3CNTriplesParser as NTriplesParser
+except ImportError: # rdflib < 6
+	from rdflib.plugins.parsers.ntriples import NTriplesParser
+
+FORMATS = ['xml', 'nt', 'turtle', 'obographs']
+
+EXTENSIONS = {
+	'owl': 'xml',
+	'rdf': 'xml',
+	'xml': 'xml',
+	'nt': 'nt',
+	'ttl': 'turtle',
+	'json': 'obographs'
+}
+
+# Bytes read from start of a local file to detect its format.
+SNIFF_SIZE = 4096
+
+OBO = 'http://purl.obolibrary.org/obo/'
+OBO_IN_OWL = rdflib.Namespace('http://www.geneontology.org/formats/oboInOwl#')
+IAO_DEFINITION = rdflib.URIRef(OBO + 'IAO_0000115')
+
+# One N-Triples statement whose IRIs and blank node labels have no escapes.
+# Groups: subject IRI or blank node label, predicate IRI, then object IRI,
+# blank node label, or literal text with its language tag or datatype IRI.
+IRI = r'<([^<>"{}|^`\\\x00-\x20]*)>'
+BNODE = r'_:([A-Za-z0-9_.\-]+)'
+NT_STATEMENT = re.compile(
+	r'[ \t]*(?:' + IRI + '|' + BNODE + r')[ \t]+' + IRI + r'[ \t]+'
+	r'(?:' + IRI + '|' + BNODE + r'|"([^"\\]*(?:\\.[^"\\]*)*)"'
+	r'(?:@([a-zA-Z]+(?:-[a-zA-Z0-9]+)*)|\^\^' + IRI + r')?)[ \t]*\.[ \t]*(?:#.*)?$')
+
+TURTLE_DIRECTIVE = re.compile(r'(@prefix|@base|prefix|base)\s', re.IGNORECASE)
+
+
+def get_format(location):
+	"""
+	Returns rdflib parser format of given ontology file path or URL, one of
+	FORMATS. A local file's content decides, falling back on its extension
+	if that is inconclusive; a URL has only its extension to go by.
+	"""
+	if location[0:4].lower() != 'http':
+		try:
+			with open(location, 'rb') as input_handle:
+				format = get_content_format(input_handle.read(SNIFF_SIZE))
+			if format:
+				return format
+		except (IOError, OSError):
+			pass
+
+	path = location.split('?',1)[0].split('#',1)[0]
+	if path.lower().endswith('.gz'):
+		path = path[0:-3]
+	return EXTENSIONS.get(path.rsplit('/',1)[-1].rsplit('.',1)[-1].lower(), 'xml')
+
+
+def get_content_format(head):
+	"""
+	Returns format of a file starting with given bytes, or None if they
+	don't tell.
+	"""
+	text = head.decode('utf8', 'ignore').lstrip('\ufeff \t\r\n')
+	if text.startswith('{'):
+		return 'obographs'
+	if text.startswith('<?xml') or text.startswith('<rdf:RDF') or text.startswith('<!DOCTYPE'):
+		return 'xml'
+
+	# First statement, after any comment lines. The last line may be cut
+	# off by SNIFF_SIZE.
+	lines = [line.strip() for line in text.splitlines()[0:-1] or text.splitlines()]
+	lines = [line for line in lines if line and not line.startswith('#')]
+	if not lines:
+		return None
+	if TURTLE_DIRECTIVE.match(lines[0]):
+		return 'turtle'
+	if NT_STATEMENT.match(lines[0]):
+		return 'nt'
+	if lines[0].startswith('<') or lines[0].startswith('_:'):
+		return 'turtle'
+	return None
+
+
+def open_text(location):
+	""" Returns utf-8 text handle on given file path or URL. """
+	if location[0:4].lower() == 'http':
+		return io.TextIOWrapper(urllib.request.urlopen(location), encoding = 'utf-8')
+	return open(location, 'r', encoding = 'utf-8')
+
+
+def get_ntriples(location):
+	"""
+	Generates (subject, predicate, object) triples of given N-Triples file
+	path or URL, a line at a time. Lines are matched by NT_STATEMENT, and
+	the rare line with escaped IRIs or blank node labels it doesn't take is
+	handed to rdflib's N-Triples parser. Blank nodes are new for each file.
+	"""
+	bnodes = {}
+	fallback = NTriplesParser(NTriplesSink())
+	fallback._bnode_ids = bnodes # rdflib 4 shares this map between parsers
+
+	def get_bnode(label):
+		bnode = bnodes.get(label)
+		if bnode is None:
+			bnode = bnodes[label] = rdflib.BNode()
+		return bnode
+
+	with open_text(location) as input_handle:
+		for line in input_handle:
+			match = NT_STATEMENT.match(line.rstrip('\r\n'))
+			if match is None:
+				fallback.line = line.strip()
+				fallback.parseline()
+				if fallback.sink.triple_found:
+					yield fallback.sink.triple_found
+					fallback.sink.triple_found = None
+				continue
+
+			(subject, subject_bnode, predicate, iri, bnode, text, lang, datatype) = match.groups()
+
+			if text is not None:
+				if '\\' in text:
+					text = unquote(text)
+				object = rdflib.Literal(text, lang = lang,
+					datatype = rdflib.URIRef(datatype) if datatype else None)
+			elif iri is not None:
+				object = rdflib.URIRef(iri)
+			else:
+				object = get_bnode(bnode)
+
+			yield (rdflib.URIRef(subject) if subject is not None else get_bnode(subject_bnode),
+				rdflib.URIRef(predicate), object)
+
+
+class NTriplesSink(object):
+	""" Holds triple of the last line rdflib's N-Triples parser parsed. """
+	def __init__(self):
+		self.triple_found = None
+
+	def triple(self, subject, predicate, object):
+		self.triple_found = (subject, predicate, object)
+
+
+def get_obographs(location):
+	"""
+	Generates OWL triples of the graphs in given OBO Graphs JSON file path
+	or URL. See https://github.com/geneontology/obographs .
+	"""
+	with open_text(location) as input_handle:
+		document = json.load(input_handle)
+
+	for graph in document.get('graphs', [document]):
+		for triple in get_obograph_triples(graph):
+			yield triple
+
+
+def get_obograph_triples(graph):
+	""" Generates OWL triples of one OBO Graphs graph. """
+	RDF = rdflib.RDF
+	RDFS = rdflib.RDFS
+	OWL = rdflib.OWL
+
+	if graph.get('id'):
+		ontology = get_iri(graph['id'])
+		yield (ontology, RDF.type, OWL.Ontology)
+		meta = graph.get('meta', {})
+		if meta.get('version'):
+			yield (ontology, OWL.versionIRI, get_iri(meta['version']))
+		for triple in get_meta_triples(ontology, meta):
+			yield triple
+
+	node_types = {}
+	for node in graph.get('nodes', []):
+		if not node.get('id'):
+			continue
+		entity = get_iri(node['id'])
+		node_type = node.get('type')
+		if node_type == 'PROPERTY':
+			node_type = {'ANNOTATION': OWL.AnnotationProperty, 'DATA': OWL.DatatypeProperty} \
+				.get(node.get('propertyType'), OWL.ObjectProperty)
+		else:
+			node_type = {'CLASS': OWL.Class, 'INDIVIDUAL': OWL.NamedIndividual}.get(node_type)
+		if node_type:
+			node_types[entity] = node_type
+			yield (entity, RDF.type, node_type)
+		if node.get('lbl'):
+			yield (entity, RDFS.label, rdflib.Literal(node['lbl']))
+		for triple in get_meta_triples(entity, node.get('meta', {})):
+			yield triple
+
+	for edge in graph.get('edges', []):
+		(subject, object) = (get_iri(edge['sub']), get_iri(edge['obj']))
+		predicate = edge['pred']
+		if predicate in ('is_a', 'subClassOf'):
+			if node_types.get(subject, OWL.Class) in (OWL.Class, OWL.NamedIndividual):
+				yield (subject, RDFS.subClassOf, object)
+			else:
+				yield (subject, RDFS.subPropertyOf, object)
+		elif predicate == 'subPropertyOf':
+			yield (subject, RDFS.subPropertyOf, object)
+		elif predicate in ('type', 'instance_of'):
+			yield (subject, RDF.type, object)
+		elif predicate == 'inverseOf':
+			yield (subject, OWL.inverseOf, object)
+		else:
+			# Other edges stand for: subject subClassOf (predicate some object)
+			restriction = rdflib.BNode()
+			yield (subject, RDFS.subClassOf, restriction)
+			for triple in get_restriction_triples(restriction, get_iri(predicate), object):
+				yield triple
+
+	for axiom in graph.get('logicalDefinitionAxioms', []):
+		members = [get_iri(genus) for genus in axiom.get('genusIds', [])]
+		triples = []
+		for restriction in axiom.get('restrictions', []):
+			node = rdflib.BNode()
+			members.append(node)
+			triples.extend(get_restriction_triples(node, get_iri(restriction['propertyId']),
+				get_iri(restriction['fillerId'])))
+		intersection = rdflib.BNode()
+		yield (get_iri(axiom['definedClassId']), OWL.equivalentClass, intersection)
+		yield (intersection, RDF.type, OWL.Class)
+		(members_list, list_triples) = get_list(members)
+		yield (intersection, OWL.intersectionOf, members_list)
+		for triple in list_triples + triples:
+			yield triple
+
+	for axiom in graph.get('domainRangeAxioms', []):
+		property = get_iri(axiom['predicateId'])
+		for domain in axiom.get('domainClassIds', []):
+			yield (property, RDFS.domain, get_iri(domain))
+		for range in axiom.get('rangeClassIds', []):
+			yield (property, RDFS.range, get_iri(range))
+
+	for node_set in graph.get('equivalentNodesSets', []):
+		nodes = [get_iri(node) for node in node_set.get('nodeIds', [])]
+		for node in nodes[1:]:
+			yield (nodes[0], rdflib.OWL.equivalentClass, node)
+
+
+def get_meta_triples(entity, meta):
+	""" Generates annotation triples of an OBO Graphs node or graph meta. """
+	if meta.get('definition', {}).get('val'):
+		yield (entity, IAO_DEFINITION, rdflib.Literal(meta['definition']['val']))
+	for synonym in meta.get('synonyms', []):
+		yield (entity, OBO_IN_OWL[synonym.get('pred', 'hasRelatedSynonym')], rdflib.Literal(synonym['val']))
+	for xref in meta.get('xrefs', []):
+		yield (entity, OBO_IN_OWL.hasDbXref, rdflib.Literal(xref['val']))
+	for comment in meta.get('comments', []):
+		yield (entity, rdflib.RDFS.comment, rdflib.Literal(comment))
+	for subset in meta.get('subsets', []):
+		yield (entity, OBO_IN_OWL.inSubset, get_iri(subset))
+	if meta.get('deprecated'):
+		yield (entity, rdflib.OWL.deprecated, rdflib.Literal(True))
+	for value in meta.get('basicPropertyValues', []):
+		# Values are untyped strings; those that are IRIs are taken as such.
+		object = value['val']
+		object = rdflib.URIRef(object) if re.match(r'https?://\S+$', object) else rdflib.Literal(object)
+		yield (entity, get_iri(value['pred']), object)
+
+
+def get_restriction_triples(restriction, property, filler):
+	""" Returns triples of restriction: property some filler. """
+	return [
+		(restriction, rdflib.RDF.type, rdflib.OWL.Restriction),
+		(restriction, rdflib.OWL.onProperty, property),
+		(restriction, rdflib.OWL.someValuesFrom, filler)
+	]
+
+
+def get_list(items):
+	""" Returns (head node, triples) of an RDF list of given items. """
+	head = rdflib.RDF.nil
+	triples = []
+	for item in reversed(items):
+		node = rdflib.BNode()
+		triples.extend([(node, rdflib.RDF.first, item), (node, rdflib.RDF.rest, head)])
+		head = node
+	return (head, triples)
+
+
+def get_iri(id):
+	"""
+	Returns IRI of an OBO Graphs id, which is usually a full IRI, but may be
+	an OBO style CURIE, e.g. BFO:0000050.
+	"""
+	if not '://' in id:
+		match = re.match(r'([A-Za-z][A-Za-z0-9_]*):([^/:]+)$', id)
+		if match:
+			return rdflib.URIRef(OBO + match.group(1) + '_' + match.group(2))
+	return rdflib.URIRef(id)
+
+
+# Formats read here, by function generating a file's triples.
+LOADERS = {
+	'nt': get_ntriples,
+	'obographs': get_obographs
+}
+
+
+def get_parsed(location, format = None, public_id = None):
+	"""
+	Returns {'namespaces': [(prefix, namespace), ...], 'triples': [...]}
+	of given ontology file path or URL, as graphcache.parse_file() does.
+	public_id is the base URI of a local copy of a remote file.
+	"""
+	format = format or get_format(location)
+	if format in LOADERS:
+		return {'namespaces': [], 'triples': list(LOADERS[format](location))}
+
+	graph = rdflib.Graph()
+	graph.parse(location, format = format, publicID = public_id)
+	return {
+		'namespaces': [(prefix, str(namespace)) for (prefix, namespace) in graph.namespaces()],
+		'triples': list(graph)
+	}
+
+
+def load(graph, location, format = None, public_id = None):
+	"""
+	Adds triples of given ontology file path or URL to graph. N-Triples and
+	OBO Graphs triples are added as they are read.
+	"""
+	format = format or get_format(location)
+	if format in LOADERS:
+		graph.addN((s, p, o, graph) for (s, p, o) in LOADERS[format](location))
+	else:
+		graph.parse(location, format = format, publicID = public_id)
@@ -0,0 +1,376 @@
+#!/usr/bin/python
+#
+
+""" **************************************************************************
+	Synthetic GenEpiO-style ontologies of any size, for benchmarking.
+
+	Writes an RDF/XML ontology with an ./imports/ folder, using the same
+	patterns jsonimo.py and ontofetch.py read from GenEpiO and OBI:
+
+		models: subclasses of 'data representational model' (OBI:0000658)
+			having 'has component' (RO:0002180) restrictions on datums and
+			picklists, some annotated with owl:Axiom user interface features
+		datums: subclasses of 'categorical measurement datum' (OBI:0000938)
+			with 'has primitive value spec' (GENEPIO:0001605) datatypes,
+			integer ranges and 'has measurement unit label' (IAO:0000039)
+			units; descendants inherit these
+		picklists: trees under 'categorical tree specification'
+			(GENEPIO:0001655) with 'order:' features, deprecated and
+			replaced terms
+		every term: label, definition, UI label, synonyms and database
+			cross references
+
+	import python.ontogenerator as og
+
+	generator = og.OntologyGenerator(terms = 10000, depth = 6)
+	generator.write('/tmp/bench/synthetic_10000.owl')
+
+	Given the same settings and seed, output is always the same.
+"""
+
+import os
+import random
+
+OBO = 'http://purl.obolibrary.org/obo/'
+ONTOLOGY_IRI = OBO + 'synthetic/'
+
+# Share of terms that are models and datums; the rest are picklist items.
+MODEL_SHARE = 0.05
+DATUM_SHARE = 0.25
+
+FIRST_ID = 1000000
+
+WORDS = ['sample', 'host', 'isolate', 'specimen', 'collection', 'storage',
+	'temperature', 'country', 'region', 'source', 'exposure', 'symptom',
+	'onset', 'travel', 'animal', 'food', 'water', 'environmental', 'clinical',
+	'laboratory', 'sequencing', 'assay', 'method', 'date', 'count', 'status']
+
+SYNONYM_PREDICATES = ['oboInOwl:hasExactSynonym', 'oboInOwl:hasNarrowSynonym', 'oboInOwl:hasSynonym', 'obo:IAO_0000118']
+
+DATATYPES = ['decimal', 'integer', 'string', 'date', 'boolean', 'dateTime']
+
+HEADER = """<?xml version="1.0"?>
+<!DOCTYPE rdf:RDF [
+    <!ENTITY obo "http://purl.obolibrary.org/obo/" >
+    <!ENTITY owl "http://www.w3.org/2002/07/owl#" >
+    <!ENTITY xsd "http://www.w3.org/2001/XMLSchema#" >
+    <!ENTITY rdfs "http://www.w3.org/2000/01/rdf-schema#" >
+    <!ENTITY rdf "http://www.w3.org/1999/02/22-rdf-syntax-ns#" >
+]>
+
+<rdf:RDF xml:base="%s"
+     xmlns:obo="http://purl.obolibrary.org/obo/"
+     xmlns:owl="http://www.w3.org/2002/07/owl#"
+     xmlns:xsd="http://www.w3.org/2001/XMLSchema#"
+     xmlns:rdfs="http://www.w3.org/2000/01/rdf-schema#"
+     xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+     xmlns:dc="http://purl.org/dc/elements/1.1/"
+     xmlns:oboInOwl="http://www.geneontology.org/formats/oboInOwl#">
+"""
+
+UPPER_LEVEL = """
+    <owl:ObjectProperty rdf:about="&obo;RO_0002180">
+        <rdfs:label xml:lang="en">has component</rdfs:label>
+    </owl:ObjectProperty>
+
+    <owl:DatatypeProperty rdf:about="&obo;GENEPIO_0001605">
+        <rdfs:label xml:lang="en">has primitive value spec</rdfs:label>
+    </owl:DatatypeProperty>
+
+    <owl:ObjectProperty rdf:about="&obo;IAO_0000039">
+        <rdfs:label xml:lang="en">has measurement unit label</rdfs:label>
+    </owl:ObjectProperty>
+
+    <owl:Class rdf:about="&obo;OBI_0000658">
+        <rdfs:label xml:lang="en">data representational model</rdfs:label>
+    </owl:Class>
+
+    <owl:Class rdf:about="&obo;OBI_0000938">
+        <rdfs:label xml:lang="en">categorical measurement datum</rdfs:label>
+    </owl:Class>
+
+    <owl:Class rdf:about="&obo;GENEPIO_0001655">
+        <rdfs:subClassOf rdf:resource="&obo;OBI_0000938"/>
+        <rdfs:label xml:lang="en">categorical tree specification</rdfs:label>
+    </owl:Class>
+"""
+
+
+class OntologyGenerator(object):
+
+	def __init__(self, terms = 1000, depth = 5, synonyms = 0.3, components = 4,
+		picklists = None, units = 20, imports = 2, seed = 1):
+		"""
+		INPUT
+			terms: number of GENEPIO classes to generate
+			depth: deepest level of model, datum and picklist hierarchies
+			synonyms: average number of synonyms per term
+			components: average number of 'has component' datums per model
+			picklists: number of picklist roots; default one per 200 terms
+			units: number of UO unit terms, split among import files
+			imports: number of import files; first holds upper level terms,
+				each imports the next.
+			seed: random seed
+		"""
+		self.terms = terms
+		self.depth = max(depth, 1)
+		self.synonyms = synonyms
+		self.components = components
+		self.picklists = picklists if picklists is not None else max(1, terms // 200)
+		self.units = units
+		self.imports = max(imports, 1)
+		self.random = random.Random(seed)
+
+
+	def write(self, file_path):
+		"""
+		Writes ontology to given file, and its imports to an ./imports/
+		folder beside it. Returns dictionary of term counts by kind.
+		"""
+		folder = os.path.dirname(os.path.abspath(file_path))
+		imports_folder = os.path.join(folder, 'imports')
+		if not os.path.isdir(imports_folder):
+			os.makedirs(imports_folder)
+
+		name = os.path.splitext(os.path.basename(file_path))[0]
+		import_names = [name + '_import_%s' % number for number in range(1, self.imports + 1)]
+		unit_ids = ['UO_%07d' % number for number in range(1, self.units + 1)]
+
+		for (number, import_name) in enumerate(import_names):
+			with open(os.path.join(imports_folder, import_name + '.owl'), 'w') as output_handle:
+				next_import = import_names[number + 1] if number + 1 < len(import_names) else None
+				self.write_import(output_handle, import_name, next_import, unit_ids[number::len(import_names)], number == 0)
+
+		with open(file_path, 'w') as output_handle:
+			return self.write_main(output_handle, name, import_names[0], unit_ids)
+
+
+	def write_import(self, output_handle, import_name, next_import, unit_ids, upper_level):
+		iri = ONTOLOGY_IRI + 'imports/' + import_name + '.owl'
+		output_handle.write(HEADER % iri)
+		output_handle.write('\n    <owl:Ontology rdf:about="%s">\n' % iri)
+		if next_import:
+			output_handle.write('        <owl:imports rdf:resource="%simports/%s.owl"/>\n' % (ONTOLOGY_IRI, next_import))
+		output_handle.write('    </owl:Ontology>\n')
+
+		if upper_level:
+			output_handle.write(UPPER_LEVEL)
+
+		for unit_id in unit_ids:
+			output_handle.write('\n    <owl:Class rdf:about="&obo;%s">\n' % unit_id)
+			output_handle.write('        <rdfs:label xml:lang="en">unit %s</rdfs:label>\n' % unit_id[3:].lstrip('0'))
+			output_handle.write('    </owl:Class>\n')
+
+		output_handle.write('\n</rdf:RDF>\n')
+
+
+	def write_main(self, output_handle, name, first_import, unit_ids):
+		iri = ONTOLOGY_IRI + name + '.owl'
+		output_handle.write(HEADER % iri)
+		output_handle.write("""
+    <owl:Ontology rdf:about="%s">
+        <owl:versionIRI rdf:resource="%sreleases/2018-10-01/%s.owl"/>
+        <owl:imports rdf:resource="%simports/%s.owl"/>
+        <dc:title xml:lang="en">Synthetic ontology of %s terms</dc:title>
+        <dc:description xml:lang="en">Generated for benchmarking GEEM ontology scripts.</dc:description>
+        <dc:license rdf:resource="http://creativecommons.org/licenses/by/3.0/"/>
+        <dc:date rdf:datatype="&xsd;date">2018-10-01</dc:date>
+    </owl:Ontology>
+""" % (iri, ONTOLOGY_IRI, name, ONTOLOGY_IRI, first_import, self.terms))
+
+		model_count = max(1, int(self.terms * MODEL_SHARE))
+		datum_count = max(1, int(self.terms * DATUM_SHARE))
+		picklist_count = max(self.picklists, 1)
+
+		ids = ['GENEPIO_%07d' % (FIRST_ID + number) for number in range(self.terms)]
+		model_ids = ids[0:model_count]
+		datum_ids = ids[model_count:model_count + datum_count]
+		picklist_ids = ids[model_count + datum_count:model_count + datum_count + picklist_count]
+		item_ids = ids[model_count + datum_count + picklist_count:]
+
+		# Datum and picklist hierarchies first, so models can point at them.
+		datum_parents = self.get_hierarchy(datum_ids, ['OBI_0000938'])
+		for datum_id in datum_ids:
+			self.write_datum(output_handle, datum_id, datum_parents[datum_id], unit_ids)
+
+		for picklist_id in picklist_ids:
+			self.write_class(output_handle, picklist_id, ['GENEPIO_0001655'], 'picklist')
+
+		# Each picklist root gets its own tree of items.
+		item_parents = {}
+		for (number, picklist_id) in enumerate(picklist_ids):
+			item_parents.update(self.get_hierarchy(item_ids[number::len(picklist_ids)], [picklist_id], True))
+		children = {}
+		for item_id in item_ids:
+			children.setdefault(item_parents[item_id][0], []).append(item_id)
+		for item_id in item_ids:
+			self.write_item(output_handle, item_id, item_parents[item_id], children.get(item_id, []), item_ids)
+
+		model_parents = self.get_hierarchy(model_ids, ['OBI_0000658'])
+		for model_id in model_ids:
+			self.write_model(output_handle, model_id, model_parents[model_id], datum_ids, picklist_ids)
+
+		output_handle.write('\n</rdf:RDF>\n')
+
+		return {'models': len(model_ids), 'datums': len(datum_ids), 'picklists': len(picklist_ids),
+			'picklist_items': len(item_ids), 'units': len(unit_ids), 'imports': self.imports}
+
+
+	def get_hierarchy(self, ids, roots, branch_first = False):
+		"""
+		Returns dictionary of id -> list of parent ids, placing given terms
+		in a hierarchy under given roots no more than self.depth levels
+		deep. Parents are always earlier terms. A few terms get a second
+		parent, as GenEpiO terms sometimes have.
+		"""
+		levels = dict((root, 0) for root in roots)
+		candidates = list(roots)
+		parents = {}
+		for id in ids:
+			parent = candidates[-1] if branch_first and self.random.random() < 0.5 else self.random.choice(candidates)
+			parents[id] = [parent]
+			if len(candidates) > len(roots) and self.random.random() < 0.02:
+				other = self.random.choice(candidates)
+				if other != parent:
+					parents[id].append(other)
+
+			levels[id] = levels[parent] + 1
+			if levels[id] < self.depth:
+				candidates.append(id)
+
+		return parents
+
+
+	def get_label(self, id):
+		words = self.random.sample(WORDS, 3)
+		return '%s %s %s %s' % (words[0], words[1], words[2], int(id[8:]) - FIRST_ID)
+
+
+	def write_annotations(self, output_handle, id, label):
+		""" Writes label, definition, UI label, synonyms and cross references. """
+		output_handle.write('        <rdfs:label xml:lang="en">%s</rdfs:label>\n' % label)
+		if self.random.random() < 0.7:
+			output_handle.write('        <obo:IAO_0000115 xml:lang="en">A %s, for benchmarking.</obo:IAO_0000115>\n' % label)
+		if self.random.random() < 0.2:
+			output_handle.write('        <obo:GENEPIO_0000006 xml:lang="en">%s</obo:GENEPIO_0000006>\n' % label.rsplit(' ', 1)[0])
+		if self.random.random() < 0.05:
+			output_handle.write('        <obo:GENEPIO_0000162 xml:lang="en">Enter the %s.</obo:GENEPIO_0000162>\n' % label)
+
+		# Synonym count averages self.synonyms per term.
+		synonyms = int(self.synonyms) + (1 if self.random.random() < self.synonyms % 1 else 0)
+		for number in range(synonyms):
+			predicate = self.random.choice(SYNONYM_PREDICATES)
+			output_handle.write('        <%s xml:lang="en">%s synonym %s</%s>\n' % (predicate, label, number + 1, predicate))
+		if self.random.random() < 0.1:
+			output_handle.write('        <oboInOwl:hasDbXref rdf:datatype="&xsd;string">GAZ:%08d</oboInOwl:hasDbXref>\n' % self.random.randrange(10 ** 8))
+
+
+	def write_class(self, output_handle, id, parents, kind):
+		output_handle.write('\n    <owl:Class rdf:about="&obo;%s">\n' % id)
+		for parent in parents:
+			output_handle.write('        <rdfs:subClassOf rdf:resource="&obo;%s"/>\n' % parent)
+		self.write_annotations(output_handle, id, '%s %s' % (kind, int(id[8:]) - FIRST_ID))
+		output_handle.write('    </owl:Class>\n')
+
+
+	def write_datum(self, output_handle, id, parents, unit_ids):
+		output_handle.write('\n    <owl:Class rdf:about="&obo;%s">\n' % id)
+		for parent in parents:
+			output_handle.write('        <rdfs:subClassOf rdf:resource="&obo;%s"/>\n' % parent)
+
+		# Upper datums declare a datatype; their descendants inherit it,
+		# sometimes narrowing it to an integer range.
+		chance = self.random.random()
+		if parents[0] == 'OBI_0000938' or chance < 0.2:
+			self.write_restriction(output_handle, 'GENEPIO_0001605',
+				'<owl:someValuesFrom rdf:resource="&xsd;%s"/>' % self.random.choice(DATATYPES))
+		elif chance < 0.35:
+			minimum = self.random.randrange(0, 10)
+			self.write_restriction(output_handle, 'GENEPIO_0001605', """<owl:someValuesFrom>
+                    <rdfs:Datatype>
+                        <owl:onDatatype rdf:resource="&xsd;integer"/>
+                        <owl:withRestrictions rdf:parseType="Collection">
+                            <rdf:Description>
+                                <xsd:minInclusive rdf:datatype="&xsd;integer">%s</xsd:minInclusive>
+                            </rdf:Description>
+                            <rdf:Description>
+                                <xsd:maxExclusive rdf:datatype="&xsd;integer">%s</xsd:maxExclusive>
+                            </rdf:Description>
+                        </owl:withRestrictions>
+                    </rdfs:Datatype>
+                </owl:someValuesFrom>""" % (minimum, minimum + self.random.randrange(1, 100)))
+
+		if unit_ids and self.random.random() < 0.3:
+			unit_id = self.random.choice(unit_ids)
+			self.write_restriction(output_handle, 'IAO_0000039', '<owl:someValuesFrom rdf:resource="&obo;%s"/>' % unit_id)
+			if self.random.random() < 0.5:
+				output_handle.write('        <obo:GENEPIO_0001763>preferred_unit:%s</obo:GENEPIO_0001763>\n' % unit_id.replace('_', ':'))
+
+		self.write_annotations(output_handle, id, self.get_label(id))
+		output_handle.write('    </owl:Class>\n')
+
+
+	def write_item(self, output_handle, id, parents, children, item_ids):
+		output_handle.write('\n    <owl:Class rdf:about="&obo;%s">\n' % id)
+		for parent in parents:
+			output_handle.write('        <rdfs:subClassOf rdf:resource="&obo;%s"/>\n' % parent)
+		self.write_annotations(output_handle, id, self.get_label(id))
+
+		if len(children) > 1 and self.random.random() < 0.1:
+			order = self.random.sample(children, len(children))
+			output_handle.write('        <obo:GENEPIO_0001763>order:%s</obo:GENEPIO_0001763>\n'
+				% '\n'.join(child.replace('_', ':') for child in order))
+		if self.random.random() < 0.02:
+			output_handle.write('        <owl:deprecated rdf:datatype="&xsd;boolean">true</owl:deprecated>\n')
+			output_handle.write('        <obo:IAO_0100001 rdf:resource="&obo;%s"/>\n' % self.random.choice(item_ids))
+		output_handle.write('    </owl:Class>\n')
+
+
+	def write_model(self, output_handle, id, parents, datum_ids, picklist_ids):
+		output_handle.write('\n    <owl:Class rdf:about="&obo;%s">\n' % id)
+		for parent in parents:
+			output_handle.write('        <rdfs:subClassOf rdf:resource="&obo;%s"/>\n' % parent)
+
+		components = self.random.sample(datum_ids, min(len(datum_ids), self.random.randint(1, self.components * 2 - 1)))
+		if self.random.random() < 0.5:
+			components.append(self.random.choice(picklist_ids))
+
+		annotated = []
+		for component in components:
+			if self.random.random() < 0.7:
+				target = '<owl:someValuesFrom rdf:resource="&obo;%s"/>' % component
+			else:
+				target = """<owl:qualifiedCardinality rdf:datatype="&xsd;nonNegativeInteger">1</owl:qualifiedCardinality>
+                <owl:onClass rdf:resource="&obo;%s"/>""" % component
+				if self.random.random() < 0.3:
+					annotated.append(target)
+			self.write_restriction(output_handle, 'RO_0002180', target)
+
+		self.write_annotations(output_handle, id, 'model ' + self.get_label(id))
+		output_handle.write('    </owl:Class>\n')
+
+		for target in annotated:
+			output_handle.write("""
+    <owl:Axiom>
+        <obo:GENEPIO_0001763>%s</obo:GENEPIO_0001763>
+        <rdfs:label xml:lang="en">%s in model</rdfs:label>
+        <owl:annotatedSource rdf:resource="&obo;%s"/>
+        <owl:annotatedProperty rdf:resource="&rdfs;subClassOf"/>
+        <owl:annotatedTarget>
+            <owl:Restriction>
+                <owl:onProperty rdf:resource="&obo;RO_0002180"/>
+                %s
+            </owl:Restriction>
+        </owl:annotatedTarget>
+    </owl:Axiom>
+""" % (self.random.choice(['lookup', 'hidden', 'required']), id, id, target))
+
+
+	def write_restriction(self, output_handle, property_id, target):
+		output_handle.write("""        <rdfs:subClassOf>
+            <owl:Restriction>
+                <owl:onProperty rdf:resource="&obo;%s"/>
+                %s
+            </owl:Restriction>
+        </rdfs:subClassOf>
+""" % (property_id, target))
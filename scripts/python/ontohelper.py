@@ -26,9 +26,25 @@
 
 import os
 import json
+import gzip
+import hashlib
 import sys
+import collections
+import multiprocessing
+import concurrent.futures
 import rdflib
-from rdflib.plugins.sparql import prepareQuery
+
+from . import graphcache
+from . import ontomirror
+from . import prefixresolver
+from . import hierarchy
+from . import sqlitestore
+from . import arraystore
+from . import overlaystore
+from . import ontoformat
+from . import querycache
+from . import queryregistry
+from . import sharding
 
 # Do this, otherwise a warning appears on stdout: No handlers could be 
 #found for logger "rdflib.term"
@@ -44,14 +60,96 @@ def stop_err(msg, exit_code = 1):
 	sys.exit(exit_code)
 
 
+def parse_import(job):
+	"""
+	Process pool worker for OntoHelper.do_parse_files(). Returns (parsed,
+	error) for a (location, public_id, cache_folder, cache_max_size) job,
+	loading local files through graph cache when a cache folder is given.
+	Workers share the cache folder, whose index they update under a lock;
+	see cacheindex.py.
+	"""
+	(location, public_id, cache_folder, cache_max_size) = job
+	try:
+		if cache_folder and location[0:4].lower() != 'http':
+			cache = graphcache.GraphCache(cache_folder, cache_max_size)
+			return (cache.get_parsed(location, None, public_id), None)
+
+		return (graphcache.parse_file(location, None, public_id), None)
+
+	except Exception as e:
+		return (None, str(e))
+
+
 class OntoHelper(object):
 
 	CODE_VERSION = '0.0.3'
 
+	# Entity text annotations, each with at most one value per entity.
+	TEXT_FIELDS = ['label', 'definition', 'ui_label', 'ui_definition']
+
+	# Synonym annotations; 'has' is prefixed to each synonym variety.
+	SYNONYM_FIELDS = ['hasSynonym', 'hasExactSynonym', 'hasNarrowSynonym', 'hasAlternativeTerm']
+
+	# Annotation predicates harvested by do_annotation_tables(), keyed by
+	# the field name they are reported under.
+	ANNOTATION_PREDICATES = OrderedDict([
+		('label',				'http://www.w3.org/2000/01/rdf-schema#label'),
+		('definition',			'http://purl.obolibrary.org/obo/IAO_0000115'),
+		('ui_label',			'http://purl.obolibrary.org/obo/GENEPIO_0000006'),
+		('ui_definition',		'http://purl.obolibrary.org/obo/GENEPIO_0000162'),
+		('hasSynonym',			'http://www.geneontology.org/formats/oboInOwl#hasSynonym'),
+		('hasExactSynonym',		'http://www.geneontology.org/formats/oboInOwl#hasExactSynonym'),
+		('hasNarrowSynonym',	'http://www.geneontology.org/formats/oboInOwl#hasNarrowSynonym'),
+		('hasAlternativeTerm',	'http://purl.obolibrary.org/obo/IAO_0000118'),
+		('hasDbXref',			'http://www.geneontology.org/formats/oboInOwl#hasDbXref')
+	])
+
+	# Annotations reported in do_tree_table() rows.
+	TREE_PREDICATES = {
+		'deprecated':	'http://www.w3.org/2002/07/owl#deprecated',
+		'replaced_by':	'http://purl.obolibrary.org/obo/IAO_0100001'
+	}
+
 	def __init__(self):
 
 		self.graph = rdflib.Graph()
 
+		# SQLite store holding self.graph's triples, if any; see set_engine()
+		self.store = None
+		self.store_sources = set()
+
+		# Optional persistent cache of parsed files; see set_graph_cache()
+		self.graph_cache = None
+
+		# Optional on-disk mirror of remote files; see set_mirror()
+		self.mirror = None
+
+		# Import graphs shared with other OntoHelpers; see set_shared_imports()
+		self.shared_imports = None
+
+		# Optional persistent cache of query result tables; see set_query_cache()
+		self.query_cache = None
+
+		# Number of sparql queries run over self.graph; see do_query()
+		self.query_count = 0
+
+		# Signatures of files loaded into self.graph, by location; see add_source()
+		self.sources = OrderedDict()
+
+		# Indexed, memoized lookups of @context; see get_prefix_resolver()
+		self.prefix_resolver = None
+
+		# rdfs:subClassOf index built by get_subclass_index()
+		self.subclass_index = None
+
+		# Memoized sort keys of terms and of entities' labels; see
+		# get_term_sort_key() and get_label_sort_key()
+		self.sort_keys = {}
+		self.label_sort_keys = {}
+
+		# Per-subject annotation tables built by do_annotation_tables()
+		self.annotations = None
+
 		self.struct = OrderedDict()
 		"""
 		JSON-LD @context enables output .json file to have shorter URI's
@@ -98,7 +196,9 @@ class OntoHelper(object):
 			'OBI':	rdflib.URIRef('http://purl.obolibrary.org/obo/OBI_')
 		}
 
-		self.queries = {
+		# Sparql queries by name, prepared on first use; see add_queries()
+		self.queries = queryregistry.QueryRegistry(self.namespace)
+		self.add_queries({
 
 			##################################################################
 			# Fetch ontology metadata fields
@@ -112,7 +212,7 @@ class OntoHelper(object):
 		    #		<dc:license rdf:resource="http://creativecommons.org/licenses/by/3.0/"/>
 		    #		<dc:date rdf:datatype="http://www.w3.org/2001/XMLSchema#date">2018-02-28</dc:date>
 
-			'ontology_metadata': prepareQuery("""
+			'ontology_metadata': """
 			SELECT DISTINCT ?resource ?title ?description ?versionIRI ?prefix ?license ?date 
 			WHERE {
 				?resource rdf:type owl:Ontology.
@@ -123,9 +223,9 @@ class OntoHelper(object):
 				OPTIONAL {?resource (dc:license|terms:license) ?license.}
 				OPTIONAL {?resource (dc:date|terms:date) ?date.}
 			}
-			""", initNs = self.namespace)
+			"""
 
-		}
+		})
 
 	def __main__(self):
 		pass
@@ -199,6 +299,33 @@ class OntoHelper(object):
 				focus = focus[arg]
 
 
+	def get_entity(self, id):
+		"""
+		Returns given id's record in struct['specifications'], or None.
+		The record is a direct reference, so builders can update it in
+		place rather than walk struct with get_struct() / set_entity_default()
+		for each field they set.
+		"""
+		return self.struct['specifications'].get(id)
+
+
+	def add_entity(self, id, fields = None):
+		"""
+		Returns record of given id in struct['specifications'], adding given
+		fields (default {'id': id}) as its record first if there is none.
+		Same as set_entity_default(struct, 'specifications', id, fields) in
+		one lookup.
+		"""
+		if not id: stop_err( "ERROR: in add_entity(), no id for: %s" % str(fields) )
+
+		specifications = self.struct['specifications']
+		entity = specifications.get(id)
+		if entity is None:
+			specifications[id] = {'id': id} if fields is None else fields
+			entity = specifications[id]
+		return entity
+
+
 	def get_entity_id(self, myURI):
 		"""
 		 If given text is an http URI, look up its substitution prefix
@@ -218,115 +345,531 @@ class OntoHelper(object):
 		 OUTPUT
 		 	:string
 		 """
-		if myURI[0:4] == 'http':
+		return self.get_prefix_resolver().get_entity_id(myURI)
+
+
+	def get_expanded_id(self, myURI):
+		# If a URI has a recognized prefix, create full version
+		return self.get_prefix_resolver().get_expanded_id(myURI)
+
+
+	def get_prefix_resolver(self):
+		"""
+		Returns PrefixResolver for struct's @context, making a new one if
+		@context has been replaced.
+		"""
+		if self.prefix_resolver is None or self.prefix_resolver.context is not self.struct['@context']:
+			self.prefix_resolver = prefixresolver.PrefixResolver(self.struct['@context'])
+
+		return self.prefix_resolver
+
+
+	def get_added_prefixes(self, previous):
+		"""
+		Returns (prefix, namespace) items of @context that are new or
+		changed since given copy of it was taken. A prefix found for a new
+		namespace replaces an existing one of the same name, so changed
+		items count as much as new ones.
+		"""
+		return [(prefix, namespace) for (prefix, namespace) in self.struct['@context'].items()
+			if previous.get(prefix) != namespace]
+
 
-			if '_' in myURI:
-				(path, fragment) = myURI.rsplit('_',1)
-				separator = '_'
+	def add_prefixes(self, prefixes):
+		"""
+		Adds given (prefix, namespace) items to @context, in order, as
+		finding their namespaces here would have: a prefix name already
+		in @context gets the new namespace.
+		"""
+		resolver = self.get_prefix_resolver()
+		for (prefix, namespace) in prefixes:
+			resolver.add_prefix(prefix, namespace)
 
-			elif '#' in myURI: # Need '#' test first!    path#fragment
-				(path, fragment) = myURI.rsplit('#',1)
-				separator = '#'
 
+	def reorder(self, entity, part, orderedKeys = None):
+		"""
+		Order given entity part dictionary by given order array of ids, or
+		alphabetically by ui_label (or label) if none. Ids not in order
+		array rank with its first item, as before.
+			# components, models, choices are all orderedDict already.
+		"""
+		if part in entity:
+			if orderedKeys:
+				# Each entity[part] item is ranked by position of its id in
+				# given orderedKeys list, looked up in a position map.
+				positions = {}
+				for (position, id) in enumerate(orderedKeys):
+					positions.setdefault(id, position)
+				key = lambda item: positions.get(item[0], False)
 			else:
+				specifications = self.struct['specifications']
+				def key(item):
+					child = specifications.get(item[0], {})
+					return child.get('ui_label') or child.get('label') or item[0]
 
-				(path, fragment) = myURI.rsplit('/',1)
-				separator = '/'
-			
-			full_path = path + separator
+			entity[part] = OrderedDict(sorted(entity[part].items(), key = key))
 
-			for prefix, context_prefix in self.struct['@context'].items():
-				# Snips last separation character 
-				if full_path == context_prefix: 
-					return prefix + ":" + fragment
-			
-			# At this point path not recognized in @context lookup
-			# table, so add it to @context 
-			prefix = path.rsplit('/',1)[1]
 
-			# At least 2 characters in @context prefix required to avoid
-			# exception to rule below where a version date exists in file.
-			# No namespace begins with number
-			# and following is a URI but not an ontology term reference.
-			#	<owl:versionIRI rdf:resource="http://purl.obolibrary.org/obo/obi/2018-05-23/obi.owl"/>
+	def set_graph_cache(self, cache_folder = None, max_size = graphcache.DEFAULT_MAX_SIZE):
+		"""
+		Enables persistent cache of parsed ontology files, so later runs
+		load them from cache instead of reparsing RDF/XML. If no cache folder
+		is given, ~/.cache/geem/graphs is used. The sqlite engine doesn't
+		use it, as its store already keeps files parsed by earlier runs.
+		"""
+		self.graph_cache = graphcache.GraphCache(cache_folder, max_size)
+
 
-			if prefix[0:2].isalpha(): 
-				self.struct['@context'][prefix] = full_path
-				return prefix + ":" + fragment
+	def set_mirror(self, mirror_folder = None):
+		"""
+		Enables on-disk mirror of ontology files given by URL, so unchanged
+		remote files aren't downloaded again, and mirrored copies are used
+		when offline. If no mirror folder is given, ~/.cache/geem/mirror is
+		used.
+		"""
+		self.mirror = ontomirror.OntologyMirror(mirror_folder)
 
 
-		return myURI 		# Returns untouched string
+	def set_query_cache(self, cache_folder = None, max_size = querycache.DEFAULT_MAX_SIZE):
+		"""
+		Enables persistent cache of do_query_table() results, so later runs
+		over unchanged ontology files read tables instead of querying the
+		graph. If no cache folder is given, ~/.cache/geem/queries is used.
+		"""
+		self.query_cache = querycache.QueryCache(cache_folder, max_size)
 
 
-	def get_expanded_id(self, myURI):
-		# If a URI has a recognized prefix, create full version
-		if ':' in myURI: 
-			(prefix, myid) = myURI.rsplit(':',1)
+	def set_prepared_query_cache(self, cache_folder = None):
+		"""
+		Enables persistent cache of prepared queries, so later runs load
+		the parsed algebra of self.queries instead of parsing them again. If
+		no cache folder is given, ~/.cache/geem/algebra is used.
+		"""
+		self.queries.set_cache(cache_folder or queryregistry.DEFAULT_CACHE_FOLDER)
 
-			if prefix in self.struct['@context']:
-				return self.struct['@context'][prefix] + myid
-			else:
-				print ('ERROR in get_expanded_id(): No @context prefix for: ', myURI, ">" + prefix + "<")
 
-		return myURI 
+	def add_queries(self, texts):
+		"""
+		Adds given {name: sparql text} queries to self.queries, to be
+		prepared with self.namespace prefixes when first used. Returns
+		self.queries.
+		"""
+		self.queries.add_queries(texts)
+		return self.queries
 
 
-	def reorder(self, entity, part, orderedKeys = None):
-			""" Order given entity part dictionary by given order array of ids, or alphabetically if none.
-				# components, models, choices are all orderedDict already.
-			"""
-			if part in entity:
-				if orderedKeys:
-					# Each entity[part] item is given a rank by the index location of its id in given orderedKeys list
-					entity[part] = OrderedDict(sorted(entity[part].items(), key=lambda item: orderedKeys.index(item[0]) if item[0] in orderedKeys else False))
-				else:
-					entity[part] = OrderedDict(sorted(entity[part].items(), key=attrgetter('ui_label')) )
+	def prepare_query(self, text):
+		"""
+		Returns sparql query prepared with self.namespace prefixes. Its text
+		is kept with it, as do_query_table() caches results by query text.
+		"""
+		return self.queries.prepare(text)
+
+
+	def set_engine(self, engine = 'memory', store_file = None):
+		"""
+		Selects where self.graph keeps its triples:
+			memory: rdflib's in-memory store (default)
+			sqlite: indexed SQLite file, given or else one per main ontology
+				file under ~/.cache/geem/stores; see get_store_file(). Files
+				already loaded into it by an earlier run, and unchanged
+				since, aren't parsed again.
+			numpy: integer encoded, sorted NumPy arrays in memory; see
+				arraystore.ArrayStore. Needs NumPy.
+		Call this before any ontology is parsed.
+		"""
+		if engine == 'memory':
+			self.store = None
+			self.graph = rdflib.Graph()
+
+		elif engine == 'sqlite':
+			if store_file is None:
+				stop_err('An SQLite store file is needed for the sqlite engine')
+			self.store = sqlitestore.SQLiteStore(store_file)
+			self.graph = rdflib.Graph(store = self.store)
+
+		elif engine == 'numpy':
+			if arraystore.numpy is None:
+				stop_err('The numpy engine needs NumPy; try "pip install numpy"')
+			self.store = None
+			self.graph = rdflib.Graph(store = arraystore.ArrayStore())
+
+		else:
+			stop_err('Unknown storage engine: ' + engine)
+
+		self.store_sources = set()
+		self.sources = OrderedDict()
+		self.subclass_index = None
+		self.sort_keys = {}
+		self.label_sort_keys = {}
+
+
+	def set_shared_imports(self, shared_imports):
+		"""
+		Shares parsed import files with other OntoHelpers given the same
+		dictionary, so a batch of ontologies parses each common import only
+		once. shared_imports maps import file location to (graph, namespace
+		bindings, owl:imports) of it, and is filled in by
+		do_ontology_includes(). self.graph becomes an OverlayStore graph:
+		own triples on top of the shared graphs of its imports. Call this
+		after set_engine(), before any ontology is parsed. The sqlite
+		engine can't share imports.
+		"""
+		if self.store is not None:
+			stop_err('Shared imports need the memory or numpy engine')
+
+		self.shared_imports = shared_imports
+		self.graph = rdflib.Graph(store = overlaystore.OverlayStore(self.graph.store))
+		self.subclass_index = None
+
+
+	def add_shared_import(self, location, parsed = None):
+		"""
+		Adds shared graph of given import file to self.graph, first making
+		it from given graphcache.parse_file() result if no OntoHelper has.
+		Namespaces are bound as graphcache.add_parsed() would. Returns the
+		file's owl:imports.
+		"""
+		if not location in self.shared_imports:
+			top = self.graph.store.layers[0]
+			graph = rdflib.Graph(store = top.__class__())
+			graph.addN((s, p, o, graph) for (s, p, o) in parsed['triples'])
+			self.shared_imports[location] = (graph, parsed['namespaces'],
+				[o for (s, p, o) in parsed['triples'] if p == rdflib.OWL.imports])
+
+		(graph, namespaces, imports) = self.shared_imports[location]
+		for (prefix, namespace) in namespaces:
+			self.graph.bind(prefix, rdflib.URIRef(namespace), override = False)
+		self.graph.store.add_layer(graph.store)
+		self.add_source(location)
+		return imports
+
+
+	def get_store_file(self, main_ontology_file, store_folder = None):
+		"""
+		Returns default SQLite store file for given main ontology: one per
+		ontology file path, in given folder or ~/.cache/geem/stores.
+		"""
+		if store_folder is None:
+			store_folder = sqlitestore.DEFAULT_STORE_FOLDER
+
+		location = main_ontology_file if main_ontology_file[0:4] == 'http' else os.path.realpath(main_ontology_file)
+		(basename, extension) = os.path.splitext(os.path.basename(location))
+		return os.path.join(store_folder, basename + '-' + hashlib.sha1(location.encode('utf-8')).hexdigest()[0:8] + '.sqlite')
+
+
+	def get_source_signature(self, location):
+		"""
+		Returns signature of a local ontology file as loaded into SQLite
+		store: path, modification time and size. URLs have none, so are
+		always loaded again.
+		"""
+		if location[0:4].lower() == 'http':
+			return None
+
+		stat = os.stat(location)
+		return '%s|%s|%s' % (os.path.realpath(location), stat.st_mtime_ns, stat.st_size)
+
+
+	def is_stored(self, location):
+		"""
+		True if given file was loaded into SQLite store by an earlier run and
+		hasn't changed since. Such files are kept in store; all others are
+		dropped by end_sources().
+		"""
+		if self.store is None:
+			return False
+
+		signature = self.get_source_signature(location)
+		if signature is None or self.store.get_source_signature(location) != signature:
+			return False
+
+		print ("Reusing " + location + " from store")
+		self.store_sources.add(location)
+		self.add_source(location)
+		return True
+
+
+	def begin_source(self, location):
+		""" Records, in SQLite store, that following triples come from location. """
+		if self.store is not None:
+			self.store.begin_source(location, self.get_source_signature(location))
+			self.store_sources.add(location)
+
+
+	def end_source(self):
+		""" Commits triples of current file to SQLite store. """
+		if self.store is not None:
+			self.store.end_source()
+
+
+	def add_source(self, location):
+		"""
+		Records that given file is loaded into self.graph, with its
+		signature: that of its mirrored copy if it is a URL. URLs loaded
+		without mirror have none.
+		"""
+		if location[0:4].lower() == 'http':
+			mirrored = self.mirror.get_mirror_paths(location)[0] if self.mirror else None
+			signature = self.get_source_signature(mirrored) if mirrored and os.path.isfile(mirrored) else None
+		else:
+			signature = self.get_source_signature(location)
+		self.sources[location] = signature
+
+
+	def get_sources_fingerprint(self):
+		"""
+		Returns sha1 of signatures of files loaded into self.graph, or None
+		if there are none, or any has no signature.
+		"""
+		if not self.sources or None in self.sources.values():
+			return None
+		text = json.dumps(sorted(self.sources.items()))
+		return hashlib.sha1(text.encode('utf8')).hexdigest()
+
+
+	def end_sources(self):
+		""" Drops files from SQLite store which this run hasn't loaded. """
+		if self.store is not None:
+			self.store.remove_sources(self.store_sources)
+
+
+	def parse_ontology(self, ontology_file, format = None):
+		"""
+		Adds given ontology file path or URL to self.graph. URLs are fetched
+		through mirror, and local files go through graph cache, if these
+		have been set. With SQLite engine, a file already in store is used
+		as is. Format, one of ontoformat.FORMATS, is detected if not given.
+		"""
+		if self.is_stored(ontology_file):
+			return
+
+		file_path = ontology_file
+		public_id = None
+		if self.mirror and ontology_file[0:4].lower() == 'http':
+			public_id = ontology_file
+			file_path = self.mirror.fetch(ontology_file)
+
+		self.load_file(ontology_file, file_path, format, public_id)
 
 
-	def do_ontology_includes(self, main_ontology_file):
+	def load_file(self, location, file_path, format = None, public_id = None):
+		"""
+		Adds given file to self.graph as the content of location: itself,
+		or the URL it is a mirrored copy of, given as public_id. Local files
+		go through graph cache if it is set. With SQLite engine they stream
+		straight into store instead, which keeps them for later runs itself;
+		if that fails, what was added of the file is rolled back.
+		"""
+		self.begin_source(location)
+		try:
+			if self.graph_cache and self.store is None and file_path[0:4].lower() != 'http':
+				self.graph_cache.load(self.graph, file_path, format, public_id)
+			else:
+				ontoformat.load(self.graph, file_path, format, public_id)
+		except Exception:
+			if self.store is not None:
+				self.store.rollback()
+				self.store_sources.discard(location)
+			raise
+
+		self.end_source()
+		self.add_source(location)
+
+
+	def do_ontology_includes(self, main_ontology_file, processes = None):
 		"""
 		Detects all the import files in a loaded OWL ontology graph and adds
 		them to the graph. If main ontology file is given as a file path, then
 		imports are checked as resources located in possible './imports" 
 		folder relative to that file.  Otherwise they are fetched by URL.
 
+		The full transitive closure of owl:imports is loaded, each import only
+		once. Import files are parsed in a process pool, a level of the
+		import tree at a time, and their triples are merged into self.graph
+		as each is parsed. With SQLite engine, imports already in store are
+		used as is, others stream into it one at a time (see
+		do_store_files()), and files no longer imported are dropped from
+		it. With shared imports,
+		each is parsed only if no OntoHelper sharing them has already; see
+		set_shared_imports().
+
 		INPUT
+			main_ontology_file: file path or URL of main ontology
+			processes: size of process pool; default is number of CPUs. 1
+				parses imports one after another in this process.
+		"""
+		imports = self.get_imports(self.graph.objects(None, rdflib.OWL.imports))
+		print ("It has %s import files ..." % len(imports))
+
+		# Main ontology IRI included in case an import imports it back.
+		loaded = set(imports)
+		loaded.update(str(ontology) for ontology in self.graph.subjects(rdflib.RDF.type, rdflib.OWL.Ontology))
+		while imports:
+
+			locations = []
+			nested_imports = []
+			for import_file in imports:
+				print (import_file)
+				location = self.get_import_location(main_ontology_file, import_file)
+				if not location:
+					continue
+				if self.is_stored(location):
+					nested_imports.extend(self.store.get_source_objects(location, rdflib.OWL.imports))
+				elif self.shared_imports is not None and location in self.shared_imports:
+					nested_imports.extend(self.add_shared_import(location))
+				else:
+					locations.append(location)
+
+			if self.store is not None:
+				results = self.do_store_files(locations)
+			else:
+				results = self.do_parse_files(locations, processes)
+
+			for (location, parsed, error) in results:
+				if error:
+					if location[0:4] == 'http':
+						print ('WARNING:' + location + " could not be loaded!\n", error)
+					else:
+						print (location + " needs to be in RDF/XML, N-Triples, Turtle or OBO Graphs JSON format!", error)
+					continue
+
+				if parsed is None: # Already streamed into SQLite store
+					nested_imports.extend(self.store.get_source_objects(location, rdflib.OWL.imports))
+					continue
+
+				if self.shared_imports is not None:
+					nested_imports.extend(self.add_shared_import(location, parsed))
+					continue
+
+				self.begin_source(location)
+				graphcache.add_parsed(self.graph, parsed)
+				self.end_source()
+				self.add_source(location)
+				nested_imports.extend(
+					o for (s, p, o) in parsed['triples'] if p == rdflib.OWL.imports)
+
+			imports = [import_file for import_file in self.get_imports(nested_imports)
+				if not import_file in loaded]
+			loaded.update(imports)
+			if imports:
+				print ("Imports have %s further import files ..." % len(imports))
 
+		self.end_sources()
+
+
+	def get_imports(self, import_files):
+		""" Returns sorted, distinct list of owl:imports IRIs. """
+		return sorted(set(str(import_file) for import_file in import_files))
+
+
+	def get_import_location(self, main_ontology_file, import_file):
+		"""
+		Returns URL or local file path to load given import from. If main
+		ontology was supplied as a URI, then imports are fetched likewise.
+		Otherwise only its ./imports/ folder is checked since, as a local
+		resource, its imports should be local too. None is returned if that
+		file doesn't exist.
 		"""
-		imports = self.graph.query("""
-			SELECT distinct ?import_file
-			WHERE {?s owl:imports ?import_file.}
-			ORDER BY (?import_file)
-		""")		
+		if main_ontology_file[0:4] == 'http':
+			return import_file
 
-		print ("It has %s import files ..." % len(imports))
+		file_path = os.path.dirname(main_ontology_file) + '/imports/' + import_file.rsplit('/',1)[1]
+		if os.path.isfile(file_path):
+			return file_path
 
-		for result_row in imports:
+		print ('WARNING:' + file_path + " could not be loaded!  Does its ontology include purl have a corresponding local file? \n")
+		return None
 
-			import_file = result_row.import_file
-			print (import_file)
-			# If main file supplied as a URI, then process imports likewise
-			if main_ontology_file[0:4] == 'http':
-				try:
-					self.graph.parse(import_file, format='xml')	
-				#except rdflib.exceptions.ParserError as e:
-				except Exception as e:
-					print ('WARNING:' + import_file + " could not be loaded!\n", e)		
 
-			# Ontology given as file path, so only check its ./imports/ folder
-			# since, as a local resource, its imports should be local too.
-			else:
+	def do_parse_files(self, locations, processes = None):
+		"""
+		Parses given file paths or URLs in a process pool, generating
+		(location, parsed, error) in order given, where parsed is a
+		graphcache.parse_file() result. If a mirror is set, URLs are first
+		fetched into it concurrently. Graph cache, if set, is used by
+		workers too. Each result is generated as soon as it and those
+		before it are in, so it can be added to graph and dropped while
+		later files are parsed; see get_parse_results().
+		"""
+		cache_folder = self.graph_cache.cache_folder if self.graph_cache else None
+		cache_max_size = self.graph_cache.max_size if self.graph_cache else None
+
+		(mirrored, errors) = self.get_mirrored(locations)
+		jobs = [(mirrored[location], location, cache_folder, cache_max_size) if location in mirrored
+			else (location, None, cache_folder, cache_max_size)
+			for location in locations if not location in errors]
 
-				file_path = os.path.dirname(main_ontology_file) + '/imports/' + import_file.rsplit('/',1)[1]
+		results = self.get_parse_results(jobs, processes)
+		for location in locations:
+			yield (location, None, errors[location]) if location in errors else (location,) + next(results)
 
+
+	def get_parse_results(self, jobs, processes = None):
+		"""
+		Generates parse_import() results of given jobs, in order. Jobs run
+		in a pool of given number of processes, default number of CPUs, and
+		at most that many are run ahead of the result being used, so a
+		level of large imports is never all held in memory at once.
+		"""
+		if processes is None:
+			processes = multiprocessing.cpu_count()
+		processes = min(processes, len(jobs))
+
+		if processes <= 1:
+			for job in jobs:
+				yield parse_import(job)
+			return
+
+		with concurrent.futures.ProcessPoolExecutor(max_workers = processes) as executor:
+			futures = collections.deque()
+			for job in jobs:
+				futures.append(executor.submit(parse_import, job))
+				if len(futures) > processes:
+					yield futures.popleft().result()
+			while futures:
+				yield futures.popleft().result()
+
+
+	def do_store_files(self, locations):
+		"""
+		Loads given file paths or URLs into SQLite store, generating
+		(location, None, error) for each in order given. Files are parsed
+		one at a time in this process, streaming triples into store as they
+		are read: handing them back from a process pool would hold a whole
+		file's triples in memory, which the SQLite engine is there to
+		avoid. If a mirror is set, URLs are first fetched into it
+		concurrently.
+		"""
+		(mirrored, errors) = self.get_mirrored(locations)
+		for location in locations:
+			error = errors.get(location)
+			if error is None:
 				try:
-					if os.path.isfile( file_path):
-						self.graph.parse(file_path)	
+					if location in mirrored:
+						self.load_file(location, mirrored[location], None, location)
 					else:
-						print ('WARNING:' + file_path + " could not be loaded!  Does its ontology include purl have a corresponding local file? \n")
+						self.load_file(location, location)
+				except Exception as e:
+					error = str(e)
+			yield (location, None, error)
 
-				except rdflib.exceptions.ParserError as e:
-					print (file_path + " needs to be in RDF OWL format!")			
+
+	def get_mirrored(self, locations):
+		"""
+		Fetches URLs among given locations into mirror, if one is set,
+		concurrently. Returns ({url: mirrored file path}, {url: error}).
+		"""
+		mirrored = {}
+		errors = {}
+		if self.mirror:
+			urls = [location for location in locations if location[0:4].lower() == 'http']
+			for (url, file_path, error) in self.mirror.fetch_all(urls):
+				if error:
+					errors[url] = error
+				else:
+					mirrored[url] = file_path
+		return (mirrored, errors)
 
 
 	def set_ontology_metadata(self, query):
@@ -345,7 +888,13 @@ class OntoHelper(object):
         	resource = "http://purl.obolibrary.org/obo/genepio.owl",
 		"""
 		
-		metadata = self.graph.query(query)
+		metadata = self.do_query(query)
+
+		# Import files may declare their own owl:Ontology too. Rows for those
+		# go first so that the main ontology's row is the one that remains,
+		# regardless of the order triples were loaded in.
+		imported = set(self.graph.objects(None, rdflib.OWL.imports))
+		metadata = sorted(metadata, key = lambda row: row['resource'] not in imported)
 
 		for myDict in metadata: # Should only be 1 row containing a dictionary.
 			myDict2 = myDict.asdict()
@@ -359,7 +908,452 @@ class OntoHelper(object):
 			self.struct['metadata'] = myDict2
 
 
-	def do_query_table(self, query, initBinds = {}):
+	def do_annotation_tables(self):
+		"""
+		Bulk harvest of entity annotations. Rather than running a prepared
+		sparql query per entity for its labels, synonyms and database cross-
+		references, each predicate in ANNOTATION_PREDICATES is walked once
+		over the whole graph to build per-subject annotation tables:
+
+			self.annotations = {subject URI: {field: [value, ...]}}
+
+		Values are kept as plain strings, sorted so that picking the last one
+		gives the same result as the former "ORDER BY ?label" per-entity
+		queries.
+		Annotations on blank nodes (e.g. owl:Axiom labels) are skipped; those
+		are handled by feature queries.
+
+		Call this after all ontology and import files have been parsed.
+		"""
+		self.annotations = {}
+		for (field, predicate) in self.ANNOTATION_PREDICATES.items():
+			for (subject, value) in self.graph.subject_objects(rdflib.URIRef(predicate)):
+				if isinstance(subject, rdflib.term.BNode):
+					continue
+				entity = self.annotations.setdefault(str(subject), {})
+				entity.setdefault(field, []).append(str(value))
+
+		for entity in self.annotations.values():
+			for field in entity:
+				if len(entity[field]) > 1:
+					entity[field].sort()
+
+
+	def get_annotations(self, myURI):
+		"""
+		Returns the {field: [value, ...]} annotation table for given entity
+		URI, harvesting the whole graph on first use.
+		"""
+		if self.annotations is None:
+			self.do_annotation_tables()
+
+		return self.annotations.get(str(myURI), {})
+
+
+	def get_entity_text(self, annotations):
+		"""
+		Returns a dictionary of TEXT_FIELDS (rdfs:label, IAO definition, UI
+		label, UI definition) from given get_annotations() table, one value
+		each. Empty values are skipped.
+		"""
+		text = {}
+		for field in self.TEXT_FIELDS:
+			if field in annotations:
+				values = [value for value in annotations[field] if len(value) > 0]
+				if values:
+					text[field] = values[-1]
+
+		return text
+
+
+	def get_entity_signatures(self, graph = None):
+		"""
+		Returns {subject URI: signature} for every named subject in graph
+		(self.graph by default). A signature is a hash of the subject's
+		triples with blank node objects - restrictions, unions, lists -
+		expanded in place, plus the owl:Axiom annotations made on it. Blank
+		node identifiers differ every time a file is parsed, so signatures
+		rather than raw triples are compared between ontology releases.
+		"""
+		if graph is None:
+			graph = self.graph
+
+		axioms = self.get_axioms(graph)
+		signatures = {}
+		for subject in set(graph.subjects()):
+			if isinstance(subject, rdflib.term.BNode):
+				continue
+			description = self.get_description(graph, subject, set())
+			description += ''.join(sorted(self.get_description(graph, axiom, set())
+				for axiom in axioms.get(subject, [])))
+			signatures[str(subject)] = hashlib.sha1(description.encode('utf8')).hexdigest()
+
+		return signatures
+
+
+	def get_axioms(self, graph):
+		""" Returns {annotated source: [owl:Axiom blank node, ...]} of graph. """
+		axioms = {}
+		for axiom in graph.subjects(rdflib.RDF.type, rdflib.OWL.Axiom):
+			if isinstance(axiom, rdflib.term.BNode):
+				for source in graph.objects(axiom, rdflib.OWL.annotatedSource):
+					axioms.setdefault(source, []).append(axiom)
+		return axioms
+
+
+	def get_description(self, graph, node, path, references = None):
+		"""
+		Returns canonical text of node's predicate-object pairs, recursing
+		into blank node objects; path guards against blank node cycles.
+		URIs of objects met along the way are added to references, if given.
+		"""
+		path = path | {node}
+		lines = []
+		for (predicate, value) in graph.predicate_objects(node):
+			if isinstance(value, rdflib.term.BNode):
+				text = '[]' if value in path else \
+					'[' + self.get_description(graph, value, path, references) + ']'
+			else:
+				text = value.n3()
+				if references is not None and isinstance(value, rdflib.term.URIRef):
+					references.add(str(value))
+			lines.append(predicate.n3() + ' ' + text)
+
+		return ' ; '.join(sorted(lines))
+
+
+	def get_entity_references(self, subjects, graph = None):
+		"""
+		Returns set of URIs that given subjects' triples, restrictions and
+		axiom annotations point to.
+		"""
+		if graph is None:
+			graph = self.graph
+
+		axioms = self.get_axioms(graph)
+		references = set()
+		for subject in subjects:
+			subject = rdflib.URIRef(subject)
+			self.get_description(graph, subject, set(), references)
+			for axiom in axioms.get(subject, []):
+				self.get_description(graph, axiom, set(), references)
+
+		return references
+
+
+	def get_descendants(self, subjects, graph = None):
+		""" Returns set of URIs of all rdfs:subClassOf descendants of given subjects. """
+		if graph is None:
+			graph = self.graph
+
+		descendants = set()
+		pending = [rdflib.URIRef(subject) for subject in subjects]
+		while pending:
+			for child in graph.subjects(rdflib.RDFS.subClassOf, pending.pop()):
+				if isinstance(child, rdflib.URIRef) and not str(child) in descendants:
+					descendants.add(str(child))
+					pending.append(child)
+
+		return descendants
+
+
+	def get_changed_entities(self, previous_graph):
+		"""
+		Compares self.graph with graph of a previous release of the same
+		ontology. Returns set of URIs of entities whose derived records may
+		differ between the two: each subject whose signature changed, its
+		rdfs:subClassOf descendants (which inherit from it), and the named
+		entities its old and new triples point to (parents, components,
+		units, feature referrers).
+		"""
+		previous = self.get_entity_signatures(previous_graph)
+		current = self.get_entity_signatures()
+		changed = set(subject for subject in set(previous) | set(current)
+			if previous.get(subject) != current.get(subject))
+
+		affected = set(changed)
+		for graph in (previous_graph, self.graph):
+			affected |= self.get_descendants(changed, graph)
+			affected |= self.get_entity_references(changed, graph) & (set(previous) | set(current))
+
+		return affected
+
+
+	def get_literal(self, value):
+		"""
+		Returns rdflib Literal as a plain string if it is untyped or an
+		xmls:string, and otherwise as {'value': ..., 'datatype': ...}.
+		"""
+		STRING_DATATYPE = rdflib.term.URIRef('http://www.w3.org/2001/XMLSchema#string')
+
+		# Text may include carriage returns; escape to json
+		literal = {'value': value.replace('\n', r'\n')} 
+		#_invalid_uri_chars = '<>" {}|\\^`'
+
+		if hasattr(value, 'datatype'): #rdf:datatype
+			#Convert literal back to straight string if its datatype is simply xmls:string
+			if value.datatype == None or value.datatype == STRING_DATATYPE:
+				literal = literal['value']
+			else:
+				literal['datatype'] = self.get_entity_id(value.datatype)															
+
+		elif hasattr(value, 'language'): # e.g.  xml:lang="en"
+			#A query Literal won't have a language if its the result of str(?whatever) !
+			literal['language'] = self.get_entity_id(value.language)
+		
+		else: # WHAT OTHER OPTIONS?
+			literal = literal['value']
+
+		return literal
+
+
+	def get_subclass_index(self):
+		"""
+		Returns rdfs:subClassOf index of self.graph, building it on first
+		use. Call this after all ontology and import files have been parsed.
+		"""
+		if self.subclass_index is None:
+			if self.store is not None:
+				self.subclass_index = sqlitestore.SQLiteSubclassIndex(self.store)
+			elif isinstance(self.graph.store, arraystore.ArrayStore):
+				self.subclass_index = arraystore.ArraySubclassIndex(self.graph.store)
+			else:
+				self.subclass_index = hierarchy.SubclassIndex(self.graph)
+
+		return self.subclass_index
+
+
+	def do_tree_table(self, root, label = False, outside_parents = False):
+		"""
+		Returns the "is a" hierarchy under given root as a table of
+		{id, parent_id, deprecated, replaced_by} rows, one per rdfs:subClassOf
+		link, like do_query_table() gives for the former 'tree' sparql
+		queries. It is read from get_subclass_index() instead of evaluating
+		an "rdfs:subClassOf*" property path.
+
+		Rows come in the order "ORDER BY ?parent_id ?ui_label ?label" gave,
+		sorted by keys each class gets once; see get_label_sort_key().
+		deprecated and replaced_by are strings, as xsd:string() made them.
+
+		INPUT
+			root: URI of hierarchy root
+			label: include 'label' column, one row per label
+			outside_parents: if False, rows are links to root or any class
+				under it. If True, rows are all links from root or any class
+				under it, including to parents outside of the hierarchy.
+		"""
+		index = self.get_subclass_index()
+		root = rdflib.URIRef(root)
+
+		if outside_parents:
+			links = [(node, parent) for node in index.get_descendants(root, True)
+				for parent in index.get_parents(node)]
+		else:
+			links = [(child, node) for node in index.get_descendants(root, True)
+				for child in index.get_children(node)]
+
+		# Columns and sort keys of each class, worked out once however many
+		# links it has.
+		variants = {}
+		rows = []
+		for (node, parent) in links:
+			if not node in variants:
+				variants[node] = self.get_tree_variants(node, label)
+
+			parent_columns = [('parent_id', self.get_entity_id(parent))]
+			for (columns, other_columns, ui_label_key, label_key) in variants[node]:
+				rows.append(((str(parent), ui_label_key, label_key, str(node)),
+					dict(columns + parent_columns + other_columns)))
+
+		rows.sort(key = lambda item: item[0])
+		return [columns for (sort_key, columns) in rows]
+
+
+	def get_tree_variants(self, node, label = False):
+		"""
+		Returns do_tree_table() rows of given class, less their parent_id,
+		as (columns before parent_id, columns after it, ui_label sort key,
+		label sort key) tuples: one per label if label is set, and one per
+		deprecated and replaced_by value.
+		"""
+		(ui_label_key, label_key) = self.get_label_sort_key(node)
+
+		# Columns in query's SELECT order.
+		columns = [('id', self.get_entity_id(node))]
+		variants = [(columns, label_key)]
+		if label:
+			labels = sorted(self.graph.objects(node, rdflib.RDFS.label), key = self.get_sort_key)
+			if labels:
+				variants = [(columns + [('label', self.get_literal(value))], self.get_sort_key(value))
+					for value in labels]
+
+		other_columns = [[]]
+		for field in ('deprecated', 'replaced_by'):
+			predicate = rdflib.URIRef(self.TREE_PREDICATES[field])
+			values = sorted(set(self.get_literal(rdflib.Literal(str(value)))
+				for value in self.graph.objects(node, predicate)))
+			if values:
+				other_columns = [other + [(field, value)] for other in other_columns for value in values]
+
+		return [(columns, other, ui_label_key, sort_key)
+			for (columns, sort_key) in variants for other in other_columns]
+
+
+	def do_inherited_table(self, table):
+		"""
+		Returns table of the {id, datatype, constraint, expression} rows
+		each class inherits from given rows on its ancestors, as a sparql
+		"rdfs:subClassOf/rdfs:subClassOf+" path would give. Rather than
+		evaluating that path per restriction, classes under any given one
+		are visited once in topological order, each passing its datatype
+		and constraints down to its children. Given rows are those of the
+		'primitives' query, so no second query of restrictions is needed.
+
+		A class's own rows apply on top of what it inherits: a different
+		datatype replaces the inherited one and drops its constraints, a
+		same one adds its constraints to them. Where parents pass down
+		different datatypes, that of the parent with the greatest URI wins,
+		so the result doesn't depend on the engine's order of links. Rows
+		come ordered by datatype, as "ORDER BY ?datatype" gave.
+
+		INPUT
+			table: rows of classes' own datatype and constraints, each
+				{id, datatype[, constraint, expression]}
+		"""
+		index = self.get_subclass_index()
+
+		own = OrderedDict()
+		for row in sorted(table, key = lambda row: self.get_expanded_id(row['datatype'])):
+			own.setdefault(rdflib.URIRef(self.get_expanded_id(row['id'])), []).append(row)
+
+		# class -> (datatype, tuple of constraint rows) it passes down
+		passed = {}
+		rows = []
+		for node in hierarchy.get_topological_order(index, list(own)):
+			inherited = None
+			for parent in sorted(index.get_parents(node)):
+				if parent in passed:
+					inherited = self.get_merged_inheritance(inherited, passed[parent])
+
+			if inherited is not None:
+				id = self.get_entity_id(node)
+				(datatype, constraints) = inherited
+				rows.append({'id': id, 'datatype': datatype})
+				rows.extend(dict(constraint, id = id, datatype = datatype) for constraint in constraints)
+
+			for row in own.get(node, []):
+				constraints = ()
+				if 'constraint' in row:
+					constraints = (dict((column, row[column]) for column in ('constraint', 'expression') if column in row),)
+				inherited = self.get_merged_inheritance(inherited, (row['datatype'], constraints))
+
+			if inherited is not None:
+				passed[node] = inherited
+
+		rows.sort(key = lambda row: self.get_expanded_id(row['datatype']))
+		return rows
+
+
+	def get_merged_inheritance(self, inherited, other):
+		"""
+		Returns (datatype, constraints) inheritance with other applied on
+		top: other's datatype replaces a different one, with its
+		constraints; the constraints of a same one are added, each once.
+		"""
+		if inherited is None or inherited[0] != other[0]:
+			return other
+
+		added = tuple(constraint for constraint in other[1] if not constraint in inherited[1])
+		return (inherited[0], inherited[1] + added) if added else inherited
+
+
+	def get_sort_key(self, value):
+		"""
+		Sort key of a literal or None following rdflib's sparql ORDER BY:
+		unbound first, then by datatype, language and value.
+		"""
+		if value is None:
+			return (0,)
+
+		# Untyped literals rank as xmls:string ones
+		datatype = value.datatype or 'http://www.w3.org/2001/XMLSchema#string'
+		language = value.language or ''
+		return (1, str(datatype), (1 if language else 0, language), str(value))
+
+
+	def get_term_sort_key(self, term):
+		"""
+		Sort key of an rdflib term or None following rdflib's sparql ORDER
+		BY: unbound first, then blank nodes, URIs and literals. Memoized, so
+		a term met in many rows is keyed once.
+		"""
+		key = self.sort_keys.get(term)
+		if key is None:
+			if term is None:
+				key = (0,)
+			elif isinstance(term, rdflib.BNode):
+				key = (1, str(term))
+			elif isinstance(term, rdflib.URIRef):
+				key = (2, str(term))
+			else:
+				key = (3, self.get_sort_key(term))
+			self.sort_keys[term] = key
+		return key
+
+
+	def get_label_sort_key(self, node):
+		"""
+		Returns (ui_label, label) sort keys of given entity, those of its
+		first ui_label and rdfs:label in sparql ORDER BY order, as ORDER BY
+		?ui_label ?label ranks it. Each entity's labels are looked up and
+		compared once, however many rows or links it is in.
+		"""
+		keys = self.label_sort_keys.get(node)
+		if keys is None:
+			ui_label_predicate = rdflib.URIRef(self.ANNOTATION_PREDICATES['ui_label'])
+			keys = tuple(min([self.get_sort_key(value) for value in self.graph.objects(node, predicate)] or [(0,)])
+				for predicate in (ui_label_predicate, rdflib.RDFS.label))
+			self.label_sort_keys[node] = keys
+		return keys
+
+
+	def get_ordered_rows(self, rows, order_by):
+		"""
+		Returns given sparql result rows sorted as a sparql ORDER BY would,
+		without its sorting by Literal comparisons: each row's key is made
+		of sort keys its values have, each worked out once.
+
+		INPUT
+			rows: result rows, each {variable: rdflib term}
+			order_by: result variables to order by, each either its name,
+				for its value, or (name, 'label') for the rdfs:label of the
+				entity that is its value, as "ORDER BY ?label" over an
+				"OPTIONAL {?name rdfs:label ?label}" gives.
+		"""
+		def key(row):
+			values = []
+			for variable in order_by:
+				if isinstance(variable, tuple):
+					value = row.get(variable[0])
+					values.append((0,) if value is None else self.get_label_sort_key(value)[1])
+				else:
+					values.append(self.get_term_sort_key(row.get(variable)))
+			return values
+
+		return sorted(rows, key = key)
+
+
+	def do_query(self, query, initBinds = None, initNs = None):
+		"""
+		Runs given sparql query over self.graph, counting it in
+		self.query_count so that reports can give how many queries a run
+		took, sub-queries included.
+		"""
+		self.query_count += 1
+		return self.graph.query(query, initBindings = initBinds, initNs = initNs)
+
+
+	def do_query_table(self, query, initBinds = {}, order_by = None):
 		"""
 		Given a sparql 1.1 query, returns a list of objects, one for each row.
 		For each object key/value, simplifies any URI reference (http://...) 
@@ -368,13 +1362,29 @@ class OntoHelper(object):
 		INPUT
 		initBinds:	To provide parameters to the query, supply it with initBindings 
 					containing a dictionary of bindings in format "term: value".
-
+		order_by:	Result variables to order rows by in place of a sparql
+					ORDER BY; see get_ordered_rows().
+
+		With a query cache set, the table of a query of self.queries or
+		prepare_query() (or given as text) is read from cache if the
+		same query, bindings and @context have been run over the same
+		ontology files before; @context prefixes its conversion added or
+		changed are added again.
 		"""
 
 		#query = self.queries[query_name]
 
+		cache_key = self.get_query_cache_key(query, initBinds, order_by)
+		if cache_key is not None:
+			cached = self.query_cache.get(cache_key)
+			if cached is not None:
+				(table, prefixes) = cached
+				self.add_prefixes(prefixes)
+				return table
+			previous = dict(self.struct['@context'])
+
 		try:
-			result = self.graph.query(query, initBindings=initBinds)
+			result = self.do_query(query, initBinds)
 		except Exception as e:
 			print ("\nSparql query [%s] parsing problem: %s \n" % (query, str(e) ))
 			return None
@@ -384,10 +1394,12 @@ class OntoHelper(object):
 		#columns = re.search(r"(?mi)\s*SELECT(\s+DISTINCT)?\s+((\?\w+\s+|\(\??\w+\s+as\s+\?\w+\)\s*)+)\s*WHERE", query)
 		#columns = re.findall(r"\s+\?(?P<name>\w+)\)?", columns.group(2))
 
-		STRING_DATATYPE = rdflib.term.URIRef('http://www.w3.org/2001/XMLSchema#string')
+		rows = [row.asdict() for row in result]
+		if order_by:
+			rows = self.get_ordered_rows(rows, order_by)
+
 		table = []
-		for ptr, row in enumerate(result):
-			rowdict = row.asdict()
+		for rowdict in rows:
 			newrowdict = {}
 
 			for column in rowdict:
@@ -399,25 +1411,7 @@ class OntoHelper(object):
 					newrowdict[column] = self.get_entity_id(value)  # a plain string
 
 				elif valType is rdflib.term.Literal :
-					# Text may include carriage returns; escape to json
-					literal = {'value': value.replace('\n', r'\n')} 
-					#_invalid_uri_chars = '<>" {}|\\^`'
-
-					if hasattr(value, 'datatype'): #rdf:datatype
-						#Convert literal back to straight string if its datatype is simply xmls:string
-						if value.datatype == None or value.datatype == STRING_DATATYPE:
-							literal = literal['value']
-						else:
-							literal['datatype'] = self.get_entity_id(value.datatype)															
-
-					elif hasattr(value, 'language'): # e.g.  xml:lang="en"
-						#A query Literal won't have a language if its the result of str(?whatever) !
-						literal['language'] = self.get_entity_id(value.language)
-					
-					else: # WHAT OTHER OPTIONS?
-						literal = literal['value']
-
-					newrowdict[column] = literal
+					newrowdict[column] = self.get_literal(value)
 
 				elif valType is rdflib.term.BNode:
 					"""
@@ -431,9 +1425,9 @@ class OntoHelper(object):
                     			   ...
                     """
                     # Here we fetch list of items in disjunction
-					disjunction = self.graph.query(
+					disjunction = self.do_query(
 						"SELECT ?id WHERE {?datum owl:unionOf/rdf:rest*/rdf:first ?id}", 
-						initBindings={'datum': value} )		
+						{'datum': value}, self.namespace)
 					results = [self.get_entity_id(item[0]) for item in disjunction] 
 					newrowdict['expression'] = {'datatype':'disjunction', 'data':results}
 
@@ -445,9 +1439,32 @@ class OntoHelper(object):
 
 			table.append(newrowdict)
 
+		if cache_key is not None:
+			self.query_cache.add(cache_key, table, self.get_added_prefixes(previous))
+
 		return table
 
 
+	def get_query_cache_key(self, query, initBinds, order_by = None):
+		"""
+		Returns query cache key of given query, bindings and ordering over
+		self.graph, or None if there is no query cache, the query's text
+		isn't known, or the graph's files have no fingerprint.
+		"""
+		if self.query_cache is None:
+			return None
+
+		text = query if isinstance(query, str) else getattr(query, 'text', None)
+		fingerprint = self.get_sources_fingerprint()
+		if text is None or fingerprint is None:
+			return None
+
+		if order_by:
+			text += '\n# order by ' + json.dumps(order_by)
+
+		return self.query_cache.get_key(fingerprint, text, initBinds, self.struct['@context'])
+
+
 	def check_folder(self, file_path, message = "Directory for "):
 		"""
 		Ensures file folder path for a file exists.
@@ -488,37 +1505,140 @@ class OntoHelper(object):
 		return (main_ontology_file, output_file_basename)
 
 
-	def do_output_json(self, struct, output_file_basename):
-		with (open(output_file_basename + '.json', 'w')) as output_handle:
+	def open_output(self, file_path, compress = False):
+		"""
+		Opens given output file for writing text. If compress, output is
+		gzipped and a .gz suffix is added to file name.
+		"""
+		if compress:
+			return gzip.open(file_path + '.gz', 'wt', encoding = 'utf-8')
+
+		return open(file_path, 'w')
+
+
+	def do_output_json(self, struct, output_file_basename, compress = False):
+		"""
+		Writes struct as [output_file_basename].json (or .json.gz). json.dump()
+		encodes struct piece by piece - @context, metadata, then each
+		specification entry - and writes each piece as it goes, so the whole
+		JSON text is never held in memory alongside struct.
+		"""
+		with self.open_output(output_file_basename + '.json', compress) as output_handle:
 			# DO NOT USE sort_keys=True on piclists etc. because this overrides
 			# OrderedDict() sort order.
-			output_handle.write(json.dumps(struct, sort_keys = False, indent = 4, separators = (',', ': ')))
+			json.dump(struct, output_handle, sort_keys = False, indent = 4, separators = (',', ': '))
 
 
-	def do_output_tsv(self, struct, output_file_basename, fields):
+	def do_output_shards(self, struct, output_file_basename, by = 'subtree', shard_size = 2000, compress = False):
 		"""
-		Tab separated output based on given field names
+		Writes struct as folder [output_file_basename].shards/ of
+		specification shards and a manifest holding @context, metadata
+		and an index of each entity's shard, so consumers can load just the
+		entities they need; see sharding.py. Shards of an earlier run are
+		removed.
+
+		INPUT
+			by: 'subtree' or 'hash'; see sharding.get_shards()
+			shard_size: entities per shard
+		"""
+		specifications = struct['specifications']
+		shards = sharding.get_shards(specifications, by, shard_size)
+		suffix = '.json.gz' if compress else '.json'
+
+		folder = sharding.get_manifest_folder(output_file_basename)
+		if not os.path.isdir(folder):
+			os.makedirs(folder)
+		for file_name in os.listdir(folder):
+			if file_name.endswith('.json') or file_name.endswith('.json.gz'):
+				os.remove(os.path.join(folder, file_name))
+
+		manifest = OrderedDict()
+		manifest['@context'] = struct['@context']
+		manifest['metadata'] = struct['metadata']
+		manifest['sharding'] = {'by': by, 'shard_size': shard_size}
+		manifest['shards'] = []
+		manifest['index'] = OrderedDict()
+
+		for (number, ids) in enumerate(shards):
+			file_name = '%04d' % number
+			with self.open_output(os.path.join(folder, file_name + '.json'), compress) as output_handle:
+				json.dump({'specifications': OrderedDict((id, specifications[id]) for id in ids)},
+					output_handle, separators = (',', ':'))
+			manifest['shards'].append({'file': file_name + suffix, 'entities': len(ids)})
+			for id in ids:
+				manifest['index'][id] = number
+
+		with self.open_output(os.path.join(folder, sharding.MANIFEST_FILE), compress) as output_handle:
+			json.dump(manifest, output_handle, separators = (',', ':'))
+
+
+	def do_output_tsv(self, struct, output_file_basename, fields, compress = False):
+		"""
+		Tab separated output based on given field names, written one entity
+		row at a time.
 
 		INPUT
 			fields: list
 			self.struct['specifications']
 		"""
-		output = []
+		with self.open_output(output_file_basename + '.tsv', compress) as output_handle:
 
-		# Header:			
-		output.append('\t'.join(fields))
+			# Header:
+			output_handle.write('\t'.join(fields))
 
-		for (key, entity) in struct['specifications'].items():
-			row = []
-			for field in fields:
-				value = entity[field] if field in entity else ''
-				if isinstance(value, list): # Constructed parent_id list.
-					value = ','.join(value)
-				row.append(value.replace('\t',' ')) # str() handles other_parents array
+			for (key, entity) in struct['specifications'].items():
+				row = []
+				for field in fields:
+					value = entity[field] if field in entity else ''
+					if isinstance(value, list): # Constructed parent_id list.
+						value = ','.join(value)
+					row.append(value.replace('\t',' ')) # str() handles other_parents array
 
-			output.append('\t'.join(row))
+				output_handle.write('\n' + '\t'.join(row))
 
-		with (open(output_file_basename + '.tsv', 'w')) as output_handle:
-			output_handle.write('\n'.join(output))
 
+	def get_content_hash(self, struct):
+		"""
+		Returns sha256 hex digest of a canonical JSON form of given struct,
+		which is the same for any two builds of unchanged ontology content.
+		See get_canonical().
+		"""
+		specifications = struct.get('specifications', {})
+		# Blank node ids differ on every parse, so each is replaced by a
+		# hash of its entity's content.
+		blank_ids = {}
+		for (id, entity) in specifications.items():
+			if not ':' in id:
+				content = json.dumps(self.get_canonical(entity, {id: ''}), sort_keys = True)
+				blank_ids[id] = '_:' + hashlib.sha1(content.encode('utf8')).hexdigest()[0:16]
 
+		canonical = self.get_canonical(struct, blank_ids)
+		text = json.dumps(canonical, sort_keys = True, separators = (',', ':'), ensure_ascii = False)
+		return hashlib.sha256(text.encode('utf8')).hexdigest()
+
+
+	def get_canonical(self, value, blank_ids, key = None):
+		"""
+		Returns plain copy of given struct part in which only meaningful
+		order remains: choices, components and models become lists of
+		[id, value] pairs, other dictionaries are left for json.dumps()
+		sort_keys to order, and constraint lists, which follow sparql
+		result order, are sorted. Strings found in blank_ids are replaced.
+		"""
+		if isinstance(value, dict):
+			items = [(blank_ids.get(item_key, item_key), self.get_canonical(item, blank_ids, item_key))
+				for (item_key, item) in value.items()]
+			if key in ('choices', 'components', 'models'):
+				return [list(item) for item in items]
+			return dict(items)
+
+		if isinstance(value, list):
+			items = [self.get_canonical(item, blank_ids) for item in value]
+			if key == 'constraints':
+				items.sort(key = lambda item: json.dumps(item, sort_keys = True))
+			return items
+
+		if isinstance(value, str):
+			return blank_ids.get(value, value)
+
+		return value
@@ -0,0 +1,145 @@
+#!/usr/bin/python
+#
+
+""" **************************************************************************
+	On-disk mirror of remote ontology files.
+
+	When an ontology is given by URL, it and each of its imports would
+	otherwise be downloaded on every run. OntologyMirror keeps a local copy
+	of each URL along with its ETag and Last-Modified response headers, and
+	revalidates it with a conditional request, so an unchanged file costs a
+	304 response rather than a full download. If the server can't be reached
+	the mirrored copy is used. Several URLs can be fetched concurrently with
+	fetch_all().
+
+	import python.ontomirror as om
+
+	mirror = om.OntologyMirror('~/.cache/geem/mirror')
+	file_path = mirror.fetch('http://purl.obolibrary.org/obo/obi.owl')
+
+	Each mirrored URL has two files in the mirror folder, named by a hash of
+	the URL: [hash].owl with the downloaded content and [hash].json with
+		{"url": ..., "etag": ..., "last_modified": ..., "fetched": timestamp}
+"""
+
+import os
+import json
+import time
+import hashlib
+import shutil
+import tempfile
+import concurrent.futures
+import urllib.request
+import urllib.error
+
+DEFAULT_MIRROR_FOLDER = os.path.join(os.path.expanduser('~'), '.cache', 'geem', 'mirror')
+
+
+class OntologyMirror(object):
+
+	def __init__(self, mirror_folder = None, timeout = 60, threads = 8):
+
+		self.mirror_folder = os.path.expanduser(mirror_folder or DEFAULT_MIRROR_FOLDER)
+		self.timeout = timeout
+		self.threads = threads
+
+		if not os.path.isdir(self.mirror_folder):
+			os.makedirs(self.mirror_folder)
+
+
+	def fetch(self, url):
+		"""
+		Returns local file path of up-to-date copy of given URL. A mirrored
+		copy is revalidated with If-None-Match / If-Modified-Since headers
+		and only downloaded again if server reports it has changed. If the
+		request fails for any reason other than an HTTP error status, the
+		mirrored copy is returned instead, if there is one.
+
+		INPUT
+			url: http(s) URL of ontology file
+		OUTPUT
+			file path in mirror folder
+		"""
+		(file_path, metadata_path) = self.get_mirror_paths(url)
+		metadata = self.read_metadata(metadata_path) if os.path.isfile(file_path) else None
+
+		request = urllib.request.Request(url)
+		if metadata:
+			if metadata.get('etag'):
+				request.add_header('If-None-Match', metadata['etag'])
+			if metadata.get('last_modified'):
+				request.add_header('If-Modified-Since', metadata['last_modified'])
+
+		try:
+			response = urllib.request.urlopen(request, timeout = self.timeout)
+
+		except urllib.error.HTTPError as e:
+			if e.code == 304 and metadata:
+				return file_path
+			raise
+
+		except (urllib.error.URLError, OSError) as e:
+			if metadata:
+				print ('WARNING: %s could not be fetched, using mirrored copy from %s: %s'
+					% (url, time.ctime(metadata['fetched']), e))
+				return file_path
+			raise
+
+		with response:
+			(handle, temp_file) = tempfile.mkstemp(dir = self.mirror_folder)
+			try:
+				with os.fdopen(handle, 'wb') as file_handle:
+					shutil.copyfileobj(response, file_handle, 1024 * 1024)
+				os.replace(temp_file, file_path)
+			except:
+				os.remove(temp_file)
+				raise
+
+			self.write_metadata(metadata_path, {
+				'url': url,
+				'etag': response.headers.get('ETag'),
+				'last_modified': response.headers.get('Last-Modified'),
+				'fetched': time.time()
+			})
+
+		return file_path
+
+
+	def fetch_all(self, urls):
+		"""
+		Fetches given URLs concurrently in a thread pool. Returns a list of
+		(url, file path, error) in order given; file path is None and error
+		holds the message if a URL couldn't be fetched.
+		"""
+		def fetch_one(url):
+			try:
+				return (url, self.fetch(url), None)
+			except Exception as e:
+				return (url, None, str(e))
+
+		if len(urls) <= 1:
+			return [fetch_one(url) for url in urls]
+
+		with concurrent.futures.ThreadPoolExecutor(max_workers = min(self.threads, len(urls))) as executor:
+			return list(executor.map(fetch_one, urls))
+
+
+	def get_mirror_paths(self, url):
+		url_hash = hashlib.sha1(url.encode('utf8')).hexdigest()
+		return (os.path.join(self.mirror_folder, url_hash + '.owl'),
+			os.path.join(self.mirror_folder, url_hash + '.json'))
+
+
+	def read_metadata(self, metadata_path):
+		try:
+			with open(metadata_path, 'r') as metadata_handle:
+				return json.load(metadata_handle)
+		except (IOError, OSError, ValueError):
+			return None
+
+
+	def write_metadata(self, metadata_path, metadata):
+		(handle, temp_file) = tempfile.mkstemp(dir = self.mirror_folder)
+		with os.fdopen(handle, 'w') as metadata_handle:
+			json.dump(metadata, metadata_handle)
+		os.replace(temp_file, metadata_path)
@@ -0,0 +1,104 @@
+#!/usr/bin/python
+#
+
+""" **************************************************************************
+	rdflib store overlaying one graph's own triples on shared graphs.
+
+	In a batch of ontologies that import the same BFO, IAO, RO or OBI
+	files, each import need only be parsed once, into a graph of its own.
+	Each ontology's graph then uses an OverlayStore: triples it adds go to
+	its top store, and reads see the union of that and the shared import
+	graphs added as layers below, which are never written to.
+
+	import python.overlaystore as ovs
+
+	graph = rdflib.Graph(store = ovs.OverlayStore(rdflib.Graph().store))
+	graph.parse('genepio.owl')
+	graph.store.add_layer(bfo_graph.store)
+
+	A triple found in several layers is read once, from the topmost.
+	Namespace bindings are those of the top store.
+"""
+
+from rdflib.store import Store
+
+
+def has_triple(store, triple):
+	for item in store.triples(triple, None):
+		return True
+	return False
+
+
+class OverlayStore(Store):
+
+	context_aware = False
+	formula_aware = False
+	transaction_aware = False
+	graph_aware = False
+
+	def __init__(self, top, identifier = None):
+		"""
+		INPUT
+			top: store added triples go to, e.g. rdflib.Graph().store
+		"""
+		self.layers = [top]
+		super(OverlayStore, self).__init__(None, identifier)
+
+
+	def add_layer(self, store):
+		""" Adds given shared store below the others, unless it already is. """
+		if not any(layer is store for layer in self.layers):
+			self.layers.append(store)
+
+
+	def add(self, triple, context, quoted = False):
+		self.layers[0].add(triple, context, quoted)
+
+
+	def addN(self, quads):
+		self.layers[0].addN(quads)
+
+
+	def remove(self, triple_pattern, context = None):
+		""" Removes matching triples of top store only; layers are shared. """
+		self.layers[0].remove(triple_pattern, context)
+
+
+	def triples(self, triple_pattern, context = None):
+		"""
+		Yields ((s, p, o), contexts) for each triple matching given pattern
+		in any layer, once.
+		"""
+		for (number, layer) in enumerate(self.layers):
+			above = self.layers[0:number]
+			for (triple, contexts) in layer.triples(triple_pattern, None):
+				if not any(has_triple(other, triple) for other in above):
+					yield (triple, iter(()))
+
+
+	def __len__(self, context = None):
+		return sum(1 for item in self.triples((None, None, None)))
+
+
+	def contexts(self, triple = None):
+		return iter(())
+
+
+	def bind(self, prefix, namespace, override = True):
+		# rdflib < 6 stores take no override argument, nor are given one.
+		if override:
+			self.layers[0].bind(prefix, namespace)
+		else:
+			self.layers[0].bind(prefix, namespace, override = False)
+
+
+	def namespace(self, prefix):
+		return self.layers[0].namespace(prefix)
+
+
+	def prefix(self, namespace):
+		return self.layers[0].prefix(namespace)
+
+
+	def namespaces(self):
+		return self.layers[0].namespaces()
@@ -0,0 +1,147 @@
+#!/usr/bin/python
+#
+
+""" **************************************************************************
+	Namespace prefix resolution between full URIs and CURIEs.
+
+	OntoHelper shortens every URI in every query result row to a prefix:id
+	form using the JSON-LD @context table, and expands ids back again when
+	looking entities up. PrefixResolver keeps a reverse namespace -> prefix
+	index of @context so shortening a URI is a hash lookup rather than a
+	scan of all prefixes, and memoizes recent results in both directions.
+
+	import python.prefixresolver as pr
+
+	resolver = pr.PrefixResolver(struct['@context'])
+	resolver.get_entity_id('http://purl.obolibrary.org/obo/GENEPIO_0001234')
+		-> 'GENEPIO:0001234'
+	resolver.get_expanded_id('GENEPIO:0001234')
+		-> 'http://purl.obolibrary.org/obo/GENEPIO_0001234'
+
+	Given @context dictionary is shared, not copied: prefixes found in new
+	URIs are added to it. Prefixes added to it directly by other code are
+	picked up on next call, as the index is rebuilt whenever its size
+	changes.
+"""
+
+import sys
+import functools
+
+# Number of URIs and ids remembered in each direction.
+DEFAULT_CACHE_SIZE = 100000
+
+
+class PrefixResolver(object):
+
+	def __init__(self, context, cache_size = DEFAULT_CACHE_SIZE):
+
+		self.context = context
+		self.namespaces = {}
+		self.context_size = None
+
+		self.compact = functools.lru_cache(maxsize = cache_size)(self.do_compact)
+		self.expand = functools.lru_cache(maxsize = cache_size)(self.do_expand)
+
+
+	def get_entity_id(self, myURI):
+		"""
+		Returns prefix:id form of given http URI, adding a prefix for its
+		namespace to @context if none exists yet. Other text is returned
+		untouched.
+		"""
+		if len(self.context) != self.context_size:
+			self.do_index()
+		return self.compact(myURI)
+
+
+	def get_expanded_id(self, myURI):
+		"""
+		Returns full URI of given prefix:id if its prefix is in @context.
+		Other text is returned untouched.
+		"""
+		if len(self.context) != self.context_size:
+			self.do_index()
+		return self.expand(myURI)
+
+
+	def add_prefix(self, prefix, namespace):
+		""" Adds prefix to @context and index. """
+		self.context[prefix] = namespace
+		self.do_index()
+
+
+	def do_index(self):
+		"""
+		Rebuilds namespace -> prefix index from @context. Where several
+		prefixes share a namespace, the first one in @context wins. Memoized
+		results are dropped, as a new prefix can change them.
+		"""
+		self.namespaces = {}
+		for (prefix, namespace) in self.context.items():
+			if not namespace in self.namespaces:
+				self.namespaces[namespace] = prefix
+
+		self.context_size = len(self.context)
+		self.compact.cache_clear()
+		self.expand.cache_clear()
+
+
+	def do_compact(self, myURI):
+		"""
+		Looks up substitution prefix of given URI, e.g.
+
+			URI: http://purl.obolibrary.org/obo/GENEPIO_0001234
+			@context item: "GENEPIO": "http://purl.obolibrary.org/obo/GENEPIO_",
+
+		returns GENEPIO:0001234
+
+		Returned ids are interned, as the same ones recur throughout struct.
+		"""
+		if myURI[0:4] == 'http':
+
+			if '_' in myURI:
+				(path, fragment) = myURI.rsplit('_',1)
+				separator = '_'
+
+			elif '#' in myURI: # Need '#' test first!    path#fragment
+				(path, fragment) = myURI.rsplit('#',1)
+				separator = '#'
+
+			else:
+				(path, fragment) = myURI.rsplit('/',1)
+				separator = '/'
+
+			full_path = path + separator
+
+			prefix = self.namespaces.get(full_path)
+			if prefix is not None:
+				return sys.intern(prefix + ":" + fragment)
+
+			# At this point path not recognized in @context lookup
+			# table, so add it to @context
+			prefix = path.rsplit('/',1)[1]
+
+			# At least 2 characters in @context prefix required to avoid
+			# exception to rule below where a version date exists in file.
+			# No namespace begins with number
+			# and following is a URI but not an ontology term reference.
+			#	<owl:versionIRI rdf:resource="http://purl.obolibrary.org/obo/obi/2018-05-23/obi.owl"/>
+
+			if prefix[0:2].isalpha():
+				self.add_prefix(prefix, full_path)
+				return sys.intern(prefix + ":" + fragment)
+
+		return myURI 		# Returns untouched string
+
+
+	def do_expand(self, myURI):
+		# If a URI has a recognized prefix, create full version
+		if ':' in myURI:
+			(prefix, myid) = myURI.rsplit(':',1)
+
+			if prefix in self.context:
+				return self.context[prefix] + myid
+			else:
+				print ('ERROR in get_expanded_id(): No @context prefix for: ', myURI, ">" + prefix + "<")
+
+		return myURI
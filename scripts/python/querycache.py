@@ -0,0 +1,175 @@
+#!/usr/bin/python
+#
+
+""" **************************************************************************
+	Persistent cache of converted sparql query result tables.
+
+	OntoHelper.do_query_table() runs a sparql query and converts every
+	cell of its result to a CURIE, plain string or literal dictionary.
+	QueryCache keeps each converted table on disk, keyed by:
+
+		the query's text and its initBindings,
+		a fingerprint of the ontology files the graph was loaded from
+			(path, modification time and size of each; see
+			OntoHelper.get_sources_fingerprint()),
+		@context as it was when the query ran, since CURIEs depend on it.
+
+	so a later run over unchanged files, e.g. with other output options or
+	fixed specification building code, reads its tables instead of querying
+	the graph. Prefixes that converting a table added to @context are kept
+	with it and added again when it is read back.
+
+	import python.querycache as qc
+
+	cache = qc.QueryCache('~/.cache/geem/queries')
+	key = cache.get_key(fingerprint, query_text, bindings, context)
+	cached = cache.get(key)		# (table, prefixes) or None
+	cache.add(key, table, prefixes)
+
+	Tables are pickled in a columnar form: a list of column names and a
+	tuple of values per row. The cache folder has a size cap; least
+	recently used tables are evicted once it is exceeded, by an index that
+	forked query workers update under a lock; see cacheindex.py. Bump CACHE_VERSION
+	if do_query_table()'s conversion of values changes.
+
+	Blank nodes in tables keep the labels they had in the run that cached
+	them, which are arbitrary and only agree with other tables from that
+	run. So a table holding blank nodes is only read back if other such
+	tables this run has used come from the same run as well.
+"""
+
+import os
+import json
+import uuid
+import pickle
+import hashlib
+import rdflib
+
+from . import cacheindex
+
+DEFAULT_CACHE_FOLDER = os.path.join(os.path.expanduser('~'), '.cache', 'geem', 'queries')
+
+# 512 Mb
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+
+
+def encode_table(table):
+	""" Returns (columns, rows) of a list of row dictionaries. """
+	columns = []
+	for row in table:
+		for column in row:
+			if not column in columns:
+				columns.append(column)
+	rows = [tuple(row.get(column) for column in columns) for row in table]
+	return (columns, rows)
+
+
+def decode_table(columns, rows):
+	""" Returns list of row dictionaries; unbound (None) cells are left out. """
+	return [dict((column, value) for (column, value) in zip(columns, row) if value is not None)
+		for row in rows]
+
+
+def has_blank_nodes(table):
+	return any(isinstance(value, rdflib.term.BNode) for row in table for value in row.values())
+
+
+class QueryCache(object):
+
+	# Bump this if the cached table format or value conversion changes.
+	CACHE_VERSION = '1'
+
+	def __init__(self, cache_folder = None, max_size = DEFAULT_MAX_SIZE):
+
+		self.cache_folder = os.path.expanduser(cache_folder or DEFAULT_CACHE_FOLDER)
+		# Index of cached tables, shared with other processes; see cacheindex.py
+		self.index = cacheindex.CacheIndex(self.cache_folder, max_size)
+
+		# Tables this run adds are marked with this id
+		self.run = uuid.uuid4().hex
+		# Run whose blank node labels tables used so far have, if any.
+		self.blank_node_run = None
+
+
+
+	@property
+	def max_size(self):
+		return self.index.max_size
+
+
+	@max_size.setter
+	def max_size(self, max_size):
+		self.index.max_size = max_size
+
+
+	def get_key(self, fingerprint, query_text, bindings, context):
+		"""
+		Returns cache key of a query's table.
+
+		INPUT
+			fingerprint: fingerprint of graph's source files
+			query_text: sparql text of query
+			bindings: initBindings of query, {name: rdflib term}
+			context: @context before query is run
+		"""
+		sha1 = hashlib.sha1(self.CACHE_VERSION.encode('utf8'))
+		for part in (fingerprint, query_text,
+			json.dumps(sorted((str(name), value.n3()) for (name, value) in bindings.items())),
+			json.dumps(list(context.items()))):
+			sha1.update(part.encode('utf8'))
+			sha1.update(b'\0')
+		return sha1.hexdigest()
+
+
+	def get(self, key):
+		"""
+		Returns (table, @context prefixes its conversion added) of given key,
+		or None if it isn't cached or its blank nodes can't be used.
+		"""
+		cache_file = self.get_cache_file(key)
+		if not os.path.isfile(cache_file):
+			return None
+		try:
+			with open(cache_file, 'rb') as cache_handle:
+				cached = pickle.load(cache_handle)
+		except Exception as e:
+			print ('WARNING: unable to read query cache file %s: %s' % (cache_file, e))
+			return None
+
+		if cached['blank_node_run'] is not None:
+			if not self.blank_node_run in (None, cached['blank_node_run']):
+				return None
+			self.blank_node_run = cached['blank_node_run']
+
+		self.index.touch(key)
+		return (decode_table(cached['columns'], cached['rows']), cached['prefixes'])
+
+
+	def add(self, key, table, prefixes):
+		"""
+		Caches given table under key, with the (prefix, namespace) items
+		converting it added to @context. Table is written to a temporary
+		file first, so a partially written one is never read by another run.
+		"""
+		blank_node_run = None
+		if has_blank_nodes(table):
+			blank_node_run = self.blank_node_run = self.blank_node_run or self.run
+
+		(columns, rows) = encode_table(table)
+		cached = {'columns': columns, 'rows': rows, 'prefixes': list(prefixes),
+			'blank_node_run': blank_node_run}
+		if self.index.write_file(key, cached):
+			self.index.touch(key)
+
+
+	def get_cache_file(self, key):
+		return self.index.get_file(key)
+
+
+	def clear(self):
+		""" Removes all cached tables and the index. """
+		self.index.clear()
+
+
+	def read_index(self):
+		return self.index.read()
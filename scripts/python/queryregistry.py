@@ -0,0 +1,251 @@
+#!/usr/bin/python
+#
+
+""" **************************************************************************
+	Registry of named sparql queries, prepared on first use.
+
+	rdflib's prepareQuery() parses and translates a query into its algebra
+	in pure Python, which costs tens of milliseconds a query, and more
+	under older rdflib. Preparing every query a script knows about when
+	it starts slows down runs that use few of them, or none, as with
+	--version. QueryRegistry keeps each query's text, and prepares it
+	only when it is first looked up:
+
+	import python.queryregistry as qr
+
+	queries = qr.QueryRegistry(namespace)
+	queries.add('tree', "SELECT ?id WHERE {?id rdfs:subClassOf ?parent_id}")
+	graph.query(queries['tree'], initBindings = bindings)
+
+	With a cache folder set, the prepared algebra is also kept on disk,
+	keyed by the query's text, its namespace prefixes and the rdflib and
+	Python versions, so later runs load it instead of parsing the query
+	again. Within a process, a query prepared by one registry is reused by
+	others. Prepared queries carry their text as query.text, which
+	OntoHelper.do_query_table() keys its result cache by.
+"""
+
+import os
+import sys
+import json
+import pickle
+import hashlib
+import tempfile
+import rdflib
+from rdflib.plugins.sparql import prepareQuery
+from rdflib.plugins.sparql.sparql import Query, Prologue
+from rdflib.plugins.sparql.parserutils import CompValue, Expr
+from rdflib.plugins.sparql import operators
+
+try:
+	from collections.abc import Mapping
+except ImportError: # Python 2
+	from collections import Mapping
+
+DEFAULT_CACHE_FOLDER = os.path.join(os.path.expanduser('~'), '.cache', 'geem', 'algebra')
+
+# Queries prepared in this process, by cache key.
+prepared_queries = {}
+
+
+def get_node(node_type, name, values, attributes, evalfn):
+	"""
+	Returns algebra node pickled by reduce_node(). Expression nodes get
+	their evaluation function bound to them again.
+	"""
+	node = node_type(name)
+	node.update(values)
+	node.__dict__.update(attributes)
+	if evalfn is not None:
+		node._evalfn = evalfn.__get__(node)
+	return node
+
+
+def reduce_node(node):
+	"""
+	Pickles algebra node (CompValue or Expr) by its name, values and
+	attributes. Its class is an OrderedDict whose constructor needs a
+	name, and expressions hold a method bound to themselves, neither of
+	which pickle can handle by itself.
+	"""
+	attributes = dict(node.__dict__)
+	del attributes['name']
+	evalfn = attributes.pop('_evalfn', None)
+	return (get_node, (type(node), node.name, list(node.items()), attributes,
+		getattr(evalfn, '__func__', None)))
+
+
+class AlgebraPickler(pickle.Pickler):
+
+	dispatch_table = {CompValue: reduce_node, Expr: reduce_node}
+
+	# Shared expression whose evaluation function is a lambda.
+	def persistent_id(self, obj):
+		if obj is operators.TrueFilter:
+			return 'TrueFilter'
+		return None
+
+
+class AlgebraUnpickler(pickle.Unpickler):
+
+	def persistent_load(self, pid):
+		if pid == 'TrueFilter':
+			return operators.TrueFilter
+		raise pickle.UnpicklingError('unknown persistent id %s' % pid)
+
+
+def dump_query(query, handle):
+	""" Writes prepared query's text, base, prefixes and algebra. """
+	prologue = query.prologue
+	AlgebraPickler(handle, pickle.HIGHEST_PROTOCOL).dump({
+		'text': getattr(query, 'text', None),
+		'base': prologue.base,
+		'namespaces': [(prefix, str(namespace)) for (prefix, namespace)
+			in prologue.namespace_manager.namespaces()],
+		'algebra': query.algebra
+	})
+
+
+def load_query(handle):
+	""" Returns prepared query written by dump_query(). """
+	dumped = AlgebraUnpickler(handle).load()
+	prologue = Prologue()
+	prologue.base = dumped['base']
+	for (prefix, namespace) in dumped['namespaces']:
+		prologue.bind(prefix, rdflib.URIRef(namespace))
+	query = Query(prologue, dumped['algebra'])
+	query.text = dumped['text']
+	return query
+
+
+class QueryRegistry(Mapping):
+	"""
+	Read only mapping of query name to prepared query. Queries are added
+	as text with add() or add_queries().
+	"""
+
+	# Bump this if the dumped form of queries changes.
+	CACHE_VERSION = '1'
+
+	def __init__(self, namespace, texts = None, cache_folder = None):
+		"""
+		INPUT
+			namespace: {prefix: URI} that queries are prepared with. It
+				may still change before a query is first used.
+			texts: {query name: sparql text}
+			cache_folder: folder of prepared query cache; None for none.
+		"""
+		self.namespace = namespace
+		self.texts = {}
+		self.prepared = {}
+		self.cache_folder = None
+		self.set_cache(cache_folder)
+		self.add_queries(texts or {})
+
+
+	def __getitem__(self, name):
+		if not name in self.prepared:
+			self.prepared[name] = self.prepare(self.texts[name])
+		return self.prepared[name]
+
+
+	def __iter__(self):
+		return iter(self.texts)
+
+
+	def __len__(self):
+		return len(self.texts)
+
+
+	def __contains__(self, name):
+		return name in self.texts
+
+
+	def add(self, name, text):
+		""" Adds or replaces named query; it is prepared on first use. """
+		self.texts[name] = text
+		self.prepared.pop(name, None)
+
+
+	def add_queries(self, texts):
+		for (name, text) in texts.items():
+			self.add(name, text)
+
+
+	def set_cache(self, cache_folder = DEFAULT_CACHE_FOLDER):
+		""" Sets folder prepared queries are kept in; None for none. """
+		self.cache_folder = os.path.expanduser(cache_folder) if cache_folder else None
+		if self.cache_folder and not os.path.isdir(self.cache_folder):
+			os.makedirs(self.cache_folder)
+
+
+	def get_key(self, text):
+		"""
+		Returns cache key of given query text prepared with self.namespace
+		prefixes, by this version of rdflib and Python.
+		"""
+		sha1 = hashlib.sha1(self.CACHE_VERSION.encode('utf8'))
+		for part in (rdflib.__version__, '%s.%s' % sys.version_info[0:2], text,
+			json.dumps(sorted((prefix, str(namespace)) for (prefix, namespace) in self.namespace.items()))):
+			sha1.update(part.encode('utf8'))
+			sha1.update(b'\0')
+		return sha1.hexdigest()
+
+
+	def prepare(self, text):
+		"""
+		Returns given query prepared with self.namespace prefixes: one this
+		process already prepared, else from cache, else parsed and added
+		to cache.
+		"""
+		key = self.get_key(text)
+		query = prepared_queries.get(key)
+		if query is None:
+			query = self.read_cache(key)
+		if query is None:
+			query = prepareQuery(text, initNs = self.namespace)
+			query.text = text
+			self.write_cache(key, query)
+
+		prepared_queries[key] = query
+		return query
+
+
+	def get_cache_file(self, key):
+		return os.path.join(self.cache_folder, key + '.pickle')
+
+
+	def read_cache(self, key):
+		if not self.cache_folder:
+			return None
+
+		cache_file = self.get_cache_file(key)
+		if not os.path.isfile(cache_file):
+			return None
+		try:
+			with open(cache_file, 'rb') as cache_handle:
+				return load_query(cache_handle)
+		except Exception as e:
+			print ('WARNING: unable to read prepared query cache file %s: %s' % (cache_file, e))
+			return None
+
+
+	def write_cache(self, key, query):
+		"""
+		Writes prepared query to cache, through a temporary file so a
+		partially written one is never read by another run. Queries whose
+		algebra can't be pickled are left out.
+		"""
+		if not self.cache_folder:
+			return
+
+		temp_file = None
+		try:
+			(handle, temp_file) = tempfile.mkstemp(dir = self.cache_folder)
+			with os.fdopen(handle, 'wb') as cache_handle:
+				dump_query(query, cache_handle)
+			os.replace(temp_file, self.get_cache_file(key))
+		except (IOError, OSError, pickle.PicklingError, AttributeError, TypeError) as e:
+			print ('WARNING: unable to write prepared query cache file: %s' % e)
+			if temp_file and os.path.isfile(temp_file):
+				os.remove(temp_file)
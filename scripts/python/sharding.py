@@ -0,0 +1,133 @@
+#!/usr/bin/python
+#
+
+""" **************************************************************************
+	Sharded specification output, for loading only part of an ontology.
+
+	Instead of one [ontology].json file, OntoHelper.do_output_shards()
+	writes a folder [ontology].shards/ holding:
+
+		manifest.json	{"@context": ..., "metadata": ...,
+						 "sharding": {"by": "subtree", "shard_size": 2000},
+						 "shards": [{"file": "0000.json", "entities": 1874}, ...],
+						 "index": {entity id: shard number, ...}}
+		0000.json ...	{"specifications": {entity id: entity, ...}}
+
+	Entities are split into shards one of two ways:
+
+		subtree: each entity goes with the topmost ancestor reached by its
+			parent_id chain, so a model's components and a picklist's
+			choices mostly land in the same shard. Subtrees are packed
+			into shards of up to shard_size entities, in specification
+			order; bigger ones are split.
+		hash: by a hash of entity id, into as many shards as it takes to
+			average shard_size entities. An entity's shard then doesn't
+			depend on the rest of the ontology.
+
+	A consumer reads the manifest, then only the shards holding the ids it
+	needs:
+
+	import python.sharding as sh
+
+	specifications = sh.load_specifications('genepio.shards/manifest.json',
+		['GENEPIO:0001000', 'GENEPIO:0001001'])
+"""
+
+import os
+import json
+import gzip
+import hashlib
+from collections import OrderedDict
+
+MANIFEST_FILE = 'manifest.json'
+
+SHARD_METHODS = ['subtree', 'hash']
+
+
+def get_shards(specifications, by = 'subtree', shard_size = 2000):
+	"""
+	Returns list of shards, each a list of ids of given specifications,
+	in specification order.
+	"""
+	if by == 'hash':
+		count = max(1, -(-len(specifications) // shard_size))
+		shards = [[] for _ in range(count)]
+		for id in specifications:
+			shards[get_hash_shard(id, count)].append(id)
+		return shards
+
+	if by != 'subtree':
+		raise ValueError('Unknown sharding method: %s' % by)
+
+	subtrees = OrderedDict()
+	for id in specifications:
+		subtrees.setdefault(get_root_id(specifications, id), []).append(id)
+
+	shards = [[]]
+	for ids in subtrees.values():
+		if shards[-1] and len(shards[-1]) + len(ids) > shard_size:
+			shards.append([])
+		for id in ids:
+			if len(shards[-1]) >= shard_size:
+				shards.append([])
+			shards[-1].append(id)
+
+	return shards if shards[0] else []
+
+
+def get_hash_shard(id, count):
+	""" Returns shard number of given id among count shards. """
+	return int(hashlib.sha1(id.encode('utf8')).hexdigest()[0:8], 16) % count
+
+
+def get_root_id(specifications, id):
+	"""
+	Returns topmost ancestor of given entity found by following parent_id
+	through specifications, or the entity itself if it has no parent there.
+	"""
+	seen = set()
+	while not id in seen:
+		seen.add(id)
+		parent_id = specifications[id].get('parent_id')
+		if not parent_id in specifications:
+			break
+		id = parent_id
+	return id
+
+
+def get_manifest_folder(output_file_basename):
+	return output_file_basename + '.shards'
+
+
+def open_input(file_path):
+	if file_path.endswith('.gz'):
+		return gzip.open(file_path, 'rt', encoding = 'utf-8')
+	return open(file_path, 'r')
+
+
+def load_manifest(manifest_file):
+	with open_input(manifest_file) as input_handle:
+		return json.load(input_handle, object_pairs_hook = OrderedDict)
+
+
+def load_specifications(manifest_file, ids, manifest = None):
+	"""
+	Returns OrderedDict of specifications of given ids, reading only the
+	shards that hold them. Ids not in the manifest's index are skipped.
+	An already loaded manifest may be given.
+	"""
+	if manifest is None:
+		manifest = load_manifest(manifest_file)
+
+	folder = os.path.dirname(manifest_file)
+	index = manifest['index']
+	wanted = set(id for id in ids if id in index)
+
+	found = {}
+	for shard in sorted(set(index[id] for id in wanted)):
+		with open_input(os.path.join(folder, manifest['shards'][shard]['file'])) as input_handle:
+			specifications = json.load(input_handle, object_pairs_hook = OrderedDict)['specifications']
+		for id in wanted & set(specifications):
+			found[id] = specifications[id]
+
+	return OrderedDict((id, found[id]) for id in ids if id in found)
@@ -0,0 +1,433 @@
+#!/usr/bin/python
+#
+
+""" **************************************************************************
+	SQLite backed rdflib triple store, for ontologies larger than memory.
+
+	An rdflib.Graph() normally holds every triple of an ontology and its
+	imports in memory. SQLiteStore keeps them in an indexed SQLite file
+	instead, so only query results and a bounded cache of terms are held in
+	memory. Any rdflib graph operation or sparql query works on it.
+
+	import python.sqlitestore as ss
+
+	graph = rdflib.Graph(store = ss.SQLiteStore('~/.cache/geem/stores/genepio.sqlite'))
+
+	Tables:
+		terms: id, key - each distinct URI, blank node or literal once
+		triples: s, p, o, source - term ids, indexed SPO, POS and OSP
+		sources: id, location, signature - ontology files loaded so far
+		namespaces: prefix, uri
+
+	Triples are recorded against the source file they were loaded from
+	(see begin_source()), so that a store can be reused by later runs: a
+	file whose signature hasn't changed needn't be loaded again, and a
+	changed one can be replaced without rebuilding the rest. Terms no
+	triple uses any more are removed along with dropped sources.
+
+	Triples added one at a time, as rdflib's parsers do, are inserted in
+	batches of BATCH_SIZE, so a file streams into the store without its
+	triples ever being held in memory together.
+
+	Recursive subclass walks are answered by recursive common table
+	expressions; SQLiteSubclassIndex offers them with the interface of
+	hierarchy.SubclassIndex.
+"""
+
+import os
+import sqlite3
+import functools
+import rdflib
+from rdflib.store import Store
+
+DEFAULT_STORE_FOLDER = os.path.join(os.path.expanduser('~'), '.cache', 'geem', 'stores')
+
+# Number of decoded terms, and of term ids being looked up, kept in memory.
+TERM_CACHE_SIZE = 200000
+
+# Number of triples add() buffers before inserting them.
+BATCH_SIZE = 10000
+
+SUBCLASS_OF = str(rdflib.RDFS.subClassOf)
+
+SCHEMA = """
+	CREATE TABLE IF NOT EXISTS terms (id INTEGER PRIMARY KEY, key TEXT NOT NULL UNIQUE);
+	CREATE TABLE IF NOT EXISTS triples (s INTEGER NOT NULL, p INTEGER NOT NULL, o INTEGER NOT NULL,
+		source INTEGER NOT NULL, PRIMARY KEY (s, p, o, source)) WITHOUT ROWID;
+	CREATE INDEX IF NOT EXISTS triples_pos ON triples (p, o, s);
+	CREATE INDEX IF NOT EXISTS triples_osp ON triples (o, s, p);
+	CREATE INDEX IF NOT EXISTS triples_source ON triples (source);
+	CREATE TABLE IF NOT EXISTS sources (id INTEGER PRIMARY KEY, location TEXT NOT NULL UNIQUE, signature TEXT);
+	CREATE TABLE IF NOT EXISTS namespaces (prefix TEXT PRIMARY KEY, uri TEXT NOT NULL UNIQUE);
+"""
+
+
+def get_term_key(term):
+	"""
+	Returns text key of an rdflib term, as kept in terms table:
+	"U" + URI, "B" + blank node id, or "L" + language, datatype and lexical
+	form separated by NUL characters.
+	"""
+	if isinstance(term, rdflib.URIRef):
+		return 'U' + term
+	if isinstance(term, rdflib.BNode):
+		return 'B' + term
+	return 'L' + (term.language or '') + '\x00' + (term.datatype or '') + '\x00' + term
+
+
+def get_key_term(key):
+	""" Returns rdflib term for given get_term_key() key. """
+	if key[0] == 'U':
+		return rdflib.URIRef(key[1:])
+	if key[0] == 'B':
+		return rdflib.BNode(key[1:])
+	(language, datatype, value) = key[1:].split('\x00', 2)
+	return rdflib.Literal(value, lang = language or None, datatype = datatype or None)
+
+
+class SQLiteStore(Store):
+
+	context_aware = False
+	formula_aware = False
+	transaction_aware = False
+	graph_aware = False
+
+	def __init__(self, configuration = None, identifier = None):
+		"""
+		INPUT
+			configuration: path of SQLite file, created if it doesn't exist
+		"""
+		self.connection = None
+		self.file_path = None
+		self.source = 0
+		# Triples add()ed but not yet inserted; see flush()
+		self.pending = []
+		# Set once triples are deleted, so remove_sources() looks for unused terms
+		self.removed = False
+		self.term_ids = {}
+		self.get_term = functools.lru_cache(maxsize = TERM_CACHE_SIZE)(self.do_get_term)
+		super(SQLiteStore, self).__init__(configuration, identifier)
+
+
+	def open(self, configuration, create = True):
+		file_path = os.path.expanduser(configuration)
+		folder = os.path.dirname(os.path.abspath(file_path))
+		if create and not os.path.isdir(folder):
+			os.makedirs(folder)
+
+		self.file_path = file_path
+		self.connect()
+		self.connection.executescript(SCHEMA)
+		self.connection.commit()
+
+
+	def connect(self):
+		"""
+		Opens a new connection to store file. A forked process must call
+		this before using the store, as an SQLite connection can't be
+		shared across fork(); the parent's connection is left untouched.
+		"""
+		self.connection = sqlite3.connect(self.file_path)
+		# A store is a rebuildable cache, so durability is traded for speed.
+		self.connection.execute('PRAGMA synchronous = OFF')
+		self.connection.execute('PRAGMA journal_mode = WAL')
+		self.connection.execute('PRAGMA cache_size = -262144') # 256 Mb
+
+
+	def close(self, commit_pending_transaction = False):
+		if self.connection:
+			self.flush()
+			self.connection.commit()
+			self.connection.close()
+			self.connection = None
+
+
+	def commit(self):
+		self.flush()
+		self.connection.commit()
+
+
+	def rollback(self):
+		"""
+		Discards triples and terms added since last commit. Term ids looked
+		up meanwhile may be of rolled back terms, so are forgotten.
+		"""
+		self.pending = []
+		self.connection.rollback()
+		self.clear_term_cache()
+
+
+	############################## SOURCES ##############################
+
+	def begin_source(self, location, signature):
+		"""
+		Records that triples added from now on come from given file or URL,
+		first removing any triples loaded from it before.
+		"""
+		self.flush()
+		row = self.connection.execute('SELECT id FROM sources WHERE location = ?', (location,)).fetchone()
+		if row:
+			self.source = row[0]
+			self.connection.execute('DELETE FROM triples WHERE source = ?', (self.source,))
+			self.removed = True
+			self.connection.execute('UPDATE sources SET signature = ? WHERE id = ?', (signature, self.source))
+		else:
+			self.source = self.connection.execute(
+				'INSERT INTO sources (location, signature) VALUES (?, ?)', (location, signature)).lastrowid
+
+
+	def end_source(self):
+		""" Commits triples of current source. """
+		self.flush()
+		self.source = 0
+		self.connection.commit()
+
+
+	def get_source_signature(self, location):
+		""" Returns signature recorded when given source was loaded, or None. """
+		row = self.connection.execute('SELECT signature FROM sources WHERE location = ?', (location,)).fetchone()
+		return row[0] if row else None
+
+
+	def get_source_objects(self, location, predicate):
+		""" Returns objects of given predicate in triples loaded from given source. """
+		self.flush()
+		predicate_id = self.get_term_id(predicate, False)
+		if predicate_id is None:
+			return []
+		rows = self.connection.execute("""
+			SELECT DISTINCT o FROM triples JOIN sources ON triples.source = sources.id
+			WHERE sources.location = ? AND p = ?""", (location, predicate_id))
+		return [self.get_term(row[0]) for row in rows]
+
+
+	def remove_sources(self, keep):
+		"""
+		Removes triples of all sources but those given, by location. Then,
+		if any triples have been removed - here, or by loading a changed
+		source again - terms no triple uses any more are removed too, else
+		those of e.g. blank nodes would pile up with every reload.
+		"""
+		self.flush()
+		for (source, location) in self.connection.execute('SELECT id, location FROM sources').fetchall():
+			if not location in keep:
+				self.connection.execute('DELETE FROM triples WHERE source = ?', (source,))
+				self.connection.execute('DELETE FROM sources WHERE id = ?', (source,))
+				self.removed = True
+
+		if self.removed:
+			self.remove_unused_terms()
+		self.connection.commit()
+
+
+	def remove_unused_terms(self):
+		""" Removes terms that are no triple's subject, predicate or object. """
+		self.connection.execute("""
+			DELETE FROM terms WHERE NOT EXISTS (SELECT 1 FROM triples WHERE s = terms.id)
+				AND NOT EXISTS (SELECT 1 FROM triples WHERE o = terms.id)
+				AND NOT EXISTS (SELECT 1 FROM triples WHERE p = terms.id)""")
+		self.removed = False
+		self.clear_term_cache()
+
+
+	############################## TERMS ##############################
+
+	def get_term_id(self, term, create = True):
+		"""
+		Returns id of given term in terms table, adding it if create is set;
+		otherwise None if it isn't there.
+		"""
+		key = get_term_key(term)
+		term_id = self.term_ids.get(key)
+		if term_id is not None:
+			return term_id
+
+		row = self.connection.execute('SELECT id FROM terms WHERE key = ?', (key,)).fetchone()
+		if row:
+			term_id = row[0]
+		elif create:
+			term_id = self.connection.execute('INSERT INTO terms (key) VALUES (?)', (key,)).lastrowid
+		else:
+			return None
+
+		if len(self.term_ids) >= TERM_CACHE_SIZE:
+			self.term_ids.clear()
+		self.term_ids[key] = term_id
+		return term_id
+
+
+	def clear_term_cache(self):
+		self.term_ids.clear()
+		self.get_term.cache_clear()
+
+
+	def do_get_term(self, term_id):
+		return get_key_term(self.connection.execute('SELECT key FROM terms WHERE id = ?', (term_id,)).fetchone()[0])
+
+
+	############################## TRIPLES ##############################
+
+	def add(self, triple, context, quoted = False):
+		""" Buffers triple, to be inserted with others; see flush(). """
+		self.pending.append(triple)
+		if len(self.pending) >= BATCH_SIZE:
+			self.flush()
+
+
+	def flush(self):
+		""" Inserts triples buffered by add(). Done before store is read. """
+		if self.pending:
+			(pending, self.pending) = (self.pending, [])
+			self.addN((s, p, o, None) for (s, p, o) in pending)
+
+
+	def addN(self, quads):
+		self.connection.executemany('INSERT OR IGNORE INTO triples (s, p, o, source) VALUES (?, ?, ?, ?)',
+			((self.get_term_id(s), self.get_term_id(p), self.get_term_id(o), self.source)
+				for (s, p, o, c) in quads))
+
+
+	def remove(self, triple_pattern, context = None):
+		self.flush()
+		(where, parameters) = self.get_pattern_clause(triple_pattern)
+		if where is not None:
+			self.connection.execute('DELETE FROM triples' + where, parameters)
+
+
+	def triples(self, triple_pattern, context = None):
+		"""
+		Yields ((s, p, o), contexts) for each distinct stored triple
+		matching given pattern, in which None matches anything.
+		"""
+		self.flush()
+		(where, parameters) = self.get_pattern_clause(triple_pattern)
+		if where is None:
+			return
+
+		for (s, p, o) in self.connection.execute('SELECT DISTINCT s, p, o FROM triples' + where, parameters):
+			yield ((self.get_term(s), self.get_term(p), self.get_term(o)), iter(()))
+
+
+	def get_pattern_clause(self, triple_pattern):
+		"""
+		Returns (WHERE clause, parameters) selecting triples that match
+		given pattern. Clause is None if a term of pattern isn't in store,
+		so nothing can match.
+		"""
+		conditions = []
+		parameters = []
+		for (column, term) in zip(('s', 'p', 'o'), triple_pattern):
+			if term is not None:
+				term_id = self.get_term_id(term, False)
+				if term_id is None:
+					return (None, None)
+				conditions.append(column + ' = ?')
+				parameters.append(term_id)
+
+		where = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+		return (where, parameters)
+
+
+	def __len__(self, context = None):
+		self.flush()
+		return self.connection.execute(
+			'SELECT COUNT(*) FROM (SELECT DISTINCT s, p, o FROM triples)').fetchone()[0]
+
+
+	def contexts(self, triple = None):
+		return iter(())
+
+
+	############################## NAMESPACES ##############################
+
+	def bind(self, prefix, namespace, override = True):
+		bound = self.connection.execute('SELECT 1 FROM namespaces WHERE prefix = ? OR uri = ?',
+			(prefix, str(namespace))).fetchone()
+		if bound and not override:
+			return
+		self.connection.execute('DELETE FROM namespaces WHERE prefix = ? OR uri = ?', (prefix, str(namespace)))
+		self.connection.execute('INSERT INTO namespaces (prefix, uri) VALUES (?, ?)', (prefix, str(namespace)))
+
+
+	def namespace(self, prefix):
+		row = self.connection.execute('SELECT uri FROM namespaces WHERE prefix = ?', (prefix,)).fetchone()
+		return rdflib.URIRef(row[0]) if row else None
+
+
+	def prefix(self, namespace):
+		row = self.connection.execute('SELECT prefix FROM namespaces WHERE uri = ?', (str(namespace),)).fetchone()
+		return row[0] if row else None
+
+
+	def namespaces(self):
+		for (prefix, uri) in self.connection.execute('SELECT prefix, uri FROM namespaces').fetchall():
+			yield (prefix, rdflib.URIRef(uri))
+
+
+	############################## HIERARCHY ##############################
+
+	def get_subclass_links(self, node, parents = False):
+		""" Returns direct rdfs:subClassOf children (or parents) of node. """
+		self.flush()
+		node_id = self.get_term_id(node, False)
+		predicate_id = self.get_term_id(rdflib.RDFS.subClassOf, False)
+		if node_id is None or predicate_id is None:
+			return []
+
+		query = 'SELECT DISTINCT o FROM triples WHERE s = ? AND p = ?' if parents \
+			else 'SELECT DISTINCT s FROM triples WHERE p = ? AND o = ?'
+		arguments = (node_id, predicate_id) if parents else (predicate_id, node_id)
+		return [term for term in (self.get_term(row[0]) for row in self.connection.execute(query, arguments))
+			if isinstance(term, rdflib.URIRef)]
+
+
+	def get_subclass_closure(self, node, ancestors = False):
+		"""
+		Returns all classes under (or above) given one, using a recursive
+		common table expression. UNION rather than UNION ALL stops the walk
+		at classes already met, so cycles end.
+		"""
+		self.flush()
+		node_id = self.get_term_id(node, False)
+		predicate_id = self.get_term_id(rdflib.RDFS.subClassOf, False)
+		if node_id is None or predicate_id is None:
+			return []
+
+		step = 'SELECT t.o FROM triples t JOIN closure c ON t.s = c.id WHERE t.p = ?' if ancestors \
+			else 'SELECT t.s FROM triples t JOIN closure c ON t.o = c.id WHERE t.p = ?'
+		rows = self.connection.execute("""
+			WITH RECURSIVE closure(id) AS (SELECT ? UNION """ + step + """)
+			SELECT id FROM closure WHERE id != ?""", (node_id, predicate_id, node_id))
+		return [term for term in (self.get_term(row[0]) for row in rows)
+			if isinstance(term, rdflib.URIRef)]
+
+
+class SQLiteSubclassIndex(object):
+	"""
+	hierarchy.SubclassIndex interface over an SQLiteStore, so no part of
+	the hierarchy need be held in memory.
+	"""
+
+	def __init__(self, store):
+		self.store = store
+
+
+	def get_children(self, node):
+		return self.store.get_subclass_links(node)
+
+
+	def get_parents(self, node):
+		return self.store.get_subclass_links(node, True)
+
+
+	def get_descendants(self, root, include_root = False):
+		descendants = self.store.get_subclass_closure(rdflib.URIRef(root))
+		return [rdflib.URIRef(root)] + descendants if include_root else descendants
+
+
+	def get_ancestors(self, node):
+		return set(self.store.get_subclass_closure(rdflib.URIRef(node), True))
+
+
+	def is_a(self, node, ancestor):
+		return node == ancestor or ancestor in self.get_ancestors(node)
@@ -0,0 +1,176 @@
+#!/usr/bin/python
+#
+
+""" **************************************************************************
+	Per-stage resource report of a script run.
+
+	Each named stage of a run is timed, and the queries run in it counted,
+	so that a stage which has slowed down between two ontology releases
+	stands out when their reports are compared.
+
+	import python.stageprofiler as sp
+
+	profiler = sp.StageProfiler()
+	with profiler.stage('units'):
+		started = profiler.get_time()
+		table = ...
+		profiler.add_query('units', table, started, ['unit', 'datum'])
+	profiler.write_report('genepio.profile.json')
+
+	For each stage the report gives:
+		wall_time, cpu_time: seconds
+		peak_rss_mb: peak resident memory of process by end of stage, in Mb
+		rss_growth_mb: how much stage raised that peak
+		queries, rows: number of sparql queries run - sub-queries included,
+			cached tables not - and rows of the tables they gave
+		entities: number of distinct entities named in those rows, or
+			otherwise given to add_entities()
+		query_stats: count (of tables), queries, rows and seconds for each
+			query name
+"""
+
+import time
+import json
+import sys
+import datetime
+from collections import OrderedDict
+
+try:
+	import resource # Unix only; no memory figures without it.
+except ImportError:
+	resource = None
+
+
+def get_peak_rss():
+	""" Returns peak resident memory of this process in Mb, or None. """
+	if resource is None:
+		return None
+
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# Linux reports kilobytes, macOS bytes.
+	return round(peak / (1024.0 * 1024 if sys.platform == 'darwin' else 1024.0), 1)
+
+
+class StageProfiler(object):
+
+	def __init__(self):
+		self.stages = []
+		self.current = None
+		self.started = None
+
+
+	def get_time(self):
+		return time.perf_counter()
+
+
+	def stage(self, name):
+		"""
+		Returns context manager which records given stage from entry to
+		exit. Stages don't nest: starting one ends any stage still open.
+		"""
+		return Stage(self, name)
+
+
+	def start(self, name):
+		if self.current is not None:
+			self.stop()
+		if self.started is None:
+			self.started = datetime.datetime.now()
+
+		self.current = OrderedDict([
+			('stage', name),
+			('wall_time', time.perf_counter()),
+			('cpu_time', time.process_time()),
+			('peak_rss_mb', get_peak_rss()),
+			('rss_growth_mb', None),
+			('queries', 0),
+			('rows', 0),
+			('entities', set()),
+			('query_stats', OrderedDict())
+		])
+		self.stages.append(self.current)
+
+
+	def stop(self):
+		stage = self.current
+		if stage is None:
+			return
+		stage['wall_time'] = round(time.perf_counter() - stage['wall_time'], 4)
+		stage['cpu_time'] = round(time.process_time() - stage['cpu_time'], 4)
+		peak_rss = get_peak_rss()
+		if peak_rss is not None:
+			stage['rss_growth_mb'] = round(peak_rss - stage['peak_rss_mb'], 1)
+			stage['peak_rss_mb'] = peak_rss
+		stage['entities'] = len(stage['entities'])
+		self.current = None
+
+
+	def add_query(self, name, table, started, entity_variables = [], queries = 1):
+		"""
+		Counts a query table got in current stage, given its name, the
+		table, get_time() when it started, the columns of its rows that
+		name entities, and the number of sparql queries run to get it:
+		none if it was cached, more if sub-queries were run.
+		"""
+		if self.current is None:
+			return
+
+		seconds = time.perf_counter() - started
+		self.current['queries'] += queries
+		self.current['rows'] += len(table)
+		stats = self.current['query_stats'].setdefault(name,
+			OrderedDict([('count', 0), ('queries', 0), ('rows', 0), ('seconds', 0)]))
+		stats['count'] += 1
+		stats['queries'] += queries
+		stats['rows'] += len(table)
+		stats['seconds'] = round(stats['seconds'] + seconds, 4)
+
+		self.add_entities(row[variable] for row in table for variable in entity_variables if variable in row)
+
+
+	def add_entities(self, ids):
+		""" Adds given entity ids to those touched by current stage. """
+		if self.current is not None:
+			self.current['entities'].update(ids)
+
+
+	def get_report(self, **metadata):
+		"""
+		Returns report of stages recorded so far, with any given metadata
+		(ontology file etc.) and totals.
+		"""
+		stages = [stage for stage in self.stages if stage is not self.current]
+		report = OrderedDict()
+		report['created'] = self.started.isoformat() if self.started else None
+		report.update(metadata)
+		report['total'] = OrderedDict([
+			('wall_time', round(sum(stage['wall_time'] for stage in stages), 4)),
+			('cpu_time', round(sum(stage['cpu_time'] for stage in stages), 4)),
+			('peak_rss_mb', get_peak_rss()),
+			('queries', sum(stage['queries'] for stage in stages)),
+			('rows', sum(stage['rows'] for stage in stages))
+		])
+		report['stages'] = stages
+		return report
+
+
+	def write_report(self, file_path, **metadata):
+		with open(file_path, 'w') as output_handle:
+			json.dump(self.get_report(**metadata), output_handle, indent = 4, separators = (',', ': '))
+
+
+class Stage(object):
+
+	def __init__(self, profiler, name):
+		self.profiler = profiler
+		self.name = name
+
+
+	def __enter__(self):
+		self.profiler.start(self.name)
+		return self
+
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.profiler.stop()
+		return False
@@ -0,0 +1,101 @@
+#!/usr/bin/python
+
+"""Tests scripts/python/arraystore and OntoHelper's numpy engine."""
+
+import os
+import unittest
+
+import rdflib
+from rdflib.compare import isomorphic
+
+import scripts.python.arraystore as ars
+import scripts.python.hierarchy as hi
+import scripts.python.ontohelper as oh
+
+
+TEST_ONTOLOGIES = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "../test_ontologies")
+TEST_ONTOLOGY = os.path.join(TEST_ONTOLOGIES, "test_ontology.owl")
+
+OBO = "http://purl.obolibrary.org/obo/"
+
+EX = rdflib.Namespace("http://example.org/")
+
+
+def get_named(triples):
+    return set(triple for triple in triples if not isinstance(triple[0], rdflib.BNode))
+
+
+def load(onto_helper, ontology_file):
+    onto_helper.parse_ontology(ontology_file)
+    onto_helper.do_ontology_includes(ontology_file, processes=1)
+    onto_helper.do_annotation_tables()
+
+
+@unittest.skipIf(ars.numpy is None, "NumPy is not installed")
+class TestArrayStore(unittest.TestCase):
+    """Test the NumPy array store answers as rdflib's memory store does."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.memory = oh.OntoHelper()
+        load(cls.memory, TEST_ONTOLOGY)
+        cls.arrays = oh.OntoHelper()
+        cls.arrays.set_engine("numpy")
+        load(cls.arrays, TEST_ONTOLOGY)
+
+    def test_triples(self):
+        self.assertEqual(len(self.arrays.graph), len(self.memory.graph))
+        self.assertTrue(isomorphic(self.arrays.graph, self.memory.graph))
+        brazil = rdflib.URIRef(OBO + "GENEPIO_0001004")
+        for pattern in [(brazil, None, None), (brazil, rdflib.RDFS.subClassOf, None),
+                        (None, rdflib.RDFS.subClassOf, rdflib.URIRef(OBO + "GENEPIO_0001002")),
+                        (None, None, rdflib.URIRef(OBO + "GENEPIO_0001002")),
+                        (None, rdflib.RDFS.label, None)]:
+            # Separate parses name blank nodes differently.
+            self.assertEqual(get_named(self.arrays.graph.triples(pattern)),
+                             get_named(self.memory.graph.triples(pattern)))
+        self.assertEqual(list(self.arrays.graph.triples((rdflib.URIRef(OBO + "X"), None, None))), [])
+
+    def test_tables(self):
+        root = OBO + "OBI_0000658"
+        self.assertEqual(self.arrays.do_tree_table(root, label=True),
+                         self.memory.do_tree_table(root, label=True))
+        self.assertEqual(self.arrays.annotations, self.memory.annotations)
+
+    def test_subclass_walks(self):
+        index = self.arrays.get_subclass_index()
+        self.assertIsInstance(index, ars.ArraySubclassIndex)
+        memory_index = self.memory.get_subclass_index()
+        for root in (OBO + "OBI_0000658", OBO + "GENEPIO_0001002"):
+            self.assertEqual(set(index.get_descendants(root)),
+                             set(memory_index.get_descendants(rdflib.URIRef(root))))
+        brazil = rdflib.URIRef(OBO + "GENEPIO_0001004")
+        self.assertEqual(index.get_ancestors(brazil), memory_index.get_ancestors(brazil))
+        self.assertEqual(index.get_parents(brazil), memory_index.get_parents(brazil))
+
+    def test_add_and_remove(self):
+        store = ars.ArrayStore()
+        graph = rdflib.Graph(store=store)
+        # d under b and c, e under d; e -> a closes a cycle
+        for (child, parent) in [("b", "a"), ("c", "a"), ("d", "b"), ("d", "c"), ("e", "d"), ("a", "e")]:
+            graph.add((EX[child], rdflib.RDFS.subClassOf, EX[parent]))
+        graph.add((EX["b"], rdflib.RDFS.subClassOf, EX["a"]))
+        graph.add((EX["f"], rdflib.RDFS.subClassOf, rdflib.BNode()))
+        self.assertEqual(len(graph), 7)
+
+        self.assertEqual(store.get_subclass_closure(EX["b"]), [EX["d"], EX["e"], EX["a"], EX["c"]])
+        self.assertEqual(set(store.get_subclass_closure(EX["d"], True)),
+                         {EX["a"], EX["b"], EX["c"], EX["e"]})
+        self.assertEqual(store.get_subclass_links(EX["f"], True), [])
+        self.assertEqual(store.get_subjects(rdflib.RDFS.subClassOf, EX["a"]), [EX["b"], EX["c"]])
+
+        graph.remove((EX["a"], None, None))
+        self.assertEqual(store.get_objects(EX["a"], rdflib.RDFS.subClassOf), [])
+        self.assertEqual(store.get_subclass_closure(EX["b"]), [EX["d"], EX["e"]])
+        self.assertEqual(hi.get_topological_order(ars.ArraySubclassIndex(store), [EX["a"]]),
+                         [EX["a"], EX["b"], EX["c"], EX["d"], EX["e"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/python
+
+"""Tests scripts/python/checkpoints."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import scripts.python.checkpoints as cp
+
+
+STAGES = ["tree", "specification_components", "inherited", "primitives"]
+
+
+def get_struct(stage):
+    return {
+        "@context": {"GENEPIO": "http://purl.obolibrary.org/obo/GENEPIO_"},
+        "specifications": {"GENEPIO:0001": {"datatype": "model", "stage": stage}},
+    }
+
+
+class TestCheckpoints(unittest.TestCase):
+    """Test saving, loading and validation of stage checkpoints."""
+
+    def setUp(self):
+        self.folder = os.path.join(tempfile.mkdtemp(), "test.checkpoints")
+        self.checkpoints = cp.Checkpoints(self.folder, "fingerprint")
+
+    def tearDown(self):
+        shutil.rmtree(os.path.dirname(self.folder))
+
+    def test_save_load(self):
+        self.assertTrue(os.path.isdir(self.folder))
+        self.assertIsNone(self.checkpoints.load("tree"))
+        self.checkpoints.save("tree", get_struct("tree"))
+        self.assertEqual(self.checkpoints.load("tree"), get_struct("tree"))
+        self.assertEqual(os.listdir(self.folder), ["tree.pickle"])
+
+    def test_get_latest(self):
+        self.assertEqual(self.checkpoints.get_latest(STAGES), (None, None))
+        for stage in STAGES[0:3]:
+            self.checkpoints.save(stage, get_struct(stage))
+        self.assertEqual(self.checkpoints.get_latest(STAGES),
+                         ("inherited", get_struct("inherited")))
+        self.assertEqual(self.checkpoints.get_latest(STAGES[0:2]),
+                         ("specification_components", get_struct("specification_components")))
+
+        self.checkpoints.clear(STAGES[1:])
+        self.assertEqual(self.checkpoints.get_latest(STAGES), ("tree", get_struct("tree")))
+
+    def test_changed_ontology(self):
+        self.checkpoints.save("tree", get_struct("tree"))
+        self.checkpoints.save("inherited", get_struct("inherited"))
+        changed = cp.Checkpoints(self.folder, "other fingerprint")
+        with patch("builtins.print"):
+            self.assertIsNone(changed.load("tree"))
+            self.assertEqual(changed.get_latest(STAGES), (None, None))
+
+    def test_unreadable_checkpoint(self):
+        self.checkpoints.save("tree", get_struct("tree"))
+        with open(self.checkpoints.get_file("inherited"), "wb") as handle:
+            handle.write(b"not a pickle")
+        with patch("builtins.print") as printed:
+            self.assertEqual(self.checkpoints.get_latest(STAGES), ("tree", get_struct("tree")))
+        self.assertTrue(printed.called)
+
+        # A checkpoint of one stage isn't taken for another's.
+        shutil.copy(self.checkpoints.get_file("tree"), self.checkpoints.get_file("primitives"))
+        self.assertIsNone(self.checkpoints.load("primitives"))
+
+
+if __name__ == "__main__":
+    unittest.main()
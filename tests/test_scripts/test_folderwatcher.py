@@ -0,0 +1,61 @@
+#!/usr/bin/python
+
+"""Tests scripts/python/folderwatcher."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import scripts.python.folderwatcher as fw
+
+
+class TestFolderWatcher(unittest.TestCase):
+    """Test changed ontology files are reported once they settle."""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.folder, "imports"))
+        self.first = self.write("first.owl", "<rdf:RDF/>")
+        self.second = self.write("second.owl", "<rdf:RDF/>")
+        self.write("notes.txt", "")
+        self.watcher = fw.FolderWatcher(self.folder, settle=5)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write(self, name, content):
+        file_path = os.path.join(self.folder, name)
+        with open(file_path, "w") as handle:
+            handle.write(content)
+        return file_path
+
+    def test_settle(self):
+        self.assertEqual(self.watcher.poll(now=0), [])
+        self.assertEqual(self.watcher.poll(now=4), [])
+        self.assertEqual(self.watcher.poll(now=5), [self.first, self.second])
+        self.assertEqual(self.watcher.poll(now=20), [])
+
+    def test_rapid_edits_coalesced(self):
+        self.watcher.poll(now=0)
+        self.watcher.poll(now=5)
+        for (now, content) in ((10, "<rdf:RDF> </rdf:RDF>"), (12, "<rdf:RDF>  </rdf:RDF>")):
+            self.write("first.owl", content)
+            self.assertEqual(self.watcher.poll(now=now), [])
+        self.assertEqual(self.watcher.poll(now=16), [])
+        self.assertEqual(self.watcher.poll(now=17), [self.first])
+
+    def test_known_and_imports(self):
+        watcher = fw.FolderWatcher(self.folder, settle=0,
+                                   known={self.first: self.watcher.get_signatures()[self.first]})
+        self.assertEqual(watcher.poll(), [self.second])
+        self.write("imports/units.owl", "<rdf:RDF/>")
+        self.assertEqual(watcher.poll(), [self.first, self.second])
+        os.remove(self.second)
+        watcher.forget(self.first)
+        self.assertEqual(watcher.poll(), [self.first])
+        self.assertNotIn(self.second, watcher.known)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+#!/usr/bin/python
+
+"""Tests scripts/python/graphcache."""
+
+import os
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+from unittest.mock import patch
+
+import rdflib
+
+import scripts.python.graphcache as gc
+
+
+TEST_ONTOLOGIES = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "../test_ontologies")
+
+
+def cache_file(job):
+    (cache_folder, file_path) = job
+    gc.GraphCache(cache_folder).get_parsed(file_path)
+
+
+class TestGraphCache(unittest.TestCase):
+    """Test parsed graph caching, invalidation and eviction."""
+
+    def setUp(self):
+        self.cache_folder = tempfile.mkdtemp()
+        self.work_folder = tempfile.mkdtemp()
+        self.ontology_file = os.path.join(self.work_folder, "test_units.owl")
+        shutil.copy(os.path.join(TEST_ONTOLOGIES, "imports/test_units.owl"),
+                    self.ontology_file)
+        self.cache = gc.GraphCache(self.cache_folder)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_folder)
+        shutil.rmtree(self.work_folder)
+
+    def test_load_matches_parse(self):
+        expected = rdflib.Graph()
+        expected.parse(self.ontology_file, format="xml")
+
+        for _ in range(2):
+            graph = rdflib.Graph()
+            self.cache.load(graph, self.ontology_file)
+            self.assertEqual(set(graph), set(expected))
+            self.assertIn(("owl", rdflib.URIRef("http://www.w3.org/2002/07/owl#")),
+                          list(graph.namespaces()))
+
+    def test_cache_hit_skips_parse(self):
+        self.cache.get_triples(self.ontology_file)
+        with patch.object(rdflib.Graph, "parse") as parse:
+            self.cache.get_triples(self.ontology_file)
+            parse.assert_not_called()
+
+    def test_changed_file_is_reparsed(self):
+        before = self.cache.get_triples(self.ontology_file)
+        with open(self.ontology_file) as handle:
+            content = handle.read()
+        with open(self.ontology_file, "w") as handle:
+            handle.write(content.replace("degree Celsius", "degree Fahrenheit"))
+
+        after = self.cache.get_triples(self.ontology_file)
+        self.assertEqual(len(before), len(after))
+        self.assertIn(rdflib.Literal("degree Fahrenheit", lang="en"),
+                      [o for (s, p, o) in after])
+
+    def test_lru_eviction(self):
+        self.cache.get_triples(self.ontology_file)
+        first = self.cache.read_index()["paths"][os.path.realpath(self.ontology_file)]["hash"]
+        size = self.cache.read_index()["entries"][first]["size"]
+
+        # Room for only one cached file.
+        self.cache.max_size = size + size // 2
+        other_file = os.path.join(self.work_folder, "other.owl")
+        with open(self.ontology_file) as handle:
+            content = handle.read()
+        with open(other_file, "w") as handle:
+            handle.write(content.replace("UO_0000027", "UO_0000028"))
+        self.cache.get_triples(other_file)
+
+        entries = self.cache.read_index()["entries"]
+        self.assertEqual(len(entries), 1)
+        self.assertNotIn(first, entries)
+        self.assertFalse(os.path.isfile(self.cache.get_cache_file(first)))
+
+    def write_copies(self, count):
+        with open(self.ontology_file) as handle:
+            content = handle.read()
+        file_paths = []
+        for number in range(count):
+            file_path = os.path.join(self.work_folder, "copy_%s.owl" % number)
+            with open(file_path, "w") as handle:
+                handle.write(content.replace("UO_0000027", "UO_%07d" % (100 + number)))
+            file_paths.append(file_path)
+        return file_paths
+
+    def test_concurrent_writers(self):
+        file_paths = self.write_copies(40)
+        with multiprocessing.Pool(8) as pool:
+            pool.map(cache_file, [(self.cache_folder, file_path) for file_path in file_paths], 1)
+
+        index = self.cache.read_index()
+        self.assertEqual(len(index["entries"]), 40)
+        self.assertEqual(len(index["paths"]), 40)
+
+    def get_cache_files(self):
+        return [name for name in os.listdir(self.cache_folder) if name.endswith(".pickle")]
+
+    def test_unindexed_file_is_evicted(self):
+        (first, second) = self.write_copies(2)
+        self.cache.get_triples(first)
+        # As if written by a process that died before updating the index.
+        os.remove(self.cache.index.index_file)
+        [orphan] = self.get_cache_files()
+        os.utime(os.path.join(self.cache_folder, orphan), (0, 0))
+
+        size = os.path.getsize(os.path.join(self.cache_folder, orphan))
+        self.cache.max_size = size + size // 2
+        self.cache.get_triples(second)
+        self.assertEqual(len(self.cache.read_index()["entries"]), 1)
+        self.assertNotIn(orphan, self.get_cache_files())
+        self.assertEqual(len(self.get_cache_files()), 1)
+
+    def test_memory_cache(self):
+        gc.set_memory_cache(100000)
+        try:
+            triples = self.cache.get_triples(self.ontology_file)
+            shutil.rmtree(self.cache_folder)
+            other_cache = gc.GraphCache(self.cache_folder)
+            with patch.object(rdflib.Graph, "parse") as parse:
+                self.assertIs(other_cache.get_triples(self.ontology_file), triples)
+                parse.assert_not_called()
+
+            gc.set_memory_cache(len(triples) - 1)
+            self.assertEqual(gc.memory_cache.triples, 0)
+        finally:
+            gc.set_memory_cache(0)
+
+
+if __name__ == "__main__":
+    unittest.main()
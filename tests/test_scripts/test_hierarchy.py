@@ -0,0 +1,142 @@
+#!/usr/bin/python
+
+"""Tests scripts/python/hierarchy, and OntoHelper.do_tree_table and do_inherited_table."""
+
+import os
+import unittest
+
+import rdflib
+
+import scripts.python.hierarchy as hi
+import scripts.python.ontohelper as oh
+
+
+TEST_ONTOLOGIES = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "../test_ontologies")
+TEST_ONTOLOGY = os.path.join(TEST_ONTOLOGIES, "test_ontology.owl")
+
+EX = rdflib.Namespace("http://example.org/")
+GENEPIO = rdflib.Namespace("http://purl.obolibrary.org/obo/GENEPIO_")
+
+
+class TestSubclassIndex(unittest.TestCase):
+    """Test traversal of the rdfs:subClassOf index."""
+
+    def setUp(self):
+        graph = rdflib.Graph()
+        for (child, parent) in [("b", "a"), ("c", "a"), ("d", "b"), ("d", "c"),
+                                ("e", "d"), ("a", "e")]:  # e -> a closes a cycle
+            graph.add((EX[child], rdflib.RDFS.subClassOf, EX[parent]))
+        graph.add((EX["f"], rdflib.RDFS.subClassOf, rdflib.BNode()))
+        self.index = hi.SubclassIndex(graph, closure=True)
+
+    def test_descendants(self):
+        self.assertEqual(self.index.get_descendants(EX["b"]), [EX["d"], EX["e"], EX["a"], EX["c"]])
+        self.assertEqual(self.index.get_descendants(EX["e"], True)[0:2], [EX["e"], EX["a"]])
+        self.assertEqual(self.index.get_descendants(EX["x"]), [])
+
+    def test_ancestors(self):
+        self.assertEqual(self.index.get_ancestors(EX["d"]),
+                         {EX["a"], EX["b"], EX["c"], EX["d"], EX["e"]})
+        self.assertTrue(self.index.is_a(EX["d"], EX["c"]))
+        self.assertFalse(self.index.is_a(EX["f"], EX["a"]))
+        self.assertEqual(self.index.get_parents(EX["f"]), [])
+
+    def test_topological_order(self):
+        graph = rdflib.Graph()
+        for (child, parent) in [("d", "b"), ("d", "c"), ("b", "a"), ("c", "b"), ("e", "d")]:
+            graph.add((EX[child], rdflib.RDFS.subClassOf, EX[parent]))
+        index = hi.SubclassIndex(graph)
+        self.assertEqual(hi.get_topological_order(index, [EX["a"], EX["c"]]),
+                         [EX["a"], EX["b"], EX["c"], EX["d"], EX["e"]])
+        # Classes on the cycle come last.
+        self.assertEqual(hi.get_topological_order(self.index, [EX["f"], EX["b"]])[0], EX["f"])
+
+
+class TestTreeTable(unittest.TestCase):
+    """Test "is a" hierarchy tables read from the subclass index."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.onto_helper = oh.OntoHelper()
+        cls.onto_helper.graph.parse(TEST_ONTOLOGY, format="xml")
+        cls.onto_helper.do_ontology_includes(TEST_ONTOLOGY)
+
+    def test_picklist_tree(self):
+        table = self.onto_helper.do_tree_table(
+            "http://purl.obolibrary.org/obo/GENEPIO_0001002")
+        # Ordered by parent, then ui_label (unset first), then label.
+        self.assertEqual([(row["id"], row["parent_id"]) for row in table], [
+            ("GENEPIO:0001004", "GENEPIO:0001002"),
+            ("GENEPIO:0001003", "GENEPIO:0001002"),
+            ("GENEPIO:0001005", "GENEPIO:0001002"),
+            ("GENEPIO:0001009", "GENEPIO:0001003"),
+            ("GENEPIO:0001010", "GENEPIO:0001003"),
+        ])
+        self.assertEqual(table[4], {"id": "GENEPIO:0001010", "parent_id": "GENEPIO:0001003",
+                                    "deprecated": "true",
+                                    "replaced_by": "http://purl.obolibrary.org/obo/GENEPIO_0001009"})
+
+    def test_outside_parents_and_labels(self):
+        root = "http://purl.obolibrary.org/obo/GENEPIO_0001002"
+        table = self.onto_helper.do_tree_table(root, label=True, outside_parents=True)
+        self.assertEqual(len(table), 6)
+        self.assertEqual(table[0], {"id": "GENEPIO:0001004", "label": "Brazil",
+                                    "parent_id": "GENEPIO:0001002"})
+        # Root's own link to its parent, outside the hierarchy.
+        self.assertEqual(table[5], {"id": "GENEPIO:0001002", "label": "host country",
+                                    "parent_id": "GENEPIO:0001655"})
+
+
+class TestInheritedTable(unittest.TestCase):
+    """Test pushing datatypes and constraints down the subclass hierarchy."""
+
+    def setUp(self):
+        self.onto_helper = oh.OntoHelper()
+        # a > b > d, a > c > d, d > e
+        for (child, parent) in [("0001001", "0001000"), ("0001002", "0001000"), ("0001003", "0001001"),
+                                ("0001003", "0001002"), ("0001004", "0001003")]:
+            self.onto_helper.graph.add((GENEPIO[child], rdflib.RDFS.subClassOf, GENEPIO[parent]))
+
+    def get_rows(self, number, datatype, *constraints):
+        id = self.onto_helper.get_entity_id(GENEPIO[number])
+        rows = [{"id": id, "datatype": datatype}]
+        rows.extend({"id": id, "datatype": datatype, "constraint": constraint, "expression": expression}
+                    for (constraint, expression) in constraints)
+        return rows
+
+    def get_inherited(self, table):
+        inherited = {}
+        for row in self.onto_helper.do_inherited_table(table):
+            (datatype, constraints) = inherited.get(row["id"], (None, []))
+            if "constraint" in row:
+                constraints = constraints + [(row["constraint"], row["expression"])]
+            inherited[row["id"]] = (row["datatype"], constraints)
+        return inherited
+
+    def test_constraints_added(self):
+        table = self.get_rows("0001000", "xmls:integer", ("xmls:minInclusive", "0")) + \
+            self.get_rows("0001002", "xmls:integer", ("xmls:maxInclusive", "9"), ("xmls:minInclusive", "0"))
+        self.assertEqual(self.get_inherited(table), {
+            "GENEPIO:0001001": ("xmls:integer", [("xmls:minInclusive", "0")]),
+            "GENEPIO:0001002": ("xmls:integer", [("xmls:minInclusive", "0")]),
+            "GENEPIO:0001003": ("xmls:integer", [("xmls:minInclusive", "0"), ("xmls:maxInclusive", "9")]),
+            "GENEPIO:0001004": ("xmls:integer", [("xmls:minInclusive", "0"), ("xmls:maxInclusive", "9")]),
+        })
+
+    def test_nearer_datatype_overrides(self):
+        table = self.get_rows("0001000", "xmls:integer", ("xmls:minInclusive", "0")) + \
+            self.get_rows("0001003", "xmls:date")
+        inherited = self.get_inherited(table)
+        self.assertEqual(inherited["GENEPIO:0001003"], ("xmls:integer", [("xmls:minInclusive", "0")]))
+        self.assertEqual(inherited["GENEPIO:0001004"], ("xmls:date", []))
+        self.assertNotIn("GENEPIO:0001000", inherited)
+
+    def test_ordered_by_datatype(self):
+        table = self.get_rows("0001001", "xmls:integer") + self.get_rows("0001003", "xmls:date")
+        self.assertEqual([(row["id"], row["datatype"]) for row in self.onto_helper.do_inherited_table(table)],
+                         [("GENEPIO:0001004", "xmls:date"), ("GENEPIO:0001003", "xmls:integer")])
+
+
+if __name__ == "__main__":
+    unittest.main()
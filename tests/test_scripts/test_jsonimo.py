@@ -0,0 +1,162 @@
+#!/usr/bin/python
+
+"""Tests scripts/jsonimo.py end to end."""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import rdflib
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../scripts")
+TEST_ONTOLOGIES = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "../test_ontologies")
+
+# jsonimo.py imports its helpers from scripts/python as top level "python".
+sys.path.insert(0, SCRIPTS)
+import jsonimo  # noqa: E402
+sys.path.remove(SCRIPTS)
+
+# Edits between releases: a changed label, a changed restriction, a removed
+# term, an added picklist item and an added model.
+EDITS = [
+    (">Brazil<", ">Brasil<"),
+    ('<xsd:maxExclusive rdf:datatype="&xsd;integer">9</xsd:maxExclusive>',
+     '<xsd:maxExclusive rdf:datatype="&xsd;integer">12</xsd:maxExclusive>'),
+    ("""    <owl:Class rdf:about="&obo;GENEPIO_0001005">
+        <rdfs:subClassOf rdf:resource="&obo;GENEPIO_0001002"/>
+        <rdfs:label xml:lang="en">Algeria</rdfs:label>
+        <obo:GENEPIO_0000006 xml:lang="en">Algeria (DZ)</obo:GENEPIO_0000006>
+    </owl:Class>
+""", ""),
+    ("</rdf:RDF>", """    <owl:Class rdf:about="&obo;GENEPIO_0001011">
+        <rdfs:subClassOf rdf:resource="&obo;GENEPIO_0001002"/>
+        <rdfs:label xml:lang="en">Chile</rdfs:label>
+    </owl:Class>
+    <owl:Class rdf:about="&obo;GENEPIO_0001012">
+        <rdfs:subClassOf rdf:resource="&obo;GENEPIO_0001000"/>
+        <rdfs:label xml:lang="en">new sample spec</rdfs:label>
+    </owl:Class>
+</rdf:RDF>"""),
+]
+
+
+def get_normalized(specifications):
+    """
+    Returns specifications with constraint lists sorted, as the order of
+    an entity's constraints varies between runs.
+    """
+    for entity in specifications.values():
+        if "constraints" in entity:
+            entity["constraints"] = sorted(entity["constraints"],
+                                           key=lambda constraint: json.dumps(constraint, sort_keys=True))
+    return specifications
+
+
+class TestIncremental(unittest.TestCase):
+    """Test an incremental build matches a full build of the new release."""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.old_file = self.copy_release("old")
+        self.new_file = self.copy_release("new")
+        with open(self.new_file) as ontology:
+            text = ontology.read()
+        for (old, new) in EDITS:
+            self.assertIn(old, text)
+            text = text.replace(old, new)
+        with open(self.new_file, "w") as ontology:
+            ontology.write(text)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def copy_release(self, name):
+        shutil.copytree(TEST_ONTOLOGIES, os.path.join(self.folder, name))
+        return os.path.join(self.folder, name, "test_ontology.owl")
+
+    def run_jsonimo(self, ontology_file, name, *options):
+        output_folder = os.path.join(self.folder, "output_" + name)
+        os.mkdir(output_folder)
+        subprocess.check_output([sys.executable, "jsonimo.py", ontology_file, "-o", output_folder,
+                                 "--no-cache"] + list(options), cwd=SCRIPTS, stderr=subprocess.STDOUT)
+        with open(os.path.join(output_folder, "test_ontology.json")) as output:
+            return json.load(output)
+
+    def test_matches_full_build(self):
+        previous = self.run_jsonimo(self.old_file, "old")
+        full = self.run_jsonimo(self.new_file, "full")
+        incremental = self.run_jsonimo(self.new_file, "incremental", "-p", self.old_file,
+                                       "--previous-output", os.path.join(self.folder, "output_old", "test_ontology.json"))
+
+        self.assertNotEqual(previous["specifications"], full["specifications"])
+        self.assertEqual(incremental["@context"], full["@context"])
+        self.assertEqual(get_normalized(incremental["specifications"]),
+                         get_normalized(full["specifications"]))
+        self.assertIn("GENEPIO:0001012", incremental["specifications"])
+        self.assertNotIn("GENEPIO:0001005", incremental["specifications"])
+
+        # Entities new since the previous release are appended; the rest
+        # keep the order of a full build.
+        new_ids = set(full["specifications"]) - set(previous["specifications"])
+        self.assertEqual([key for key in incremental["specifications"] if not key in new_ids],
+                         [key for key in full["specifications"] if not key in new_ids])
+
+
+class TestInheritableRows(unittest.TestCase):
+    """Test which 'primitives' rows are pushed down as 'inherited' ones."""
+
+    def test_rows(self):
+        ontology = jsonimo.Ontology()
+        ontology.onto_helper.struct["@context"]["xmls"] = "http://www.w3.org/2001/XMLSchema#"
+        own = [
+            {"id": "GENEPIO:0001", "datatype": "xmls:integer"},
+            {"id": "GENEPIO:0001", "datatype": "xmls:integer",
+             "constraint": "xmls:minInclusive", "expression": "0"},
+        ]
+        primitives = own + [
+            {"id": "GENEPIO:0002", "datatype": "xmls:anyURI"},
+            {"id": rdflib.BNode(), "datatype": "xmls:date"},
+            {"id": "GENEPIO:0003", "datatype": rdflib.BNode()},
+        ]
+        self.assertEqual(ontology.get_inheritable_rows(primitives), own)
+
+
+
+class TestForkedPrefixes(unittest.TestCase):
+    """Test prefixes a forked query adds give the @context a serial run does."""
+
+    # Second URI finds a new namespace whose prefix name is already taken.
+    URIS = ["http://example.org/ABC_0001", "http://example.org/other/owl_0001"]
+
+    def get_ontology(self):
+        ontology = jsonimo.Ontology()
+        ontology.get_query_table = lambda query_name, initBinds={}: [
+            {"id": ontology.onto_helper.get_entity_id(uri)} for uri in self.URIS]
+        return ontology
+
+    def test_merged(self):
+        serial = self.get_ontology()
+        table = serial.get_query_table("units")
+
+        jsonimo.forked_ontology = self.get_ontology()
+        try:
+            (query_name, forked, seconds, queries, prefixes) = jsonimo.get_forked_table("units")
+        finally:
+            jsonimo.forked_ontology = None
+        self.assertEqual(forked, table)
+
+        parallel = jsonimo.Ontology()
+        parallel.prefetched[query_name] = (forked, seconds, queries, prefixes)
+        self.assertEqual(parallel.get_prefetched_table("units"), table)
+        self.assertEqual(list(parallel.onto_helper.struct["@context"].items()),
+                         list(serial.onto_helper.struct["@context"].items()))
+        self.assertEqual(parallel.onto_helper.get_entity_id(self.URIS[1]), "owl:0001")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+#!/usr/bin/python
+
+"""Tests scripts/python/ontoformat."""
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import rdflib
+from rdflib.compare import isomorphic
+
+import scripts.python.ontoformat as of
+
+
+TEST_ONTOLOGY = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "../test_ontologies/test_ontology.owl")
+
+OBO = "http://purl.obolibrary.org/obo/"
+
+NTRIPLES = """# comment
+<http://purl.obolibrary.org/obo/GENEPIO_0001001> <http://www.w3.org/2000/01/rdf-schema#label> "sample \\"temperature\\"\\u00B0"@en .
+<http://purl.obolibrary.org/obo/GENEPIO_0001001> <http://www.w3.org/2000/01/rdf-schema#subClassOf> _:b1 .
+_:b1 <http://www.w3.org/2002/07/owl#maxExclusive> "12"^^<http://www.w3.org/2001/XMLSchema#decimal> .
+
+<http://purl.obolibrary.org/obo/GENEPIO_\\u0030001002> <http://www.w3.org/2000/01/rdf-schema#subClassOf> _:b1 .
+"""
+
+OBOGRAPH = {
+    "graphs": [{
+        "id": OBO + "test.owl",
+        "meta": {"version": OBO + "test/releases/2018-10-01/test.owl"},
+        "nodes": [
+            {"id": OBO + "GENEPIO_0001002", "type": "CLASS", "lbl": "host country",
+             "meta": {"definition": {"val": "A country."},
+                      "synonyms": [{"pred": "hasExactSynonym", "val": "country of host"}],
+                      "xrefs": [{"val": "GAZ:00000448"}],
+                      "deprecated": True,
+                      "basicPropertyValues": [{"pred": OBO + "IAO_0100001", "val": OBO + "GENEPIO_0001003"}]}},
+            {"id": "BFO:0000050", "type": "PROPERTY", "lbl": "part of"},
+        ],
+        "edges": [
+            {"sub": OBO + "GENEPIO_0001002", "pred": "is_a", "obj": OBO + "GENEPIO_0001000"},
+            {"sub": OBO + "GENEPIO_0001002", "pred": "BFO:0000050", "obj": OBO + "GENEPIO_0001001"},
+        ],
+        "logicalDefinitionAxioms": [{
+            "definedClassId": OBO + "GENEPIO_0001004", "genusIds": [OBO + "GENEPIO_0001000"],
+            "restrictions": [{"propertyId": OBO + "BFO_0000050", "fillerId": OBO + "GENEPIO_0001001"}]}],
+    }]
+}
+
+
+class TestOntologyFormat(unittest.TestCase):
+    """Test format detection and the N-Triples and OBO Graphs loaders."""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write(self, file_name, text):
+        file_path = os.path.join(self.folder, file_name)
+        with open(file_path, "w", encoding="utf-8") as handle:
+            handle.write(text)
+        return file_path
+
+    def test_get_format(self):
+        self.assertEqual(of.get_format(TEST_ONTOLOGY), "xml")
+        # Content decides over extension of local files.
+        self.assertEqual(of.get_format(self.write("a.owl", NTRIPLES)), "nt")
+        self.assertEqual(of.get_format(self.write("b.owl", "@prefix owl: <http://www.w3.org/2002/07/owl#> .\n")), "turtle")
+        self.assertEqual(of.get_format(self.write("c.owl", json.dumps(OBOGRAPH))), "obographs")
+        self.assertEqual(of.get_format(self.write("d.ttl", "")), "turtle")
+        self.assertEqual(of.get_format("http://purl.obolibrary.org/obo/go.json"), "obographs")
+        self.assertEqual(of.get_format("http://purl.obolibrary.org/obo/go/go-basic.nt.gz"), "nt")
+        self.assertEqual(of.get_format("http://purl.obolibrary.org/obo/go.owl"), "xml")
+
+    def test_ntriples_matches_rdflib(self):
+        file_path = self.write("test.nt", NTRIPLES)
+        expected = rdflib.Graph()
+        expected.parse(file_path, format="nt")
+        graph = rdflib.Graph()
+        of.load(graph, file_path)
+        self.assertEqual(len(graph), 4)
+        self.assertTrue(isomorphic(graph, expected))
+        self.assertIn((rdflib.URIRef(OBO + "GENEPIO_0001001"), rdflib.RDFS.label,
+                       rdflib.Literal('sample "temperature"°', lang="en")), graph)
+
+    def test_ntriples_matches_rdfxml(self):
+        expected = rdflib.Graph()
+        expected.parse(TEST_ONTOLOGY, format="xml")
+        file_path = os.path.join(self.folder, "test_ontology.nt")
+        expected.serialize(file_path, format="nt")
+        parsed = of.get_parsed(file_path)
+        graph = rdflib.Graph()
+        graph.addN((s, p, o, graph) for (s, p, o) in parsed["triples"])
+        self.assertTrue(isomorphic(graph, expected))
+
+    def test_obographs(self):
+        graph = rdflib.Graph()
+        of.load(graph, self.write("test.json", json.dumps(OBOGRAPH)))
+        country = rdflib.URIRef(OBO + "GENEPIO_0001002")
+        OBO_IN_OWL = rdflib.Namespace("http://www.geneontology.org/formats/oboInOwl#")
+
+        self.assertIn((rdflib.URIRef(OBO + "test.owl"), rdflib.OWL.versionIRI,
+                       rdflib.URIRef(OBO + "test/releases/2018-10-01/test.owl")), graph)
+        self.assertIn((country, rdflib.RDF.type, rdflib.OWL.Class), graph)
+        self.assertIn((country, rdflib.RDFS.label, rdflib.Literal("host country")), graph)
+        self.assertIn((country, rdflib.URIRef(OBO + "IAO_0000115"), rdflib.Literal("A country.")), graph)
+        self.assertIn((country, OBO_IN_OWL.hasExactSynonym, rdflib.Literal("country of host")), graph)
+        self.assertIn((country, OBO_IN_OWL.hasDbXref, rdflib.Literal("GAZ:00000448")), graph)
+        self.assertIn((country, rdflib.OWL.deprecated, rdflib.Literal(True)), graph)
+        self.assertIn((country, rdflib.URIRef(OBO + "IAO_0100001"), rdflib.URIRef(OBO + "GENEPIO_0001003")), graph)
+        self.assertIn((rdflib.URIRef(OBO + "BFO_0000050"), rdflib.RDF.type, rdflib.OWL.ObjectProperty), graph)
+        self.assertIn((country, rdflib.RDFS.subClassOf, rdflib.URIRef(OBO + "GENEPIO_0001000")), graph)
+
+        (restriction,) = [o for o in graph.objects(country, rdflib.RDFS.subClassOf) if isinstance(o, rdflib.BNode)]
+        self.assertEqual(graph.value(restriction, rdflib.OWL.onProperty), rdflib.URIRef(OBO + "BFO_0000050"))
+        self.assertEqual(graph.value(restriction, rdflib.OWL.someValuesFrom), rdflib.URIRef(OBO + "GENEPIO_0001001"))
+
+        intersection = graph.value(rdflib.URIRef(OBO + "GENEPIO_0001004"), rdflib.OWL.equivalentClass)
+        members = list(rdflib.collection.Collection(graph, graph.value(intersection, rdflib.OWL.intersectionOf)))
+        self.assertEqual(members[0], rdflib.URIRef(OBO + "GENEPIO_0001000"))
+        self.assertEqual(graph.value(members[1], rdflib.OWL.someValuesFrom), rdflib.URIRef(OBO + "GENEPIO_0001001"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+#!/usr/bin/python
+
+"""Tests scripts/python/ontogenerator."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import rdflib
+
+import scripts.python.ontogenerator as og
+import scripts.python.ontohelper as oh
+
+
+OBO = rdflib.Namespace(og.OBO)
+
+
+class TestOntologyGenerator(unittest.TestCase):
+    """Test generated ontologies have the patterns jsonimo reads."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.mkdtemp()
+        cls.ontology_file = os.path.join(cls.folder, "synthetic.owl")
+        cls.counts = og.OntologyGenerator(terms=400, depth=4, synonyms=1.5, imports=3).write(cls.ontology_file)
+        cls.onto_helper = oh.OntoHelper()
+        cls.onto_helper.parse_ontology(cls.ontology_file)
+        cls.onto_helper.do_ontology_includes(cls.ontology_file, processes=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.folder)
+
+    def test_counts(self):
+        self.assertEqual(self.counts["models"] + self.counts["datums"] + self.counts["picklists"]
+                         + self.counts["picklist_items"], 400)
+        self.assertEqual(len(os.listdir(os.path.join(self.folder, "imports"))), 3)
+        graph = self.onto_helper.graph
+        self.assertEqual(len(set(graph.subjects(rdflib.RDF.type, rdflib.OWL.Class))), 400 + 20 + 3)
+        self.assertGreater(len(list(graph.subject_objects(rdflib.URIRef(
+            "http://www.geneontology.org/formats/oboInOwl#hasExactSynonym")))), 0)
+
+    def test_hierarchies(self):
+        models = self.onto_helper.do_tree_table(OBO["OBI_0000658"])
+        self.assertEqual(len(set(row["id"] for row in models)), self.counts["models"])
+
+        ids = ["GENEPIO_%07d" % number for number in range(200)]
+        parents = og.OntologyGenerator(depth=3).get_hierarchy(ids, ["root"])
+        for id in ids:
+            (level, node) = (0, id)
+            while node != "root":
+                (level, node) = (level + 1, parents[node][0])
+            self.assertLessEqual(level, 3)
+
+    def test_components_and_units(self):
+        graph = self.onto_helper.graph
+        components = set(graph.subjects(rdflib.OWL.onProperty, OBO["RO_0002180"]))
+        self.assertGreaterEqual(len(components), self.counts["models"])
+        self.assertGreater(len(set(graph.subjects(rdflib.OWL.onProperty, OBO["IAO_0000039"]))), 0)
+        self.assertGreater(len(set(graph.subjects(rdflib.RDF.type, rdflib.OWL.Axiom))), 0)
+
+    def test_repeatable(self):
+        other_file = os.path.join(self.folder, "other", "synthetic.owl")
+        og.OntologyGenerator(terms=400, depth=4, synonyms=1.5, imports=3).write(other_file)
+        with open(self.ontology_file) as first, open(other_file) as second:
+            self.assertEqual(first.read(), second.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
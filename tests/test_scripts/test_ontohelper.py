@@ -0,0 +1,362 @@
+#!/usr/bin/python
+
+"""Tests scripts/python/ontohelper."""
+
+import os
+import gzip
+import json
+import shutil
+import tempfile
+import unittest
+from collections import OrderedDict
+from unittest import mock
+
+import rdflib
+from rdflib.compare import isomorphic
+
+import scripts.python.ontohelper as oh
+
+
+TEST_ONTOLOGIES = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "../test_ontologies")
+TEST_ONTOLOGY = os.path.join(TEST_ONTOLOGIES, "test_ontology.owl")
+
+OBO = "http://purl.obolibrary.org/obo/"
+
+
+class TestAnnotationTables(unittest.TestCase):
+    """Test bulk harvesting of entity annotations."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.onto_helper = oh.OntoHelper()
+        cls.onto_helper.graph.parse(TEST_ONTOLOGY, format="xml")
+        cls.onto_helper.do_ontology_includes(TEST_ONTOLOGY)
+        cls.onto_helper.do_annotation_tables()
+
+    def test_entity_text(self):
+        annotations = self.onto_helper.get_annotations(OBO + "GENEPIO_0001000")
+        self.assertEqual(self.onto_helper.get_entity_text(annotations), {
+            "label": "sample specification",
+            "definition": "A specification of the fields describing a sample.",
+            "ui_label": "sample",
+            "ui_definition": "Information about a sample.",
+        })
+
+    def test_entity_text_matches_sparql(self):
+        for subject in set(self.onto_helper.graph.subjects(rdflib.RDFS.label)):
+            if isinstance(subject, rdflib.BNode):
+                continue
+            labels = sorted(str(label) for label in
+                            self.onto_helper.graph.objects(subject, rdflib.RDFS.label))
+            text = self.onto_helper.get_entity_text(
+                self.onto_helper.get_annotations(subject))
+            self.assertEqual(text["label"], labels[-1])
+
+    def test_synonyms_and_dbxrefs(self):
+        annotations = self.onto_helper.get_annotations(OBO + "GENEPIO_0001003")
+        self.assertEqual(annotations["hasAlternativeTerm"], ["Dominion of Canada"])
+        self.assertEqual(annotations["hasDbXref"], ["GAZ:00002560"])
+
+        annotations = self.onto_helper.get_annotations(OBO + "GENEPIO_0001001")
+        self.assertEqual(annotations["hasExactSynonym"], ["temperature of sample"])
+        self.assertEqual(annotations["hasNarrowSynonym"],
+                         ["collection temperature, storage temperature"])
+
+    def test_axiom_annotations_skipped(self):
+        for subject in self.onto_helper.annotations:
+            self.assertTrue(subject.startswith("http"))
+
+    def test_unknown_entity(self):
+        self.assertEqual(self.onto_helper.get_annotations(OBO + "GENEPIO_9999999"), {})
+
+
+class TestOntologyIncludes(unittest.TestCase):
+    """Test loading of the owl:imports closure."""
+
+    def load(self, processes):
+        onto_helper = oh.OntoHelper()
+        onto_helper.graph.parse(TEST_ONTOLOGY, format="xml")
+        onto_helper.do_ontology_includes(TEST_ONTOLOGY, processes)
+        return onto_helper.graph
+
+    def test_transitive_imports(self):
+        graph = self.load(1)
+        ontologies = set(str(o) for o in graph.subjects(rdflib.RDF.type, rdflib.OWL.Ontology))
+        self.assertEqual(ontologies, {
+            OBO + "test_ontology.owl",
+            OBO + "test_ontology/imports/test_import.owl",
+            OBO + "test_ontology/imports/test_units.owl",
+        })
+        # Nested import, which imports its importer back.
+        self.assertIn((rdflib.URIRef(OBO + "UO_0000027"), rdflib.RDFS.label,
+                       rdflib.Literal("degree Celsius", lang="en")), graph)
+
+    def test_process_pool_matches_serial(self):
+        onto_helper = oh.OntoHelper()
+        locations = [os.path.join(TEST_ONTOLOGIES, "imports", name)
+                     for name in ("test_import.owl", "test_units.owl", "missing.owl")]
+        pooled = list(onto_helper.do_parse_files(locations, 2))
+        serial = list(onto_helper.do_parse_files(locations, 1))
+
+        self.assertEqual([location for (location, parsed, error) in pooled], locations)
+        for ((_, pooled_parsed, pooled_error), (_, serial_parsed, serial_error)) in zip(pooled, serial):
+            self.assertEqual(bool(pooled_error), bool(serial_error))
+            if pooled_parsed:
+                self.assertEqual(set(pooled_parsed["triples"]), set(serial_parsed["triples"]))
+        self.assertTrue(pooled[2][2])
+
+    def test_process_pool_shares_graph_cache(self):
+        work_folder = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(TEST_ONTOLOGIES, "imports", "test_units.owl")) as handle:
+                content = handle.read()
+            locations = []
+            for number in range(12):
+                location = os.path.join(work_folder, "units_%s.owl" % number)
+                with open(location, "w") as handle:
+                    handle.write(content.replace("UO_0000027", "UO_%07d" % (100 + number)))
+                locations.append(location)
+
+            onto_helper = oh.OntoHelper()
+            onto_helper.set_graph_cache(os.path.join(work_folder, "cache"))
+            results = onto_helper.do_parse_files(locations, 4)
+            self.assertFalse([error for (location, parsed, error) in results if error])
+
+            # Every worker's cache file is recorded in the shared index.
+            index = onto_helper.graph_cache.read_index()
+            self.assertEqual(len(index["entries"]), 12)
+            self.assertEqual(sorted(index["paths"]), sorted(os.path.realpath(location) for location in locations))
+        finally:
+            shutil.rmtree(work_folder)
+
+    def test_shared_imports(self):
+        shared_imports = {}
+        graphs = []
+        for number in range(2):
+            onto_helper = oh.OntoHelper()
+            onto_helper.set_shared_imports(shared_imports)
+            onto_helper.graph.parse(TEST_ONTOLOGY, format="xml")
+            with mock.patch.object(onto_helper, "do_parse_files", wraps=onto_helper.do_parse_files) as parse_files:
+                onto_helper.do_ontology_includes(TEST_ONTOLOGY, 1)
+            # Second ontology parses no import files.
+            self.assertEqual(sum(len(call[0][0]) for call in parse_files.call_args_list), 2 if number == 0 else 0)
+            graphs.append(onto_helper.graph)
+
+        self.assertEqual(len(shared_imports), 2)
+        expected = self.load(1)
+        for graph in graphs:
+            self.assertEqual(len(graph), len(expected))
+            self.assertTrue(isomorphic(graph, expected))
+        # Triples added to one overlay aren't seen by another.
+        graphs[0].add((rdflib.URIRef(OBO + "GENEPIO_0001004"), rdflib.RDFS.label, rdflib.Literal("Brasil")))
+        self.assertEqual(len(graphs[1]), len(expected))
+
+
+class TestChangedEntities(unittest.TestCase):
+    """Test comparison of two releases for incremental rebuilds."""
+
+    def setUp(self):
+        self.onto_helper = oh.OntoHelper()
+        self.onto_helper.graph.parse(TEST_ONTOLOGY, format="xml")
+        self.previous_graph = rdflib.Graph()
+        self.previous_graph.parse(TEST_ONTOLOGY, format="xml")
+
+    def test_reparsed_release_unchanged(self):
+        # Blank node ids differ between the two parses.
+        self.assertEqual(self.onto_helper.get_changed_entities(self.previous_graph), set())
+
+    def test_changed_label(self):
+        graph = self.onto_helper.graph
+        brazil = rdflib.URIRef(OBO + "GENEPIO_0001004")
+        graph.set((brazil, rdflib.RDFS.label, rdflib.Literal("Brasil", lang="pt")))
+
+        changed = self.onto_helper.get_changed_entities(self.previous_graph)
+        self.assertIn(OBO + "GENEPIO_0001004", changed)
+        self.assertIn(OBO + "GENEPIO_0001002", changed)
+        self.assertNotIn(OBO + "GENEPIO_0001003", changed)
+
+    def test_changed_restriction_includes_descendants(self):
+        graph = self.onto_helper.graph
+        (bound,) = [s for (s, o) in graph.subject_objects(
+            rdflib.URIRef("http://www.w3.org/2001/XMLSchema#maxExclusive"))]
+        graph.set((bound, rdflib.URIRef("http://www.w3.org/2001/XMLSchema#maxExclusive"),
+                   rdflib.Literal(12)))
+
+        changed = self.onto_helper.get_changed_entities(self.previous_graph)
+        self.assertIn(OBO + "GENEPIO_0001007", changed)
+        self.assertIn(OBO + "GENEPIO_0001008", changed)
+        self.assertNotIn(OBO + "GENEPIO_0001001", changed)
+
+
+class TestEntityRegistry(unittest.TestCase):
+    """Test direct entity record access and reordering of entity parts."""
+
+    def setUp(self):
+        self.onto_helper = oh.OntoHelper()
+        for (number, label) in ((1, "Canada"), (2, "Brazil"), (3, None), (4, "Argentina")):
+            entity = self.onto_helper.add_entity("GENEPIO:000100%s" % number)
+            if label:
+                entity["ui_label" if number == 4 else "label"] = label
+
+    def test_add_entity(self):
+        entity = self.onto_helper.add_entity("GENEPIO:0001005", {"id": "GENEPIO:0001005", "datatype": "model"})
+        self.assertIs(self.onto_helper.get_entity("GENEPIO:0001005"), entity)
+        self.assertIs(self.onto_helper.add_entity("GENEPIO:0001005", {"id": "other"}), entity)
+        entity.setdefault("components", {}).setdefault("GENEPIO:0001001", []).append({"cardinality": "owl:someValuesFrom"})
+        self.assertEqual(self.onto_helper.struct["specifications"]["GENEPIO:0001005"]["components"],
+                         {"GENEPIO:0001001": [{"cardinality": "owl:someValuesFrom"}]})
+        self.assertIsNone(self.onto_helper.get_entity("GENEPIO:0009999"))
+
+    def test_reorder(self):
+        entity = self.onto_helper.add_entity("GENEPIO:0001000")
+        entity["choices"] = OrderedDict((id, []) for id in
+                                        ["GENEPIO:0001001", "GENEPIO:0001002", "GENEPIO:0001003", "GENEPIO:0001004"])
+        self.onto_helper.reorder(entity, "choices", ["GENEPIO:0001003", "GENEPIO:0001004", "GENEPIO:0001002",
+                                                     "GENEPIO:0001001"])
+        self.assertEqual(list(entity["choices"]),
+                         ["GENEPIO:0001003", "GENEPIO:0001004", "GENEPIO:0001002", "GENEPIO:0001001"])
+        self.onto_helper.reorder(entity, "choices")
+        self.assertEqual(list(entity["choices"]),
+                         ["GENEPIO:0001004", "GENEPIO:0001002", "GENEPIO:0001001", "GENEPIO:0001003"])
+        self.onto_helper.reorder(entity, "models", ["GENEPIO:0001001"])
+        self.assertNotIn("models", entity)
+
+
+class TestOrderedRows(unittest.TestCase):
+    """Test ordering of query tables in place of sparql ORDER BY."""
+
+    QUERY = """
+        SELECT DISTINCT ?id ?parent_id
+        WHERE {
+            ?id rdfs:subClassOf ?parent_id.
+            FILTER (isIRI(?parent_id))
+            %s
+        } %s
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.onto_helper = oh.OntoHelper()
+        cls.onto_helper.graph.parse(TEST_ONTOLOGY, format="xml")
+        cls.onto_helper.do_ontology_includes(TEST_ONTOLOGY)
+
+    def test_matches_sparql_order_by(self):
+        helper = self.onto_helper
+        expected = helper.do_query_table(helper.prepare_query(
+            self.QUERY % ("OPTIONAL {?id rdfs:label ?label}", "ORDER BY ?parent_id ?label")))
+        unordered = helper.prepare_query(self.QUERY % ("", ""))
+        self.assertTrue(len(expected) > 10)
+        self.assertEqual(helper.do_query_table(unordered, {}, ["parent_id", ("id", "label")]), expected)
+        self.assertNotEqual(helper.do_query_table(unordered, {}, [("id", "label"), "parent_id"]), expected)
+
+    def test_sort_keys(self):
+        helper = oh.OntoHelper()
+        terms = [rdflib.Literal("a"), rdflib.URIRef(OBO + "GENEPIO_0001001"), rdflib.BNode(), None]
+        self.assertEqual(sorted(terms, key=helper.get_term_sort_key), terms[::-1])
+        self.assertIs(helper.get_term_sort_key(terms[1]), helper.get_term_sort_key(terms[1]))
+
+        brazil = rdflib.URIRef(OBO + "GENEPIO_0001004")
+        (ui_label_key, label_key) = self.onto_helper.get_label_sort_key(brazil)
+        self.assertEqual(ui_label_key, (0,))
+        self.assertEqual(label_key, self.onto_helper.get_sort_key(rdflib.Literal("Brazil", lang="en")))
+        self.assertEqual(self.onto_helper.get_label_sort_key(rdflib.URIRef(OBO + "X")), ((0,), (0,)))
+
+
+class TestQueryCount(unittest.TestCase):
+    """Test each sparql query run is counted, disjunction sub-queries included."""
+
+    def test_query_count(self):
+        helper = oh.OntoHelper()
+        helper.graph.parse(format="turtle", data="""
+            @prefix owl: <http://www.w3.org/2002/07/owl#> .
+            @prefix obo: <http://purl.obolibrary.org/obo/> .
+            obo:GENEPIO_0001001 obo:RO_0002180 [ owl:unionOf ( obo:SIO_000661 obo:SIO_000662 ) ] .
+            obo:GENEPIO_0001002 obo:RO_0002180 [ owl:unionOf ( obo:SIO_000663 ) ] .
+            obo:GENEPIO_0001003 obo:RO_0002180 obo:SIO_000664 .
+        """)
+        table = helper.do_query_table("SELECT ?id ?datum WHERE {?id <%sRO_0002180> ?datum}" % OBO, {}, ["id"])
+        self.assertEqual([row.get("expression") for row in table], [
+            {"datatype": "disjunction", "data": ["SIO:000661", "SIO:000662"]},
+            {"datatype": "disjunction", "data": ["SIO:000663"]},
+            None])
+        self.assertEqual(helper.query_count, 3)
+
+
+class TestContentHash(unittest.TestCase):
+    """Test content hash ignores incidental ordering and blank node ids."""
+
+    def get_struct(self, blank_id, constraints, choices):
+        return {
+            "metadata": {"prefix": "GENEPIO"},
+            "specifications": OrderedDict([
+                ("GENEPIO:0001001", {"id": "GENEPIO:0001001", "datatype": "xmls:decimal",
+                                     "constraints": constraints, "units": [blank_id]}),
+                (blank_id, {"id": blank_id, "label": "unit union"}),
+                ("GENEPIO:0001002", {"id": "GENEPIO:0001002", "datatype": "xmls:anyURI",
+                                     "choices": OrderedDict((id, []) for id in choices)}),
+            ]),
+        }
+
+    def test_content_hash(self):
+        onto_helper = oh.OntoHelper()
+        minimum = {"minInclusive": "0"}
+        maximum = {"maxExclusive": "12"}
+        choices = ["GENEPIO:0001003", "GENEPIO:0001004"]
+        content_hash = onto_helper.get_content_hash(self.get_struct("N1a", [minimum, maximum], choices))
+
+        self.assertEqual(content_hash,
+                         onto_helper.get_content_hash(self.get_struct("N2b", [maximum, minimum], choices)))
+        self.assertNotEqual(content_hash,
+                            onto_helper.get_content_hash(self.get_struct("N1a", [minimum], choices)))
+        self.assertNotEqual(content_hash,
+                            onto_helper.get_content_hash(self.get_struct("N1a", [minimum, maximum],
+                                                                         list(reversed(choices)))))
+
+
+class TestOutput(unittest.TestCase):
+    """Test JSON and TSV output files, plain and gzipped."""
+
+    def setUp(self):
+        self.output_folder = tempfile.mkdtemp()
+        self.basename = os.path.join(self.output_folder, "test_output")
+        self.onto_helper = oh.OntoHelper()
+        self.onto_helper.struct["metadata"] = {"prefix": "GENEPIO"}
+        self.onto_helper.struct["specifications"] = OrderedDict([
+            ("GENEPIO:0001003", {"id": "GENEPIO:0001003", "label": "Canada",
+                                 "member_of": ["GENEPIO:0001002"]}),
+            ("GENEPIO:0001002", {"id": "GENEPIO:0001002", "label": "host\tcountry",
+                                 "choices": OrderedDict([("GENEPIO:0001004", []),
+                                                         ("GENEPIO:0001003", [])])}),
+        ])
+
+    def tearDown(self):
+        shutil.rmtree(self.output_folder)
+
+    def read(self, file_name):
+        if file_name.endswith(".gz"):
+            with gzip.open(os.path.join(self.output_folder, file_name), "rt") as handle:
+                return handle.read()
+        with open(os.path.join(self.output_folder, file_name)) as handle:
+            return handle.read()
+
+    def test_json(self):
+        expected = json.dumps(self.onto_helper.struct, indent=4, separators=(",", ": "))
+        self.onto_helper.do_output_json(self.onto_helper.struct, self.basename)
+        self.onto_helper.do_output_json(self.onto_helper.struct, self.basename, True)
+        self.assertEqual(self.read("test_output.json"), expected)
+        self.assertEqual(self.read("test_output.json.gz"), expected)
+
+    def test_tsv(self):
+        expected = "id\tlabel\tmember_of\n" \
+            "GENEPIO:0001003\tCanada\tGENEPIO:0001002\n" \
+            "GENEPIO:0001002\thost country\t"
+        fields = ["id", "label", "member_of"]
+        self.onto_helper.do_output_tsv(self.onto_helper.struct, self.basename, fields)
+        self.onto_helper.do_output_tsv(self.onto_helper.struct, self.basename, fields, True)
+        self.assertEqual(self.read("test_output.tsv"), expected)
+        self.assertEqual(self.read("test_output.tsv.gz"), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
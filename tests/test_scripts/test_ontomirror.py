@@ -0,0 +1,119 @@
+#!/usr/bin/python
+
+"""Tests scripts/python/ontomirror."""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import http.server
+
+import rdflib
+
+import scripts.python.ontohelper as oh
+import scripts.python.ontomirror as om
+
+
+TEST_ONTOLOGIES = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "../test_ontologies")
+
+ETAG = '"test-etag"'
+
+
+class OntologyHandler(http.server.BaseHTTPRequestHandler):
+    """Serves test ontologies with an ETag, honouring If-None-Match."""
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get("If-None-Match")))
+        file_path = os.path.join(TEST_ONTOLOGIES, "imports", os.path.basename(self.path))
+        if not os.path.isfile(file_path):
+            self.send_error(404)
+        elif self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.end_headers()
+        else:
+            with open(file_path, "rb") as handle:
+                content = handle.read()
+            self.send_response(200)
+            self.send_header("ETag", ETAG)
+            self.send_header("Last-Modified", "Mon, 01 Jan 2018 00:00:00 GMT")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestOntologyMirror(unittest.TestCase):
+    """Test conditional fetching, offline fallback and concurrent fetches."""
+
+    def setUp(self):
+        self.server = http.server.HTTPServer(("127.0.0.1", 0), OntologyHandler)
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = "http://127.0.0.1:%s/" % self.server.server_port
+        self.mirror_folder = tempfile.mkdtemp()
+        self.mirror = om.OntologyMirror(self.mirror_folder, timeout=5)
+
+    def tearDown(self):
+        self.stop_server()
+        shutil.rmtree(self.mirror_folder)
+
+    def stop_server(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def test_conditional_fetch(self):
+        url = self.base_url + "test_units.owl"
+        file_path = self.mirror.fetch(url)
+        with open(file_path, "rb") as handle:
+            content = handle.read()
+        with open(os.path.join(TEST_ONTOLOGIES, "imports/test_units.owl"), "rb") as handle:
+            self.assertEqual(content, handle.read())
+        mtime = os.stat(file_path).st_mtime
+
+        self.assertEqual(self.mirror.fetch(url), file_path)
+        self.assertEqual(self.server.requests,
+                         [("/test_units.owl", None), ("/test_units.owl", ETAG)])
+        self.assertEqual(os.stat(file_path).st_mtime, mtime)
+
+    def test_offline_fallback(self):
+        url = self.base_url + "test_units.owl"
+        file_path = self.mirror.fetch(url)
+        self.stop_server()
+        self.assertEqual(self.mirror.fetch(url), file_path)
+
+        with self.assertRaises(Exception):
+            self.mirror.fetch(self.base_url + "test_import.owl")
+
+    def test_fetch_all(self):
+        urls = [self.base_url + name
+                for name in ("test_import.owl", "test_units.owl", "missing.owl")]
+        results = self.mirror.fetch_all(urls)
+
+        self.assertEqual([url for (url, file_path, error) in results], urls)
+        self.assertTrue(os.path.isfile(results[0][1]))
+        self.assertTrue(os.path.isfile(results[1][1]))
+        self.assertIsNone(results[2][1])
+        self.assertTrue(results[2][2])
+
+    def test_parse_files_through_mirror(self):
+        onto_helper = oh.OntoHelper()
+        onto_helper.set_mirror(self.mirror_folder)
+        urls = [self.base_url + name for name in ("test_units.owl", "missing.owl")]
+        ((_, parsed, error), (_, missing, missing_error)) = onto_helper.do_parse_files(urls, 1)
+
+        self.assertIsNone(error)
+        self.assertIn((rdflib.URIRef("http://purl.obolibrary.org/obo/UO_0000027"),
+                       rdflib.RDFS.label, rdflib.Literal("degree Celsius", lang="en")),
+                      parsed["triples"])
+        self.assertIsNone(missing)
+        self.assertTrue(missing_error)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,204 @@
+#!/usr/bin/python
+
+"""Tests scripts/ontoservice.py."""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import scripts.python.folderwatcher as fw
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../scripts")
+TEST_ONTOLOGIES = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "../test_ontologies")
+ROOT_URI = "http://purl.obolibrary.org/obo/GENEPIO_0001000"
+
+# ontoservice.py imports jsonimo.py and ontofetch.py as top level modules.
+sys.path.insert(0, SCRIPTS)
+import ontoservice  # noqa: E402
+sys.path.remove(SCRIPTS)
+
+
+class TestOnce(unittest.TestCase):
+    """Test a --once run moves job outputs into place and records state."""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.ontologies = os.path.join(self.folder, "ontologies")
+        shutil.copytree(TEST_ONTOLOGIES, self.ontologies)
+        self.ontology_file = os.path.join(self.ontologies, "test_ontology.owl")
+        self.output_folder = os.path.join(self.folder, "output")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def run_service(self):
+        # Query and algebra caches are kept under a temporary home folder.
+        env = dict(os.environ, HOME=self.folder)
+        return subprocess.check_output(
+            [sys.executable, "ontoservice.py", self.ontologies, "--once", "-w", "1", "-i", "0.2",
+             "-o", self.output_folder, "-r", ROOT_URI,
+             "-c", os.path.join(self.folder, "graphs"), "-m", os.path.join(self.folder, "mirror")],
+            cwd=SCRIPTS, env=env, stderr=subprocess.STDOUT).decode()
+
+    def get_output(self, *names):
+        return os.path.join(self.output_folder, *names)
+
+    def get_state(self):
+        with open(self.get_output(ontoservice.STATE_FILE)) as handle:
+            return json.load(handle)
+
+    def test_outputs_moved(self):
+        printed = self.run_service()
+        self.assertIn("Done " + self.ontology_file, printed)
+
+        with open(self.get_output("test_ontology.json")) as output:
+            self.assertIn("GENEPIO:0001000", json.load(output)["specifications"])
+        self.assertTrue(os.path.isfile(self.get_output("test_ontology.log")))
+        self.assertTrue(os.path.isfile(self.get_output(ontoservice.FETCH_FOLDER, "test_ontology.json")))
+        self.assertEqual([name for name in os.listdir(self.output_folder)
+                          if name.startswith(ontoservice.JOB_PREFIX)], [])
+
+        signatures = fw.FolderWatcher(self.ontologies).get_signatures()
+        self.assertEqual(self.get_state(), {self.ontology_file: list(signatures[self.ontology_file])})
+
+        # Nothing changed since, so nothing is run again.
+        modified = os.path.getmtime(self.get_output("test_ontology.json"))
+        self.assertNotIn("Queued", self.run_service())
+        self.assertEqual(os.path.getmtime(self.get_output("test_ontology.json")), modified)
+
+    def test_failed_job(self):
+        self.run_service()
+        modified = os.path.getmtime(self.get_output("test_ontology.json"))
+        broken_file = os.path.join(self.ontologies, "broken.owl")
+        with open(broken_file, "w") as handle:
+            handle.write("<rdf:RDF")
+
+        printed = self.run_service()
+        self.assertIn("FAILED " + broken_file, printed)
+        self.assertNotIn("Queued " + self.ontology_file, printed)
+        self.assertTrue(os.path.isfile(self.get_output("broken.log")))
+        self.assertFalse(os.path.exists(self.get_output("broken.json")))
+        self.assertEqual(os.path.getmtime(self.get_output("test_ontology.json")), modified)
+        self.assertEqual(list(self.get_state()), [self.ontology_file])
+        self.assertEqual([name for name in os.listdir(self.output_folder)
+                          if name.startswith(ontoservice.JOB_PREFIX)], [])
+
+        # Not recorded, so next run tries it again.
+        self.assertIn("FAILED " + broken_file, self.run_service())
+
+
+class Result(object):
+    """Stands in for the AsyncResult of a finished pool job."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def ready(self):
+        return True
+
+    def get(self):
+        return self.value
+
+
+class Pool(object):
+    """Stands in for a worker pool; records jobs submitted."""
+
+    def __init__(self):
+        self.jobs = []
+        self.error = None
+
+    def apply_async(self, function, args):
+        self.jobs.append(args[0])
+        return Result((args[0][0], self.error, 0.1))
+
+
+class TestJobs(unittest.TestCase):
+    """Test failed jobs are retried and files changed meanwhile rerun."""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.output_folder = os.path.join(self.folder, "output")
+        os.mkdir(self.output_folder)
+        self.ontology_file = self.write("<rdf:RDF/>")
+        self.watcher = fw.FolderWatcher(self.folder, settle=0)
+        self.pool = Pool()
+        self.service = ontoservice.OntologyService()
+        self.service.output_folder = self.output_folder
+        self.service.state_file = os.path.join(self.output_folder, ontoservice.STATE_FILE)
+        (self.service.jsonimo_args, self.service.ontofetch_args) = ([], None)
+        self.service.retry_delay = 60
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write(self, content):
+        file_path = os.path.join(self.folder, "test.owl")
+        with open(file_path, "w") as handle:
+            handle.write(content)
+        return file_path
+
+    def poll(self, now=1000):
+        for file_path in self.watcher.poll(now):
+            self.service.do_submit(self.pool, file_path, self.watcher.known[file_path])
+
+    def finish(self):
+        with patch("builtins.print"):
+            self.service.do_finished(self.pool, self.watcher)
+
+    def test_failed_job_retried(self):
+        self.pool.error = "URLError: unreachable"
+        self.poll()
+        with patch("time.time", return_value=1000):
+            self.finish()
+        self.assertEqual(len(self.pool.jobs), 1)
+        self.assertEqual(self.service.retries, {self.ontology_file: 1060})
+
+        # Unchanged file isn't reported again until its retry is due.
+        self.service.do_retries(self.watcher, now=1059)
+        self.poll(1059)
+        self.assertEqual(len(self.pool.jobs), 1)
+        self.service.do_retries(self.watcher, now=1060)
+        self.poll(1060)
+        self.assertEqual(len(self.pool.jobs), 2)
+        self.assertEqual(self.service.retries, {})
+
+        # Delay doubles with each failure in a row.
+        with patch("time.time", return_value=1060):
+            self.finish()
+        self.assertEqual(self.service.retries, {self.ontology_file: 1180})
+
+        self.pool.error = None
+        self.service.do_retries(self.watcher, now=1180)
+        self.poll(1180)
+        self.finish()
+        self.assertEqual(self.service.retries, {})
+        self.assertEqual(self.service.failures, {})
+        self.assertEqual(self.service.get_state(), {self.ontology_file: self.watcher.known[self.ontology_file]})
+
+    def test_changed_while_running(self):
+        self.poll()
+        first = self.watcher.known[self.ontology_file]
+        self.write("<rdf:RDF></rdf:RDF>")
+        self.poll(1001)
+        self.assertEqual(len(self.pool.jobs), 1)
+        self.assertEqual(self.service.rerun, {self.ontology_file})
+
+        # The first run's signature is recorded, and the file rerun.
+        self.finish()
+        self.assertEqual(self.service.state[self.ontology_file], first)
+        self.assertEqual(len(self.pool.jobs), 2)
+        self.assertEqual(self.service.running[self.ontology_file][1], self.watcher.known[self.ontology_file])
+        self.assertNotEqual(self.watcher.known[self.ontology_file], first)
+        self.finish()
+        self.assertEqual(self.service.running, {})
+        self.assertEqual(self.service.state[self.ontology_file], self.watcher.known[self.ontology_file])
+
+
+if __name__ == "__main__":
+    unittest.main()
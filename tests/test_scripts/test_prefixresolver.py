@@ -0,0 +1,56 @@
+#!/usr/bin/python
+
+"""Tests scripts/python/prefixresolver."""
+
+import unittest
+from collections import OrderedDict
+
+import scripts.python.prefixresolver as pr
+
+
+OBO = "http://purl.obolibrary.org/obo/"
+
+
+class TestPrefixResolver(unittest.TestCase):
+    """Test URI compaction and expansion against a shared @context."""
+
+    def setUp(self):
+        self.context = OrderedDict([
+            ("owl", "http://www.w3.org/2002/07/owl#"),
+            ("GENEPIO", OBO + "GENEPIO_"),
+        ])
+        self.resolver = pr.PrefixResolver(self.context, cache_size=2)
+
+    def test_round_trip(self):
+        self.assertEqual(self.resolver.get_entity_id(OBO + "GENEPIO_0001234"), "GENEPIO:0001234")
+        self.assertEqual(self.resolver.get_entity_id("http://www.w3.org/2002/07/owl#Class"), "owl:Class")
+        self.assertEqual(self.resolver.get_expanded_id("GENEPIO:0001234"), OBO + "GENEPIO_0001234")
+
+    def test_new_prefix_added_to_context(self):
+        self.assertEqual(self.resolver.get_entity_id(OBO + "UO_0000027"), "UO:0000027")
+        self.assertEqual(self.context["UO"], OBO + "UO_")
+        self.assertEqual(self.resolver.get_expanded_id("UO:0000027"), OBO + "UO_0000027")
+
+    def test_first_prefix_wins(self):
+        self.context["GENEPIO2"] = OBO + "GENEPIO_"
+        self.assertEqual(self.resolver.get_entity_id(OBO + "GENEPIO_0001234"), "GENEPIO:0001234")
+
+    def test_context_changed_elsewhere(self):
+        self.assertEqual(self.resolver.get_expanded_id("NCIT:C87194"), "NCIT:C87194")
+        self.context["NCIT"] = "http://purl.obolibrary.org/obo/NCIT_"
+        self.assertEqual(self.resolver.get_expanded_id("NCIT:C87194"), OBO + "NCIT_C87194")
+
+    def test_untouched(self):
+        version = "http://purl.obolibrary.org/obo/obi/2018-05-23/obi.owl"
+        self.assertEqual(self.resolver.get_entity_id(version), version)
+        self.assertEqual(self.resolver.get_entity_id("plain text"), "plain text")
+        self.assertEqual(self.resolver.get_expanded_id("no prefix"), "no prefix")
+
+    def test_cache_is_bounded(self):
+        for number in range(10):
+            self.resolver.get_entity_id(OBO + "GENEPIO_%07d" % number)
+        self.assertEqual(self.resolver.compact.cache_info().currsize, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
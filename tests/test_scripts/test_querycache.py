@@ -0,0 +1,131 @@
+#!/usr/bin/python
+
+"""Tests scripts/python/querycache."""
+
+import os
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+from unittest.mock import patch
+
+import rdflib
+
+import scripts.python.ontohelper as oh
+import scripts.python.querycache as qc
+
+
+TEST_ONTOLOGIES = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "../test_ontologies")
+
+OBO = "http://purl.obolibrary.org/obo/"
+
+# Has component restrictions between GENEPIO terms.
+COMPONENTS_QUERY = """
+    SELECT DISTINCT ?parent_id ?id
+    WHERE {
+        ?restriction owl:onProperty <http://purl.obolibrary.org/obo/RO_0002180>.
+        ?parent_id rdfs:subClassOf ?restriction.
+        ?restriction owl:someValuesFrom ?id.
+    }
+"""
+
+
+def add_table(job):
+    (cache_folder, key) = job
+    qc.QueryCache(cache_folder).add(key, [{"id": "GENEPIO:%s" % key}], [])
+
+
+class TestQueryCache(unittest.TestCase):
+    """Test query table caching, @context replay and invalidation."""
+
+    def setUp(self):
+        self.cache_folder = tempfile.mkdtemp()
+        self.work_folder = tempfile.mkdtemp()
+        shutil.copytree(os.path.join(TEST_ONTOLOGIES, "imports"),
+                        os.path.join(self.work_folder, "imports"))
+        self.ontology_file = os.path.join(self.work_folder, "test_ontology.owl")
+        shutil.copy(os.path.join(TEST_ONTOLOGIES, "test_ontology.owl"), self.ontology_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_folder)
+        shutil.rmtree(self.work_folder)
+
+    def load(self):
+        onto_helper = oh.OntoHelper()
+        onto_helper.set_query_cache(self.cache_folder)
+        onto_helper.parse_ontology(self.ontology_file)
+        onto_helper.do_ontology_includes(self.ontology_file, 1)
+        # Prefix is added by converting query results.
+        self.assertNotIn("GENEPIO", onto_helper.struct["@context"])
+        return onto_helper
+
+    def test_cached_table(self):
+        onto_helper = self.load()
+        query = onto_helper.prepare_query(COMPONENTS_QUERY)
+        expected = onto_helper.do_query_table(query)
+        self.assertTrue(expected)
+        self.assertIn("GENEPIO", onto_helper.struct["@context"])
+
+        onto_helper = self.load()
+        with patch.object(rdflib.Graph, "query") as graph_query:
+            table = onto_helper.do_query_table(onto_helper.prepare_query(COMPONENTS_QUERY))
+            graph_query.assert_not_called()
+        self.assertEqual(table, expected)
+        self.assertIn("GENEPIO", onto_helper.struct["@context"])
+
+    def test_changed_prefix_replayed(self):
+        # A new namespace whose prefix name is already in @context takes it.
+        query = 'SELECT ?id WHERE { VALUES ?id { <http://example.org/other/owl_0001> } }'
+        onto_helper = self.load()
+        expected = onto_helper.do_query_table(query)
+        self.assertEqual(expected, [{"id": "owl:0001"}])
+        context = list(onto_helper.struct["@context"].items())
+
+        onto_helper = self.load()
+        with patch.object(rdflib.Graph, "query") as graph_query:
+            self.assertEqual(onto_helper.do_query_table(query), expected)
+            graph_query.assert_not_called()
+        self.assertEqual(list(onto_helper.struct["@context"].items()), context)
+        self.assertEqual(onto_helper.get_entity_id("http://example.org/other/owl_0002"), "owl:0002")
+
+    def test_changed_file_invalidates(self):
+        onto_helper = self.load()
+        onto_helper.do_query_table(COMPONENTS_QUERY)
+        stat = os.stat(self.ontology_file)
+        os.utime(self.ontology_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+        onto_helper = self.load()
+        with patch.object(rdflib.Graph, "query", return_value=[]) as graph_query:
+            onto_helper.do_query_table(COMPONENTS_QUERY)
+            graph_query.assert_called_once()
+
+    def test_blank_nodes_of_one_run(self):
+        cache = qc.QueryCache(self.cache_folder)
+        table = [{"id": rdflib.BNode(), "parent_id": "GENEPIO:0001000"}, {"id": "GENEPIO:0001001"}]
+        cache.add("a", table, [("GENEPIO", OBO + "GENEPIO_")])
+        self.assertEqual(cache.get("a"), (table, [("GENEPIO", OBO + "GENEPIO_")]))
+
+        other_run = qc.QueryCache(self.cache_folder)
+        other_run.add("b", [{"id": rdflib.BNode()}], [])
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(qc.QueryCache(self.cache_folder).get("b"))
+
+    def test_eviction(self):
+        cache = qc.QueryCache(self.cache_folder)
+        cache.add("a", [{"id": "GENEPIO:0001000"}], [])
+        cache.max_size = os.path.getsize(cache.get_cache_file("a"))
+        cache.add("b", [{"id": "GENEPIO:0001001"}], [])
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(list(cache.read_index()["entries"]), ["b"])
+
+    def test_concurrent_writers(self):
+        keys = ["table%s" % number for number in range(28)]
+        with multiprocessing.Pool(7) as pool:
+            pool.map(add_table, [(self.cache_folder, key) for key in keys], 1)
+        self.assertEqual(sorted(qc.QueryCache(self.cache_folder).read_index()["entries"]),
+                         sorted(keys))
+
+
+if __name__ == "__main__":
+    unittest.main()
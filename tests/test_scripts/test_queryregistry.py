@@ -0,0 +1,111 @@
+#!/usr/bin/python
+
+"""Tests scripts/python/queryregistry."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import scripts.python.ontohelper as oh
+import scripts.python.queryregistry as qr
+
+
+TEST_ONTOLOGY = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "../test_ontologies/test_ontology.owl")
+
+# Components with a label, or else none; exercises OPTIONAL and FILTER.
+COMPONENTS_QUERY = """
+    SELECT DISTINCT ?parent_id ?id ?label
+    WHERE {
+        ?restriction owl:onProperty <http://purl.obolibrary.org/obo/RO_0002180>.
+        ?parent_id rdfs:subClassOf ?restriction.
+        ?restriction owl:someValuesFrom ?id.
+        OPTIONAL {?id rdfs:label ?label}
+        FILTER (isIRI(?id) && !isBlank(?parent_id))
+    } ORDER BY ?parent_id ?id
+"""
+
+
+class TestQueryRegistry(unittest.TestCase):
+    """Test lazy preparation of queries, and the prepared query cache."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.onto_helper = oh.OntoHelper()
+        cls.onto_helper.parse_ontology(TEST_ONTOLOGY)
+        cls.onto_helper.do_ontology_includes(TEST_ONTOLOGY, 1)
+
+    def setUp(self):
+        self.cache_folder = tempfile.mkdtemp()
+        qr.prepared_queries.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_folder)
+        qr.prepared_queries.clear()
+
+    def get_table(self, query):
+        return self.onto_helper.do_query_table(query)
+
+    def test_lazy_preparation(self):
+        queries = qr.QueryRegistry(self.onto_helper.namespace, {"components": COMPONENTS_QUERY})
+        with patch.object(qr, "prepareQuery", wraps=qr.prepareQuery) as prepare:
+            self.assertIn("components", queries)
+            self.assertEqual(list(queries), ["components"])
+            self.assertEqual(prepare.call_count, 0)
+            query = queries["components"]
+            self.assertIs(queries["components"], query)
+            self.assertEqual(prepare.call_count, 1)
+            self.assertEqual(query.text, COMPONENTS_QUERY)
+
+            # Another registry in this process reuses the prepared query.
+            other = qr.QueryRegistry(self.onto_helper.namespace, {"other": COMPONENTS_QUERY})
+            self.assertIs(other["other"], query)
+            self.assertEqual(prepare.call_count, 1)
+
+    def test_cached_algebra(self):
+        expected = self.get_table(qr.QueryRegistry(self.onto_helper.namespace, {"q": COMPONENTS_QUERY})["q"])
+        self.assertTrue(len(expected))
+
+        qr.prepared_queries.clear()
+        queries = qr.QueryRegistry(self.onto_helper.namespace, {"q": COMPONENTS_QUERY}, self.cache_folder)
+        self.assertEqual(self.get_table(queries["q"]), expected)
+        self.assertEqual(len(os.listdir(self.cache_folder)), 1)
+
+        # A later run loads the query instead of parsing it.
+        qr.prepared_queries.clear()
+        queries = qr.QueryRegistry(self.onto_helper.namespace, {"q": COMPONENTS_QUERY}, self.cache_folder)
+        with patch.object(qr, "prepareQuery") as prepare:
+            query = queries["q"]
+            self.assertEqual(prepare.call_count, 0)
+        self.assertEqual(query.text, COMPONENTS_QUERY)
+        self.assertEqual(self.get_table(query), expected)
+
+        # Other prefixes make another query.
+        namespace = dict(self.onto_helper.namespace, RO="http://purl.obolibrary.org/obo/RO#")
+        self.assertNotEqual(qr.QueryRegistry(namespace).get_key(COMPONENTS_QUERY),
+                            queries.get_key(COMPONENTS_QUERY))
+
+    def test_unreadable_cache_file(self):
+        queries = qr.QueryRegistry(self.onto_helper.namespace, {"q": COMPONENTS_QUERY}, self.cache_folder)
+        with open(queries.get_cache_file(queries.get_key(COMPONENTS_QUERY)), "wb") as handle:
+            handle.write(b"not a pickle")
+        with patch("builtins.print"):
+            query = queries["q"]
+        self.assertEqual(query.text, COMPONENTS_QUERY)
+        self.assertTrue(len(self.get_table(query)))
+
+    def test_helper_queries(self):
+        onto_helper = oh.OntoHelper()
+        onto_helper.set_prepared_query_cache(self.cache_folder)
+        queries = onto_helper.add_queries({"components": COMPONENTS_QUERY})
+        self.assertIs(queries, onto_helper.queries)
+        self.assertEqual(sorted(queries), ["components", "ontology_metadata"])
+        self.assertEqual(os.listdir(self.cache_folder), [])
+        onto_helper.queries["ontology_metadata"]
+        self.assertEqual(len(os.listdir(self.cache_folder)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
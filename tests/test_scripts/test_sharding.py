@@ -0,0 +1,81 @@
+#!/usr/bin/python
+
+"""Tests scripts/python/sharding."""
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from collections import OrderedDict
+
+import scripts.python.ontohelper as oh
+import scripts.python.sharding as sh
+
+
+def get_specifications():
+    specifications = OrderedDict()
+    for (id, parent_id) in [("GENEPIO:0001000", None), ("GENEPIO:0001001", "GENEPIO:0001000"),
+                            ("GENEPIO:0001010", None), ("GENEPIO:0001002", "GENEPIO:0001001"),
+                            ("GENEPIO:0001011", "GENEPIO:0001010"), ("GENEPIO:0001003", "GENEPIO:0001000"),
+                            ("GENEPIO:0001020", "OBI:0000658")]:
+        specifications[id] = {"id": id, "label": id.lower()}
+        if parent_id:
+            specifications[id]["parent_id"] = parent_id
+    return specifications
+
+
+class TestSharding(unittest.TestCase):
+    """Test splitting of specifications into shards, and loading them back."""
+
+    def setUp(self):
+        self.output_folder = tempfile.mkdtemp()
+        self.basename = os.path.join(self.output_folder, "test_output")
+
+    def tearDown(self):
+        shutil.rmtree(self.output_folder)
+
+    def test_subtree_shards(self):
+        specifications = get_specifications()
+        self.assertEqual(sh.get_shards(specifications, "subtree", 4), [
+            ["GENEPIO:0001000", "GENEPIO:0001001", "GENEPIO:0001002", "GENEPIO:0001003"],
+            ["GENEPIO:0001010", "GENEPIO:0001011", "GENEPIO:0001020"],
+        ])
+        # Subtrees bigger than a shard are split.
+        self.assertEqual([len(ids) for ids in sh.get_shards(specifications, "subtree", 3)], [3, 3, 1])
+        self.assertEqual(sh.get_shards({}, "subtree", 3), [])
+
+    def test_hash_shards(self):
+        specifications = get_specifications()
+        shards = sh.get_shards(specifications, "hash", 3)
+        self.assertEqual(len(shards), 3)
+        self.assertEqual(sorted(id for ids in shards for id in ids), sorted(specifications))
+        for (number, ids) in enumerate(shards):
+            for id in ids:
+                self.assertEqual(sh.get_hash_shard(id, 3), number)
+
+    def test_output_and_load(self):
+        onto_helper = oh.OntoHelper()
+        onto_helper.struct["metadata"] = {"prefix": "GENEPIO"}
+        onto_helper.struct["specifications"].update(get_specifications())
+        specifications = onto_helper.struct["specifications"]
+
+        for compress in (False, True):
+            onto_helper.do_output_shards(onto_helper.struct, self.basename, "subtree", 4, compress)
+            folder = self.basename + ".shards"
+            suffix = ".json.gz" if compress else ".json"
+            self.assertEqual(sorted(os.listdir(folder)), ["0000" + suffix, "0001" + suffix, "manifest" + suffix])
+
+            manifest_file = os.path.join(folder, "manifest" + suffix)
+            manifest = sh.load_manifest(manifest_file)
+            self.assertEqual(manifest["metadata"], {"prefix": "GENEPIO"})
+            self.assertEqual(manifest["index"]["GENEPIO:0001011"], 1)
+
+            loaded = sh.load_specifications(manifest_file, ["GENEPIO:0001011", "GENEPIO:9999999", "GENEPIO:0001000"])
+            self.assertEqual(list(loaded), ["GENEPIO:0001011", "GENEPIO:0001000"])
+            self.assertEqual(json.loads(json.dumps(loaded)),
+                             {id: specifications[id] for id in loaded})
+
+
+if __name__ == "__main__":
+    unittest.main()
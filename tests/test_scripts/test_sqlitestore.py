@@ -0,0 +1,201 @@
+#!/usr/bin/python
+
+"""Tests scripts/python/sqlitestore and OntoHelper's sqlite engine."""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import rdflib
+from rdflib.compare import isomorphic
+
+import scripts.python.hierarchy as hi
+import scripts.python.ontohelper as oh
+import scripts.python.sqlitestore as ss
+
+
+TEST_ONTOLOGIES = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "../test_ontologies")
+TEST_ONTOLOGY = os.path.join(TEST_ONTOLOGIES, "test_ontology.owl")
+
+OBO = "http://purl.obolibrary.org/obo/"
+
+
+FORKED_GRAPH = []
+
+
+def get_forked_size(number):
+    graph = FORKED_GRAPH[0]
+    graph.store.connect()
+    return len(graph)
+
+
+def load(onto_helper, ontology_file):
+    onto_helper.parse_ontology(ontology_file)
+    onto_helper.do_ontology_includes(ontology_file, processes=1)
+    onto_helper.do_annotation_tables()
+
+
+class TestSQLiteStore(unittest.TestCase):
+    """Test the SQLite store answers as rdflib's memory store does."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.mkdtemp()
+        cls.memory = oh.OntoHelper()
+        load(cls.memory, TEST_ONTOLOGY)
+        cls.sqlite = oh.OntoHelper()
+        cls.sqlite.set_engine("sqlite", os.path.join(cls.folder, "store.sqlite"))
+        load(cls.sqlite, TEST_ONTOLOGY)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.sqlite.graph.close()
+        shutil.rmtree(cls.folder)
+
+    def test_triples(self):
+        self.assertEqual(len(self.sqlite.graph), len(self.memory.graph))
+        # Separate parses name blank nodes differently.
+        self.assertTrue(isomorphic(self.sqlite.graph, self.memory.graph))
+        brazil = rdflib.URIRef(OBO + "GENEPIO_0001004")
+        self.assertEqual(set(self.sqlite.graph.predicate_objects(brazil)),
+                         set(self.memory.graph.predicate_objects(brazil)))
+        self.assertEqual(list(self.sqlite.graph.triples((rdflib.URIRef(OBO + "X"), None, None))), [])
+
+    def test_tables(self):
+        root = OBO + "OBI_0000658"
+        self.assertEqual(self.sqlite.do_tree_table(root, label=True),
+                         self.memory.do_tree_table(root, label=True))
+        self.assertEqual(self.sqlite.annotations, self.memory.annotations)
+
+    def test_recursive_subclass_walks(self):
+        index = self.sqlite.get_subclass_index()
+        self.assertIsInstance(index, ss.SQLiteSubclassIndex)
+        memory_index = hi.SubclassIndex(self.memory.graph)
+        for root in (OBO + "OBI_0000658", OBO + "GENEPIO_0001002"):
+            self.assertEqual(set(index.get_descendants(root)),
+                             set(memory_index.get_descendants(rdflib.URIRef(root))))
+        node = rdflib.URIRef(OBO + "GENEPIO_0001009")
+        self.assertEqual(index.get_ancestors(node), memory_index.get_ancestors(node))
+        self.assertEqual(index.get_descendants(OBO + "X"), [])
+
+    @unittest.skipUnless("fork" in multiprocessing.get_all_start_methods(), "needs fork()")
+    def test_forked_connection(self):
+        FORKED_GRAPH.append(self.sqlite.graph)
+        try:
+            with multiprocessing.get_context("fork").Pool(2) as pool:
+                sizes = pool.map(get_forked_size, range(2))
+        finally:
+            FORKED_GRAPH.pop()
+        self.assertEqual(sizes, [len(self.memory.graph)] * 2)
+        self.assertEqual(len(self.sqlite.graph), len(self.memory.graph))
+
+
+class TestStoreReuse(unittest.TestCase):
+    """Test a store built by one run is reused, and kept current, by the next."""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        shutil.copytree(TEST_ONTOLOGIES, os.path.join(self.folder, "ontologies"))
+        self.ontology_file = os.path.join(self.folder, "ontologies", "test_ontology.owl")
+        self.store_file = os.path.join(self.folder, "store.sqlite")
+        onto_helper = self.get_helper()
+        load(onto_helper, self.ontology_file)
+        self.size = len(onto_helper.graph)
+        onto_helper.graph.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def get_helper(self):
+        onto_helper = oh.OntoHelper()
+        onto_helper.set_engine("sqlite", self.store_file)
+        return onto_helper
+
+    def test_unchanged_files_not_parsed(self):
+        onto_helper = self.get_helper()
+        with mock.patch.object(rdflib.Graph, "parse") as parse:
+            load(onto_helper, self.ontology_file)
+        parse.assert_not_called()
+        self.assertEqual(len(onto_helper.graph), self.size)
+        self.assertEqual(len(onto_helper.store_sources), 3)
+        onto_helper.graph.close()
+
+    def test_changed_file_reloaded(self):
+        with open(self.ontology_file) as ontology:
+            text = ontology.read()
+        with open(self.ontology_file, "w") as ontology:
+            ontology.write(text.replace(">Brazil<", ">Brasil<"))
+
+        onto_helper = self.get_helper()
+        load(onto_helper, self.ontology_file)
+        labels = set(onto_helper.graph.objects(rdflib.URIRef(OBO + "GENEPIO_0001004"), rdflib.RDFS.label))
+        self.assertIn(rdflib.Literal("Brasil", lang="en"), labels)
+        self.assertNotIn(rdflib.Literal("Brazil", lang="en"), labels)
+        self.assertEqual(len(onto_helper.graph), self.size)
+        onto_helper.graph.close()
+
+    def get_term_count(self, onto_helper):
+        return onto_helper.store.connection.execute("SELECT COUNT(*) FROM terms").fetchone()[0]
+
+    def test_unused_terms_removed(self):
+        onto_helper = self.get_helper()
+        terms = self.get_term_count(onto_helper)
+        onto_helper.graph.close()
+
+        with open(self.ontology_file) as ontology:
+            text = ontology.read()
+        for label in (">Brasil<", ">Brazil<"):
+            # Reloading a changed file gives its blank nodes new terms.
+            with open(self.ontology_file, "w") as ontology:
+                ontology.write(text.replace(">Brazil<", label))
+            onto_helper = self.get_helper()
+            load(onto_helper, self.ontology_file)
+            self.assertEqual(len(onto_helper.graph), self.size)
+            self.assertEqual(self.get_term_count(onto_helper), terms)
+            onto_helper.graph.close()
+
+    def test_failed_file_rolled_back(self):
+        import_file = os.path.join(self.folder, "ontologies", "imports", "test_units.owl")
+        with open(import_file) as ontology:
+            text = ontology.read()
+        with open(import_file, "w") as ontology:
+            ontology.write(text[0:len(text) // 2])
+
+        onto_helper = self.get_helper()
+        with mock.patch("builtins.print"):
+            load(onto_helper, self.ontology_file)
+        self.assertIsNone(onto_helper.store.get_source_signature(import_file))
+        self.assertNotIn(import_file, onto_helper.store_sources)
+        smaller = len(onto_helper.graph)
+        self.assertLess(smaller, self.size)
+        onto_helper.graph.close()
+
+        with open(import_file, "w") as ontology:
+            ontology.write(text)
+        onto_helper = self.get_helper()
+        load(onto_helper, self.ontology_file)
+        self.assertEqual(len(onto_helper.graph), self.size)
+        onto_helper.graph.close()
+
+    def test_graph_cache_not_used(self):
+        onto_helper = self.get_helper()
+        onto_helper.set_graph_cache(os.path.join(self.folder, "graphs"))
+        os.utime(self.ontology_file)
+        load(onto_helper, self.ontology_file)
+        self.assertEqual(len(onto_helper.graph), self.size)
+        self.assertEqual([name for name in os.listdir(os.path.join(self.folder, "graphs"))
+                          if name.endswith(".pickle")], [])
+        onto_helper.graph.close()
+
+    def test_default_store_file(self):
+        store_file = oh.OntoHelper().get_store_file(self.ontology_file, self.folder)
+        self.assertEqual(os.path.dirname(store_file), self.folder)
+        self.assertTrue(os.path.basename(store_file).startswith("test_ontology-"))
+
+
+if __name__ == "__main__":
+    unittest.main()
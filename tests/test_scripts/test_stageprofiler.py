@@ -0,0 +1,75 @@
+#!/usr/bin/python
+
+"""Tests scripts/python/stageprofiler."""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import scripts.python.stageprofiler as sp
+
+
+class TestStageProfiler(unittest.TestCase):
+    """Test stage timings, query counts and the written report."""
+
+    def setUp(self):
+        self.profiler = sp.StageProfiler()
+
+    def test_stages(self):
+        with self.profiler.stage("tree"):
+            started = self.profiler.get_time()
+            table = [{"id": "GENEPIO:1", "parent_id": "GENEPIO:0"},
+                     {"id": "GENEPIO:2", "parent_id": "GENEPIO:0"}]
+            self.profiler.add_query("tree", table, started, ["parent_id", "id"])
+        with self.profiler.stage("units"):
+            for number in range(3):
+                self.profiler.add_query("units", [{"id": "GENEPIO:1", "unit": "UO:1"}],
+                                        self.profiler.get_time(), ["id"])
+        with self.profiler.stage("annotations"):
+            self.profiler.add_entities(["GENEPIO:1", "GENEPIO:2"])
+
+        report = self.profiler.get_report(ontology="test.owl")
+        self.assertEqual(report["ontology"], "test.owl")
+        self.assertEqual([stage["stage"] for stage in report["stages"]], ["tree", "units", "annotations"])
+        (tree, units, annotations) = report["stages"]
+        self.assertEqual((tree["queries"], tree["rows"], tree["entities"]), (1, 2, 3))
+        self.assertEqual((units["queries"], units["rows"], units["entities"]), (3, 3, 1))
+        self.assertEqual(units["query_stats"]["units"]["count"], 3)
+        self.assertEqual(annotations["entities"], 2)
+        self.assertEqual((report["total"]["queries"], report["total"]["rows"]), (4, 5))
+        for stage in report["stages"]:
+            self.assertGreaterEqual(stage["wall_time"], 0)
+            self.assertGreaterEqual(stage["cpu_time"], 0)
+
+    def test_sub_queries(self):
+        with self.profiler.stage("primitives"):
+            self.profiler.add_query("primitives", [{"id": "GENEPIO:1"}], self.profiler.get_time(), ["id"], 3)
+            self.profiler.add_query("primitives", [{"id": "GENEPIO:1"}], self.profiler.get_time(), ["id"], 0)
+        (stage,) = self.profiler.get_report()["stages"]
+        self.assertEqual((stage["queries"], stage["rows"]), (3, 2))
+        stats = stage["query_stats"]["primitives"]
+        self.assertEqual((stats["count"], stats["queries"]), (2, 3))
+
+    def test_query_outside_stage_ignored(self):
+        self.profiler.add_query("tree", [{"id": "GENEPIO:1"}], self.profiler.get_time())
+        self.assertEqual(self.profiler.get_report()["stages"], [])
+
+    def test_write_report(self):
+        folder = tempfile.mkdtemp()
+        try:
+            with self.profiler.stage("parse"):
+                pass
+            file_path = os.path.join(folder, "test.profile.json")
+            self.profiler.write_report(file_path, engine="memory")
+            with open(file_path) as input_handle:
+                report = json.load(input_handle)
+            self.assertEqual(report["engine"], "memory")
+            self.assertEqual(report["stages"][0]["stage"], "parse")
+        finally:
+            shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    unittest.main()